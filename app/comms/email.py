@@ -1,3 +1,4 @@
+from contextlib import contextmanager, nullcontext
 from email.mime.text import MIMEText
 import werkzeug
 werkzeug.cached_property = werkzeug.utils.cached_property
@@ -6,17 +7,17 @@ from html import escape, unescape
 import json
 import os
 import re
-import requests
 import smtplib
-import ssl
 
 from html import unescape
 
 from na_common.dates import get_nice_event_dates
 
+from app.comms.email_sessions import email_provider_sessions
 from app.comms.encryption import encrypt
+from app.comms.smtp_pool import smtp_pool
 from app.errors import InvalidRequest
-from app.models import BASIC, EVENT, MAGAZINE, BEARER_AUTH, API_AUTH
+from app.models import BASIC, EVENT, MAGAZINE
 from app.dao.events_dao import dao_get_event_by_id
 from app.dao.emails_dao import (
     dao_get_last_minute_email_count_for_provider,
@@ -29,8 +30,12 @@ from app.dao.email_providers_dao import (
 )
 from app.dao.magazines_dao import dao_get_magazine_by_id
 
+# rendered in place of the unsubscribe code so that a bulk email template can be rendered once
+# and personalised for each member with get_personalised_email_html
+UNSUBCODE_PLACEHOLDER = '[[unsubcode]]'
 
-def get_email_provider(override=False, email_provider=None, use_minute_limit=True):
+
+def get_email_provider(override=False, email_provider=None, use_minute_limit=True, email_quota=None):
     if not email_provider:
         email_provider = dao_get_first_email_provider()
         if not email_provider:
@@ -43,13 +48,13 @@ def get_email_provider(override=False, email_provider=None, use_minute_limit=Tru
         if email_count > limit:
             next_email_provider = dao_get_next_available_email_provider(email_provider.pos)
             if next_email_provider:
-                return get_email_provider(override, next_email_provider)
+                return get_email_provider(override, next_email_provider, email_quota=email_quota)
 
             if override:
                 next_email_provider = dao_get_next_email_provider(email_provider.pos)
 
                 if next_email_provider:
-                    return get_email_provider(override, next_email_provider)
+                    return get_email_provider(override, next_email_provider, email_quota=email_quota)
             else:
                 email_provider.limit = 0
                 setattr(email_provider, limit_reached, True)
@@ -59,7 +64,7 @@ def get_email_provider(override=False, email_provider=None, use_minute_limit=Tru
     if email_provider.monthly_limit and email_provider.monthly_limit > 0:
         email_provider_or_count = _get_email_provider_or_count(
             email_provider.monthly_limit,
-            dao_get_last_30_days_email_count_for_provider,
+            email_quota.get_monthly_count if email_quota else dao_get_last_30_days_email_count_for_provider,
             'monthly_limit_reached')
 
         if type(email_provider_or_count) == int:
@@ -70,7 +75,7 @@ def get_email_provider(override=False, email_provider=None, use_minute_limit=Tru
     if email_provider.daily_limit and email_provider.daily_limit > 0:
         email_provider_or_count = _get_email_provider_or_count(
             email_provider.daily_limit,
-            dao_get_todays_email_count_for_provider,
+            email_quota.get_daily_count if email_quota else dao_get_todays_email_count_for_provider,
             'daily_limit_reached')
 
         if type(email_provider_or_count) == int:
@@ -81,7 +86,7 @@ def get_email_provider(override=False, email_provider=None, use_minute_limit=Tru
     if email_provider.hourly_limit and email_provider.hourly_limit > 0:
         email_provider_or_count = _get_email_provider_or_count(
             email_provider.hourly_limit,
-            dao_get_past_hour_email_count_for_provider,
+            email_quota.get_hourly_count if email_quota else dao_get_past_hour_email_count_for_provider,
             'hourly_limit_reached')
 
         if type(email_provider_or_count) == int:
@@ -92,7 +97,7 @@ def get_email_provider(override=False, email_provider=None, use_minute_limit=Tru
     if use_minute_limit and email_provider.minute_limit and email_provider.minute_limit > 0:
         email_provider_or_count = _get_email_provider_or_count(
             email_provider.minute_limit,
-            dao_get_last_minute_email_count_for_provider,
+            email_quota.get_minute_count if email_quota else dao_get_last_minute_email_count_for_provider,
             'minute_limit_reached')
 
         if type(email_provider_or_count) == int:
@@ -105,12 +110,20 @@ def get_email_provider(override=False, email_provider=None, use_minute_limit=Tru
     return email_provider
 
 
-def get_email_html(email_type, **kwargs):
-    member_id = kwargs.get('member_id')
-    unsubcode = encrypt(
+def get_unsubcode(member_id):
+    return encrypt(
         "{}={}".format(current_app.config['EMAIL_TOKENS']['member_id'], member_id),
         current_app.config['EMAIL_UNSUB_SALT']
-    ) if member_id else None
+    )
+
+
+def get_personalised_email_html(email_html, member_id):
+    return email_html.replace(UNSUBCODE_PLACEHOLDER, get_unsubcode(member_id))
+
+
+def get_email_html(email_type, **kwargs):
+    member_id = kwargs.get('member_id')
+    unsubcode = kwargs.get('unsubcode') or (get_unsubcode(member_id) if member_id else None)
 
     if email_type == EVENT:
         event = dao_get_event_by_id(kwargs.get('event_id'))
@@ -161,7 +174,7 @@ def get_email_html(email_type, **kwargs):
         )
 
 
-def get_email_data(data_map, to, subject, message, from_email, from_name):
+def get_email_data(data_map, to, subject, message, from_email, from_name, recipient_variables=None):
     data_struct = {}
     if isinstance(to, list):
         to = ','.join(to)
@@ -192,11 +205,82 @@ def get_email_data(data_map, to, subject, message, from_email, from_name):
     if 'from_name' in data_map.keys():
         set_data(data_map['from_name'], from_name)
     set_data(data_map['message'], message)
+    if recipient_variables and 'recipient_variables' in data_map.keys():
+        set_data(data_map['recipient_variables'], recipient_variables)
 
     return data_struct
 
 
-def send_email(to, subject, message, from_email=None, from_name=None, override=False):
+def get_batch_size(email_provider):
+    """Returns how many members the email provider can send an email to in one request.
+
+    Batches need a provider API that substitutes each recipient's unsubscribe code, set up with
+    `recipient_variables` and `recipient_unsubcode` in the data_map, otherwise emails are sent singly.
+    """
+    if email_provider and email_provider.batch_size and email_provider.batch_size > 1 and \
+            not email_provider.smtp_server and \
+            all([k in (email_provider.data_map or {}) for k in ['recipient_variables', 'recipient_unsubcode']]):
+        return email_provider.batch_size
+    return 1
+
+
+def _check_email_provider_limits(email_provider):
+    if hasattr(email_provider, "minute_limit_reached"):
+        raise InvalidRequest('Minute limit reached', 429)
+    elif hasattr(email_provider, "hourly_limit_reached"):
+        raise InvalidRequest('Hourly limit reached', 429)
+    elif hasattr(email_provider, "daily_limit_reached"):
+        raise InvalidRequest('Daily limit reached', 429)
+    elif hasattr(email_provider, "monthly_limit_reached"):
+        raise InvalidRequest('Monthly limit reached', 429)
+
+
+def _get_email_provider_to_send(override=False, email_quota=None, batch_size=1):
+    """Returns the email provider to send with and the time the emails were counted against its quota."""
+    # the emails are counted against the provider quota before they are sent so that emails being sent
+    # concurrently see each other when checking the provider limits
+    sent_at = None
+    with email_quota.lock if email_quota else nullcontext():
+        email_provider = get_email_provider(override, email_quota=email_quota)
+
+        if email_provider:
+            if batch_size > 1 and (get_batch_size(email_provider) < batch_size or email_provider.limit < batch_size):
+                return None, None
+
+            _check_email_provider_limits(email_provider)
+
+            if email_quota:
+                sent_at = email_quota.add_email_sent(email_provider.id, count=batch_size)
+
+    return email_provider, sent_at
+
+
+@contextmanager
+def _release_email_quota_on_error(email_quota, email_provider, sent_at, count=1):
+    # emails that fail to send are not logged, so must not stay counted against the provider quota
+    try:
+        yield
+    except Exception:
+        if email_quota and sent_at:
+            email_quota.remove_email_sent(email_provider.id, sent_at, count=count)
+        raise
+
+
+def _post_email_data(email_provider, data):
+    data = data if email_provider.as_json else json.dumps(data)
+
+    session = email_provider_sessions.get_session(email_provider)
+    response = session.post(
+        email_provider.api_url,
+        data=data,
+        timeout=current_app.config['EMAIL_PROVIDER_TIMEOUT']
+    )
+
+    response.raise_for_status()
+    return response
+
+
+def send_email(to, subject, message, from_email=None, from_name=None, override=False, email_quota=None):
     if current_app.config['EMAIL_DISABLED']:
         current_app.logger.info("Emails disabled, unset EMAIL_DISABLED env var to re-enable")
         return 200, None
@@ -210,49 +294,23 @@ def send_email(to, subject, message, from_email=None, from_name=None, override=F
     if not from_name:
         from_name = 'New Acropolis'
 
-    email_provider = get_email_provider(override)
+    email_provider, sent_at = _get_email_provider_to_send(override, email_quota=email_quota)
 
     if email_provider:
-        if hasattr(email_provider, "minute_limit_reached"):
-            raise InvalidRequest('Minute limit reached', 429)
-        elif hasattr(email_provider, "hourly_limit_reached"):
-            raise InvalidRequest('Hourly limit reached', 429)
-        elif hasattr(email_provider, "daily_limit_reached"):
-            raise InvalidRequest('Daily limit reached', 429)
-        elif hasattr(email_provider, "monthly_limit_reached"):
-            raise InvalidRequest('Monthly limit reached', 429)
-
         if email_provider.smtp_server:
             smtp_info = {
                 "SMTP_SERVER": email_provider.smtp_server,
                 "SMTP_USER": email_provider.smtp_user,
                 "SMTP_PASS": email_provider.smtp_password,
             }
-            response_code = send_smtp_email(to, subject, message, from_name="New Acropolis", smtp_info=smtp_info)
+            with _release_email_quota_on_error(email_quota, email_provider, sent_at):
+                response_code = send_smtp_email(
+                    to, subject, message, from_name="New Acropolis", smtp_info=smtp_info)
             return response_code, email_provider.id
         else:
             data = get_email_data(email_provider.data_map, to, subject, message, from_email, from_name)
-            data = data if email_provider.as_json else json.dumps(data)
-
-            headers = None
-            if email_provider.headers:
-                headers = {
-                    'accept': 'application/json',
-                    'Content-Type': 'application/json'
-                }
-                if email_provider.auth_type == BEARER_AUTH:
-                    headers['Authorization'] = f"Bearer {email_provider.api_key}"
-                elif email_provider.auth_type == API_AUTH:
-                    headers['api-key'] = email_provider.api_key
-
-            response = requests.post(
-                email_provider.api_url,
-                auth=('api', email_provider.api_key) if email_provider.auth_type == API_AUTH else None,
-                headers=headers,
-                data=data,
-            )
-
-            response.raise_for_status()
+            with _release_email_quota_on_error(email_quota, email_provider, sent_at):
+                response = _post_email_data(email_provider, data)
             current_app.logger.info('Sent email: {}, response: {}'.format(subject, response.text))
             if current_app.config['ENVIRONMENT'] != 'live':  # pragma: no cover
                 current_app.logger.info('Email to: {}'.format(to))
@@ -272,6 +330,60 @@ def send_email(to, subject, message, from_email=None, from_name=None, override=F
         return '404', ''
 
 
+def send_batch_email(members, subject, email_html, from_email=None, from_name=None, email_quota=None):
+    """Sends an email to a batch of (member_id, email) in one request to the email provider,
+    returns a (member_id, (status_code, email_provider_id)) for each member.
+
+    The provider substitutes each member's unsubscribe code into the email. If the provider cannot
+    send the whole batch within its batch size and limits, the members are sent to one at a time,
+    and an error raised part way through has the results of the emails already sent as `sent_results`.
+    """
+    if current_app.config['EMAIL_DISABLED']:
+        current_app.logger.info("Emails disabled, unset EMAIL_DISABLED env var to re-enable")
+        return [(member_id, (200, None)) for member_id, _ in members]
+
+    email_provider, sent_at = _get_email_provider_to_send(email_quota=email_quota, batch_size=len(members))
+
+    if not email_provider:
+        results = []
+        try:
+            for member_id, email_to in members:
+                results.append((
+                    member_id,
+                    send_email(
+                        email_to, subject, get_personalised_email_html(email_html, member_id),
+                        from_email=from_email, from_name=from_name, email_quota=email_quota
+                    )
+                ))
+        except Exception as e:
+            # keep the emails already sent, so they are logged and not sent again
+            e.sent_results = results
+            raise
+        return results
+
+    if not from_email:
+        from_email = 'noreply@{}'.format(current_app.config['EMAIL_DOMAIN'])
+    if not from_name:
+        from_name = 'New Acropolis'
+
+    recipient_variables = {email_to: {'unsubcode': get_unsubcode(member_id)} for member_id, email_to in members}
+    data = get_email_data(
+        email_provider.data_map,
+        [email_to for _, email_to in members],
+        subject,
+        email_html.replace(UNSUBCODE_PLACEHOLDER, email_provider.data_map['recipient_unsubcode']),
+        from_email,
+        from_name,
+        recipient_variables=json.dumps(recipient_variables) if email_provider.as_json else recipient_variables
+    )
+    with _release_email_quota_on_error(email_quota, email_provider, sent_at, count=len(members)):
+        response = _post_email_data(email_provider, data)
+    current_app.logger.info('Sent batch email: {} to {} members, response: {}'.format(
+        subject, len(members), response.text))
+
+    return [(member_id, (response.status_code, email_provider.id)) for member_id, _ in members]
+
+
 def send_smtp_email(to, subject, message, from_email=None, from_name='', smtp_info=None):  # pragma: no cover
     if current_app.config['EMAIL_DISABLED']:
         current_app.logger.info("Emails disabled, unset EMAIL_DISABLED env var to re-enable")
@@ -306,16 +418,9 @@ def send_smtp_email(to, subject, message, from_email=None, from_name='', smtp_in
     msg['reply-to'] = from_email
 
     try:
-        context = ssl.create_default_context()
-        with smtplib.SMTP(smtp_info['SMTP_SERVER'], 587) as conn:
-            conn.starttls(context=context)
-            conn.ehlo()
-            current_app.logger.info('SU: %r', smtp_info["SMTP_USER"][:5])
-            current_app.logger.info('SP: %r', smtp_info["SMTP_PASS"][:3])
-            conn.login(smtp_info["SMTP_USER"], smtp_info["SMTP_PASS"])
-            conn.send_message(msg)
-            current_app.logger.info("Successfully sent smtp email")
-            return 200
+        smtp_pool.send_message(msg, smtp_info)
+        current_app.logger.info("Successfully sent smtp email")
+        return 200
     except smtplib.SMTPAuthenticationError as e:
         current_app.logger.error("Error sending smtp email %r", e)
         return e.smtp_code
@@ -0,0 +1,59 @@
+from datetime import datetime
+import time
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app
+
+from app.dao.emails_dao import dao_add_members_sent_to_email
+
+
+class EmailLogWriter(object):
+    """Buffers the email_to_member delivery log for a bulk send and writes it in batches.
+
+    Rows are flushed every batch_size sends or flush_seconds, whichever comes first, and when
+    leaving the context manager. If the worker dies only the unflushed batch is lost, those members
+    have no email_to_member row so they are picked up again by dao_get_members_not_sent_to.
+    `on_flush` is called with the rows after they are written, to checkpoint the send.
+    """
+
+    def __init__(self, email_id, batch_size=None, flush_seconds=None, on_flush=None):
+        self.email_id = email_id
+        self.on_flush = on_flush
+        self.batch_size = batch_size or current_app.config['EMAIL_LOG_BATCH_SIZE']
+        self.flush_seconds = flush_seconds or current_app.config['EMAIL_LOG_FLUSH_SECONDS']
+        self.emails_to_members = []
+        self.last_flushed_at = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, member_id, status_code=200, email_provider_id=None, created_at=None):
+        if not created_at:
+            created_at = datetime.strftime(datetime.now(), "%Y-%m-%d %H:%M:%S")
+
+        self.emails_to_members.append({
+            'email_id': self.email_id,
+            'member_id': member_id,
+            'status_code': status_code,
+            'email_provider_id': email_provider_id or None,
+            'created_at': created_at
+        })
+
+        if len(self.emails_to_members) >= self.batch_size or \
+                time.monotonic() - self.last_flushed_at >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if self.emails_to_members:
+            current_app.logger.info(
+                'Logging %d emails sent for %s', len(self.emails_to_members), str(self.email_id))
+            emails_to_members, self.emails_to_members = self.emails_to_members, []
+            dao_add_members_sent_to_email(emails_to_members)
+            if self.on_flush:
+                self.on_flush(emails_to_members)
+
+        self.last_flushed_at = time.monotonic()
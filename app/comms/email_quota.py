@@ -0,0 +1,93 @@
+from collections import deque
+from datetime import datetime, timedelta
+from threading import RLock
+
+from app.dao.emails_dao import (
+    dao_get_last_30_days_email_count_for_provider,
+    dao_get_past_hour_email_sent_times_for_provider,
+    dao_get_todays_email_count_for_provider
+)
+
+
+class EmailQuota(object):
+    """Counts the emails sent by each email provider during a send run.
+
+    The counts for a provider are loaded from email_to_member the first time it is used, then kept
+    up to date locally as emails are sent, so selecting a provider does not count rows for every
+    email. The past hour is kept as a sliding window of send times for the hourly and minute limits.
+
+    Holding `lock` while selecting a provider and adding the email sent lets emails be sent from
+    several threads without going over the provider limits.
+    """
+
+    def __init__(self):
+        self.providers = {}
+        self.lock = RLock()
+
+    def _get_counts(self, email_provider_id):
+        with self.lock:
+            return self._load_counts(email_provider_id)
+
+    def _load_counts(self, email_provider_id):
+        today = datetime.today().date()
+        counts = self.providers.get(email_provider_id)
+
+        if not counts or counts['day'] != today:
+            counts = self.providers[email_provider_id] = {
+                'day': today,
+                'monthly': dao_get_last_30_days_email_count_for_provider(email_provider_id),
+                'daily': dao_get_todays_email_count_for_provider(email_provider_id),
+                'past_hour': deque(dao_get_past_hour_email_sent_times_for_provider(email_provider_id))
+            }
+
+        past_hour = counts['past_hour']
+        hour_ago = datetime.now() - timedelta(hours=1)
+        while past_hour and past_hour[0] <= hour_ago:
+            past_hour.popleft()
+
+        return counts
+
+    def get_monthly_count(self, email_provider_id):
+        return self._get_counts(email_provider_id)['monthly']
+
+    def get_daily_count(self, email_provider_id):
+        return self._get_counts(email_provider_id)['daily']
+
+    def get_hourly_count(self, email_provider_id):
+        return len(self._get_counts(email_provider_id)['past_hour'])
+
+    def get_minute_count(self, email_provider_id):
+        minute_ago = datetime.now() - timedelta(minutes=1)
+        count = 0
+        with self.lock:
+            for sent_at in reversed(self._load_counts(email_provider_id)['past_hour']):
+                if sent_at <= minute_ago:
+                    break
+                count += 1
+        return count
+
+    def add_email_sent(self, email_provider_id, count=1):
+        """Counts the emails against the provider, returns the time they were counted at
+        so they can be released with `remove_email_sent` if they fail to send."""
+        sent_at = datetime.now()
+        with self.lock:
+            counts = self._load_counts(email_provider_id)
+            counts['monthly'] += count
+            counts['daily'] += count
+            counts['past_hour'].extend([sent_at] * count)
+        return sent_at
+
+    def remove_email_sent(self, email_provider_id, sent_at, count=1):
+        with self.lock:
+            counts = self.providers.get(email_provider_id)
+            # counts reloaded on a new day come from email_to_member, so never included these emails
+            if not counts or counts['day'] != sent_at.date():
+                return
+
+            counts['monthly'] -= count
+            counts['daily'] -= count
+            for _ in range(count):
+                try:
+                    counts['past_hour'].remove(sent_at)
+                except ValueError:
+                    break  # already slid out of the past hour
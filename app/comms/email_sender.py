@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED, FIRST_COMPLETED
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app
+
+from app import db
+
+
+class EmailSender(object):
+    """Sends emails on a pool of worker threads with at most `concurrency` emails in flight.
+
+    The results are passed to `on_sent` on the calling thread, so the delivery log keeps a single
+    writer. If an email fails to send, the emails already in flight are finished and recorded
+    before the error is raised, as are the `sent_results` of a batch that failed part way through.
+    With a concurrency of 1 emails are sent on the calling thread.
+    """
+
+    def __init__(self, on_sent, concurrency=None):
+        self.on_sent = on_sent
+        self.concurrency = concurrency or current_app.config['EMAIL_SEND_CONCURRENCY']
+        self.app = current_app._get_current_object()
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency) if self.concurrency > 1 else None
+        self.in_flight = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type:
+                try:
+                    self._wait_for_in_flight()
+                except Exception as e:
+                    current_app.logger.error('Error finishing emails in flight: %r', e)
+            else:
+                self._wait_for_in_flight()
+        finally:
+            if self.executor:
+                self.executor.shutdown()
+
+    def _send(self, send_emails):
+        with self.app.app_context():
+            try:
+                return send_emails()
+            finally:
+                db.session.remove()
+
+    def _record_sent(self, futures):
+        error = None
+        for future in futures:
+            try:
+                results = future.result()
+            except Exception as e:
+                error = error or e
+                results = getattr(e, 'sent_results', [])
+            for context, result in results:
+                self.on_sent(context, result)
+        return error
+
+    def _wait_for_in_flight(self, return_when=ALL_COMPLETED):
+        if not self.in_flight:
+            return
+
+        done, self.in_flight = wait(self.in_flight, return_when=return_when)
+
+        error = self._record_sent(done)
+        if error:
+            done, self.in_flight = wait(self.in_flight).done, set()
+            self._record_sent(done)
+            raise error
+
+    def _submit(self, send_emails):
+        if not self.executor:
+            try:
+                results = send_emails()
+            except Exception as e:
+                for context, result in getattr(e, 'sent_results', []):
+                    self.on_sent(context, result)
+                raise
+            for context, result in results:
+                self.on_sent(context, result)
+            return
+
+        if len(self.in_flight) >= self.concurrency:
+            self._wait_for_in_flight(return_when=FIRST_COMPLETED)
+
+        self.in_flight.add(self.executor.submit(self._send, send_emails))
+
+    def send(self, context, send_email, *args, **kwargs):
+        self._submit(lambda: [(context, send_email(*args, **kwargs))])
+
+    def send_batch(self, send_batch_email, *args, **kwargs):
+        """send_batch_email returns a (context, result) for each email in the batch"""
+        self._submit(lambda: send_batch_email(*args, **kwargs))
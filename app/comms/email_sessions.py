@@ -0,0 +1,93 @@
+import threading
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.models import BEARER_AUTH, API_AUTH
+
+# a 429 is not retried here, so the send job's own limit handling pauses and resumes the emails
+RETRY_STATUS_CODES = [500, 502, 503, 504]
+
+
+class EmailProviderSessions(object):
+    """Keeps a requests session per API email provider so that connections to the provider are
+    kept alive between emails.
+
+    A session is replaced when the provider's url, key or auth settings change, and is dropped
+    when the provider is updated with dao_update_email_provider.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+    def _get_settings(self, email_provider):
+        return email_provider.api_url, email_provider.api_key, email_provider.auth_type, email_provider.headers
+
+    def _create_session(self, email_provider):
+        session = requests.Session()
+
+        # a read error is not retried, as the provider may have already accepted the email
+        retries = Retry(
+            total=None,
+            connect=current_app.config['EMAIL_PROVIDER_RETRIES'],
+            read=0,
+            status=current_app.config['EMAIL_PROVIDER_RETRIES'],
+            other=0,
+            backoff_factor=current_app.config['EMAIL_PROVIDER_BACKOFF'],
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(['POST']),
+            respect_retry_after_header=False,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=current_app.config['EMAIL_PROVIDER_POOL_SIZE'],
+            max_retries=retries
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        if email_provider.auth_type == API_AUTH:
+            session.auth = ('api', email_provider.api_key)
+
+        if email_provider.headers:
+            session.headers.update({
+                'accept': 'application/json',
+                'Content-Type': 'application/json'
+            })
+            if email_provider.auth_type == BEARER_AUTH:
+                session.headers['Authorization'] = f"Bearer {email_provider.api_key}"
+            elif email_provider.auth_type == API_AUTH:
+                session.headers['api-key'] = email_provider.api_key
+
+        return session
+
+    def get_session(self, email_provider):
+        settings = self._get_settings(email_provider)
+
+        with self.lock:
+            cached = self.sessions.get(email_provider.id)
+            if cached and cached[0] == settings:
+                return cached[1]
+
+            session = self._create_session(email_provider)
+            self.sessions[email_provider.id] = (settings, session)
+
+        if cached:
+            cached[1].close()
+        return session
+
+    def invalidate(self, email_provider_id):
+        with self.lock:
+            cached = self.sessions.pop(email_provider_id, None)
+
+        if cached:
+            cached[1].close()
+
+
+email_provider_sessions = EmailProviderSessions()
@@ -0,0 +1,116 @@
+import smtplib
+import ssl
+import threading
+import time
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app
+
+SMTP_PORT = 587
+
+
+class SMTPConnectionPool(object):
+    """Keeps authenticated SMTP connections open, keyed by (server, user), so that bulk sends
+    only pay for the STARTTLS, EHLO and LOGIN handshake once per connection.
+
+    A connection is closed once it has sent SMTP_MAX_MESSAGES_PER_CONNECTION messages or has been
+    idle for SMTP_MAX_IDLE_SECONDS, and is replaced if the server disconnects it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = {}
+        self.hits = self.misses = self.reconnects = 0
+
+    def _connect(self, smtp_info):
+        conn = smtplib.SMTP(smtp_info['SMTP_SERVER'], smtp_info.get('SMTP_PORT', SMTP_PORT))
+        try:
+            if smtp_info.get('SMTP_STARTTLS', True):
+                conn.starttls(context=ssl.create_default_context())
+                conn.ehlo()
+            if smtp_info.get('SMTP_USER'):
+                current_app.logger.info('SU: %r', smtp_info["SMTP_USER"][:5])
+                current_app.logger.info('SP: %r', smtp_info["SMTP_PASS"][:3])
+                conn.login(smtp_info["SMTP_USER"], smtp_info["SMTP_PASS"])
+        except Exception:
+            self._close(conn)
+            raise
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
+
+    def _get_connection(self, key, smtp_info):
+        stale_connections = []
+        conn = None
+        with self.lock:
+            idle_connections = self.connections.get(key, [])
+            while idle_connections:
+                conn, messages_sent, last_used = idle_connections.pop()
+                if time.monotonic() - last_used < current_app.config['SMTP_MAX_IDLE_SECONDS']:
+                    break
+                stale_connections.append(conn)
+                conn = None
+
+            if conn:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        for stale_conn in stale_connections:
+            self._close(stale_conn)
+
+        if conn:
+            return conn, messages_sent
+        return self._connect(smtp_info), 0
+
+    def _release_connection(self, key, conn, messages_sent):
+        if messages_sent >= current_app.config['SMTP_MAX_MESSAGES_PER_CONNECTION']:
+            self._close(conn)
+            return
+
+        with self.lock:
+            self.connections.setdefault(key, []).append((conn, messages_sent, time.monotonic()))
+
+    def send_message(self, msg, smtp_info):
+        key = (smtp_info['SMTP_SERVER'], smtp_info['SMTP_USER'])
+        conn, messages_sent = self._get_connection(key, smtp_info)
+
+        try:
+            try:
+                conn.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                current_app.logger.info('SMTP server disconnected, reconnecting to %s', key[0])
+                with self.lock:
+                    self.reconnects += 1
+                conn.close()
+                conn, messages_sent = self._connect(smtp_info), 0
+                conn.send_message(msg)
+        except Exception:
+            self._close(conn)
+            raise
+
+        self._release_connection(key, conn, messages_sent + 1)
+
+    def close_all(self):
+        with self.lock:
+            connections, self.connections = self.connections, {}
+
+        for idle_connections in connections.values():
+            for conn, _, _ in idle_connections:
+                self._close(conn)
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'reconnects': self.reconnects,
+            'idle_connections': sum(len(c) for c in self.connections.values())
+        }
+
+
+smtp_pool = SMTPConnectionPool()
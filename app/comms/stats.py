@@ -1,9 +1,122 @@
+import atexit
+import os
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+import time
+from urllib.parse import urlencode
 import werkzeug
 werkzeug.cached_property = werkzeug.utils.cached_property
 
 from flask import current_app
 import requests
 
+GA_BATCH_URL = "http://www.google-analytics.com/batch"
+
+
+class StatsQueue(object):
+    """Queues Google Analytics events and sends them in batches from a background thread.
+
+    Tracking an event does not wait on google-analytics. When the queue is full new events
+    are dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _start(self, app):
+        with self.lock:
+            # celery workers fork after the app is created, so each process needs its own flusher
+            if self.pid != os.getpid():
+                self.app = app
+                self.queue = Queue(maxsize=app.config['STATS_QUEUE_SIZE'])
+                self.pid = os.getpid()
+                self.thread = None
+                atexit.register(self.flush)
+
+            if not self.thread or not self.thread.is_alive():
+                self.thread = Thread(target=self._run, name='stats-flusher', daemon=True)
+                self.thread.start()
+
+    def _get_batch(self, events=None, timeout=None):
+        events = events or []
+        deadline = time.monotonic() + timeout if timeout else None
+        while len(events) < self.app.config['STATS_BATCH_SIZE']:
+            try:
+                if deadline:
+                    events.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                else:
+                    events.append(self.queue.get_nowait())
+            except Empty:
+                break
+        return events
+
+    def _run(self):
+        while True:
+            events = self._get_batch([self.queue.get()], timeout=self.app.config['STATS_FLUSH_SECONDS'])
+            self._send(events)
+
+    def _send(self, events):
+        headers = {'User-Agent': f'NA-API-{self.app.config.get("ENVIRONMENT")}'}
+        descriptions = ", ".join([description for _, description in events])
+        try:
+            r = requests.post(
+                GA_BATCH_URL,
+                data="\n".join([urlencode(payload) for payload, _ in events]),
+                headers=headers,
+                timeout=self.app.config['STATS_TIMEOUT']
+            )
+            sent = r.status_code == 200
+        except requests.exceptions.RequestException as e:
+            self.app.logger.error(f"Error sending stats: {e!r}")
+            sent = False
+
+        with self.lock:
+            if sent:
+                self.sent += len(events)
+            else:
+                self.failed += len(events)
+
+        if sent:
+            self.app.logger.info(f"Sent stats for {descriptions}")
+        else:
+            self.app.logger.info(f"Failed to track {descriptions}")
+
+    def put(self, payload, description):
+        self._start(current_app._get_current_object())
+        try:
+            self.queue.put_nowait((payload, description))
+        except Full:
+            with self.lock:
+                self.dropped += 1
+            current_app.logger.warning(f"Stats queue full, dropped {description}")
+
+    def flush(self):
+        if not self.queue:
+            return
+
+        events = self._get_batch()
+        while events:
+            self._send(events)
+            events = self._get_batch()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'queued': self.queue.qsize() if self.queue else 0,
+                'sent': self.sent,
+                'dropped': self.dropped,
+                'failed': self.failed
+            }
+
+
+stats_queue = StatsQueue()
+
 
 def send_ga_event(description, category, action, label, value=1):
     payload = {
@@ -22,6 +135,10 @@ def send_ga_event(description, category, action, label, value=1):
         return
 
     if current_app.config["ENVIRONMENT"] != "test":
+        if current_app.config.get("STATS_ASYNC"):
+            stats_queue.put(payload, f"{description}: {category} - {label}, {value}")
+            return
+
         headers = {'User-Agent': f'NA-API-{current_app.config.get("ENVIRONMENT")}'}
         r = requests.post("http://www.google-analytics.com/collect", data=payload, headers=headers)
         if r.status_code != 200:
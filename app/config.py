@@ -39,6 +39,11 @@ class Config(object):
     ADMIN_USERS = os.environ.get('ADMIN_USERS')
     EMAIL_DOMAIN = os.environ.get('EMAIL_DOMAIN')
     EVENTS_MAX = 30
+    ORDERS_PAGE_SIZE = 50
+    ORDERS_PAGE_MAX = 200
+    ORDERS_REPORT_CACHE = os.environ.get('ORDERS_REPORT_CACHE') == '1'
+    CHECK_IN_ROSTER = os.environ.get('CHECK_IN_ROSTER') == '1'
+    EXPORT_BATCH_SIZE = 1000
     PROJECT = os.environ.get('PROJECT')
     STORAGE = os.environ.get('GOOGLE_STORE')
     PAYPAL_URL = os.environ.get('PAYPAL_URL')
@@ -48,6 +53,17 @@ class Config(object):
     PAYPAL_RECEIVER_ID = os.environ.get('PAYPAL_RECEIVER_ID')
     PAYPAL_SIG = os.environ.get('PAYPAL_SIG')
     PAYPAL_VERIFY_URL = os.environ.get('PAYPAL_VERIFY_URL')
+    PAYPAL_IPN_ASYNC = os.environ.get('PAYPAL_IPN_ASYNC') == '1'
+    PAYPAL_IPN_MAX_RETRIES = 5
+    PAYPAL_IPN_RETRY_SECONDS = 60
+    PAYPAL_IPN_STALE_SECONDS = 600
+    QR_CODE_WORKERS = int(os.environ.get('QR_CODE_WORKERS', 4))
+    RESPONSE_CACHE = os.environ.get('RESPONSE_CACHE') == '1'
+    RESPONSE_CACHE_REDIS_URL = os.environ.get('RESPONSE_CACHE_REDIS_URL')
+    RESPONSE_CACHE_SIZE = 500
+    RESPONSE_CACHE_TTL = 60
+    ETAGS = os.environ.get('ETAGS') == '1'
+    ETAGS_TIME_BUCKET = 300
     EMAIL_TOKENS = json.loads(os.environ.get('EMAIL_TOKENS')) if 'EMAIL_TOKENS' \
         in os.environ and os.environ.get('EMAIL_TOKENS')[:1] == '{' else {}
     EMAIL_SALT = os.environ.get('EMAIL_SALT')
@@ -86,6 +102,10 @@ class Config(object):
                 'task': 'send_missing_confirmation_emails',
                 'schedule': crontab(minute=0, hour='9') if ENVIRONMENT != 'development' else crontab(minute='*/10'),
             },
+            'requeue-paypal-ipns': {
+                'task': 'requeue_paypal_ipns',
+                'schedule': crontab(minute='*/10'),
+            },
             # 'send-num-subscribers-and-social-stats': {
             #     'task': 'send_num_subscribers_and_social_stats',
             #     'schedule': crontab(hour=7, day_of_month=1) \
@@ -100,13 +120,28 @@ class Config(object):
     EMAIL_LATEST_TIME = "22:00:00"
     EMAIL_ANYTIME = os.environ.get('EMAIL_ANYTIME') == '1'
     EMAIL_DISABLED = os.environ.get('EMAIL_DISABLED')
+    EMAIL_LOG_BATCH_SIZE = 50
+    EMAIL_LOG_FLUSH_SECONDS = 10
+    EMAIL_STATE_CHECK_SENDS = 5
+    EMAIL_SEND_CONCURRENCY = int(os.environ.get('EMAIL_SEND_CONCURRENCY', 4))
+    EMAIL_PROVIDER_POOL_SIZE = 10
+    EMAIL_PROVIDER_RETRIES = 3
+    EMAIL_PROVIDER_BACKOFF = 0.5
+    EMAIL_PROVIDER_TIMEOUT = 30
 
     GA_ID = os.environ.get('GA_ID')
     DISABLE_STATS = os.environ.get('DISABLE_STATS') == '1'
+    STATS_ASYNC = True
+    STATS_QUEUE_SIZE = 1000
+    STATS_BATCH_SIZE = 20  # the most hits google analytics accepts in a batch request
+    STATS_FLUSH_SECONDS = 5
+    STATS_TIMEOUT = 10
 
     SMTP_SERVER = os.environ.get('SMTP_SERVER')
     SMTP_USER = os.environ.get('SMTP_USER')
     SMTP_PASS = os.environ.get('SMTP_PASS')
+    SMTP_MAX_MESSAGES_PER_CONNECTION = 100
+    SMTP_MAX_IDLE_SECONDS = 60
 
     FACEBOOK_URL = "https://www.facebook.com/pg/newacropolisuk/community/"
     INSTAGRAM_URL = os.environ.get('INSTAGRAM_URL')
@@ -141,6 +176,9 @@ class Preview(Config):
 class Test(Config):
     DEBUG = True
     ENVIRONMENT = 'test'
+    EMAIL_SEND_CONCURRENCY = 1
+    STATS_ASYNC = False
+    QR_CODE_WORKERS = 1
     SESSION_COOKIE_SECURE = False
     SESSION_PROTECTION = None
     EMAIL_LIMIT = 3
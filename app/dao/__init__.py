@@ -1,19 +1,31 @@
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidate_responses
 
 
 @transactional
-def dao_create_record(record):
+def _create_record(record):
     db.session.add(record)
 
 
+def dao_create_record(record):
+    _create_record(record)
+    invalidate_responses(record.__tablename__)
+
+
 @transactional
-def dao_update_record(data_type, id, **kwargs):
+def _update_record(data_type, id, **kwargs):
     return data_type.query.filter_by(id=id).update(
         kwargs
     )
 
 
+def dao_update_record(data_type, id, **kwargs):
+    res = _update_record(data_type, id, **kwargs)
+    invalidate_responses(data_type.__tablename__)
+    return res
+
+
 # def dao_get_record_by_id(data_type, id):
 #     return data_type.query.filter_by(id=id).one()
 
@@ -2,14 +2,17 @@ from sqlalchemy import and_, not_, or_, func
 
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import Article, APPROVED
 
 
+@invalidates_responses('articles')
 @transactional
 def dao_create_article(article):
     db.session.add(article)
 
 
+@invalidates_responses('articles')
 @transactional
 def dao_update_article(article_id, **kwargs):
     if 'tags' in kwargs and kwargs['tags'] and not kwargs['tags'].endswith(','):
@@ -1,13 +1,16 @@
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import Book, BookToOrder
 
 
+@invalidates_responses('books')
 @transactional
 def dao_create_book(book):
     db.session.add(book)
 
 
+@invalidates_responses('books')
 @transactional
 def dao_update_book(book_id, **kwargs):
     return Book.query.filter_by(id=book_id).update(
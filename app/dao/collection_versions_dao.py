@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert
+
+from app import db
+from app.dao.decorators import transactional
+from app.models import CollectionVersion
+
+
+def dao_get_collection_versions(names):
+    versions = dict(
+        db.session.query(CollectionVersion.name, CollectionVersion.version).filter(
+            CollectionVersion.name.in_(names))
+    )
+    return [versions.get(name, 0) for name in names]
+
+
+@transactional
+def dao_increment_collection_versions(names):
+    now = datetime.utcnow()
+    for name in names:
+        statement = insert(CollectionVersion).values(name=name, version=1, updated_at=now)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=[CollectionVersion.name],
+            set_={'version': CollectionVersion.version + 1, 'updated_at': now}
+        ))
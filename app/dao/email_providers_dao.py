@@ -1,6 +1,7 @@
 import json
 
 from app import db
+from app.comms.email_sessions import email_provider_sessions
 from app.dao.decorators import transactional
 from app.dao.emails_dao import dao_get_past_hour_email_count_for_provider, dao_get_todays_email_count_for_provider
 from app.models import EmailProvider
@@ -20,6 +21,7 @@ def dao_update_email_provider(email_provider_id, **kwargs):
     if kwargs.get("data_map"):
         kwargs["data_map"] = json.loads(kwargs["data_map"])
 
+    email_provider_sessions.invalidate(email_provider_id)
     return email_provider_query.update(kwargs)
 
 
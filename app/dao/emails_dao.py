@@ -6,6 +6,7 @@ werkzeug.cached_property = werkzeug.utils.cached_property
 from flask import current_app
 from pytz import timezone
 from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm.exc import NoResultFound
 
 from app import db
@@ -14,7 +15,7 @@ from app.dao.events_dao import dao_get_event_by_id
 from app.dao.magazines_dao import dao_get_magazine_by_id
 from app.dao.members_dao import dao_get_member_by_id
 from app.errors import InvalidRequest
-from app.models import Email, EmailToMember, APPROVED, ANNOUNCEMENT, BASIC, EVENT, MAGAZINE
+from app.models import Email, EmailSendJob, EmailToMember, APPROVED, ANNOUNCEMENT, BASIC, EVENT, MAGAZINE
 
 
 def _get_nearest_bi_monthly_send_date(created_at=None):
@@ -101,6 +102,17 @@ def dao_add_member_sent_to_email(email_id, member_id, status_code=200, email_pro
     email_to_member.email_provider_id = email_provider_id
 
 
+@transactional
+def dao_add_members_sent_to_email(emails_to_members):
+    """Insert a batch of email_to_member rows in a single multi-row INSERT, skipping the members already logged
+    by an overlapping run so the rest of the batch is still logged"""
+    if emails_to_members:
+        db.session.execute(
+            insert(EmailToMember).values(emails_to_members).on_conflict_do_nothing(
+                index_elements=['email_id', 'member_id'])
+        )
+
+
 @transactional
 def dao_create_email_to_member(email_to_member):
     db.session.add(email_to_member)
@@ -201,6 +213,17 @@ def dao_get_past_hour_email_count_for_provider(email_provider_id):
     ).count()
 
 
+def dao_get_past_hour_email_sent_times_for_provider(email_provider_id):
+    now = datetime.now(timezone('Europe/London'))
+
+    return [
+        e.created_at for e in db.session.query(EmailToMember.created_at).filter(
+            EmailToMember.created_at > now - timedelta(hours=1),
+            EmailToMember.email_provider_id == email_provider_id
+        ).order_by(EmailToMember.created_at).all()
+    ]
+
+
 def dao_get_last_minute_email_count_for_provider(email_provider_id):
     now = datetime.now(timezone('Europe/London'))
 
@@ -231,3 +254,18 @@ def dao_get_emails_sent_count(month=None, year=None, end_month=None, end_year=No
         EmailToMember.created_at > f"{year}-{month}-01",
         EmailToMember.created_at < f"{end_year}-{end_month}-01"
     ).count()
+
+
+def dao_get_email_send_job(email_id):
+    return EmailSendJob.query.filter_by(email_id=email_id).first()
+
+
+@transactional
+def dao_create_email_send_job(email_send_job):
+    db.session.add(email_send_job)
+
+
+@transactional
+def dao_update_email_send_job(email_id, **kwargs):
+    kwargs['updated_at'] = datetime.utcnow()
+    return EmailSendJob.query.filter_by(email_id=email_id).update(kwargs)
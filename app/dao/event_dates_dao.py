@@ -2,9 +2,11 @@ from datetime import datetime, timedelta
 
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import EventDate
 
 
+@invalidates_responses('event_dates')
 @transactional
 def dao_create_event_date(event_date, speakers=None):
     if speakers:
@@ -14,12 +16,14 @@ def dao_create_event_date(event_date, speakers=None):
     db.session.add(event_date)
 
 
+@invalidates_responses('event_dates')
 @transactional
 def dao_delete_event_date(event_date_id):
     event_date = EventDate.query.filter_by(id=event_date_id).one()
     db.session.delete(event_date)
 
 
+@invalidates_responses('event_dates')
 @transactional
 def dao_update_event_date(event_date_id, **kwargs):
     return EventDate.query.filter_by(id=event_date_id).update(
@@ -1,13 +1,16 @@
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import EventType
 
 
+@invalidates_responses('event_types')
 @transactional
 def dao_create_event_type(event_type):
     db.session.add(event_type)
 
 
+@invalidates_responses('event_types')
 @transactional
 def dao_update_event_type(event_type_id, **kwargs):
     return EventType.query.filter_by(id=event_type_id).update(
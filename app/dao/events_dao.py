@@ -1,12 +1,30 @@
 from datetime import datetime, timedelta
 
-from sqlalchemy import and_
+from sqlalchemy import and_, func
+from sqlalchemy.orm import joinedload, selectinload
 
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import Event, EventDate, ReservedPlace
 
+# loads everything Event.serialize uses in a fixed number of queries, however many events there are
+EVENT_DETAILS_OPTIONS = [
+    joinedload(Event.event_type),
+    joinedload(Event.venue),
+    selectinload(Event.reject_reasons),
+    selectinload(Event.event_dates).selectinload(EventDate.speakers),
+]
 
+
+def _get_events_query(with_details=False):
+    query = Event.query
+    if with_details:
+        query = query.options(*EVENT_DETAILS_OPTIONS)
+    return query
+
+
+@invalidates_responses('events')
 @transactional
 def dao_create_event(event):
     db.session.add(event)
@@ -29,12 +47,14 @@ def dao_has_reserved_place(name, email, eventdate_id):
     ).first()
 
 
+@invalidates_responses('events')
 @transactional
 def dao_delete_event(event_id):
     event = Event.query.filter_by(id=event_id).one()
     db.session.delete(event)
 
 
+@invalidates_responses('events')
 @transactional
 def dao_update_event(event_id, **kwargs):
     if 'event_dates' in kwargs.keys():
@@ -55,8 +75,29 @@ def dao_update_event(event_id, **kwargs):
     return res
 
 
-def dao_get_events():
-    return Event.query.order_by(Event.id).all()
+def _get_events_by_date_query(with_details=False, start=None, end=None, by_last_date=False, latest_first=False):
+    """Gets each event with a date from start to before end once, ordered by the event's first date,
+    or last date, which is worked out in SQL."""
+    sort_date = (func.max if by_last_date else func.min)(EventDate.event_datetime).label('sort_date')
+    sort_dates = db.session.query(EventDate.event_id, sort_date).group_by(EventDate.event_id).subquery()
+
+    criteria = []
+    if start:
+        criteria.append(EventDate.event_datetime >= start)
+    if end:
+        criteria.append(EventDate.event_datetime < end)
+
+    query = _get_events_query(with_details).join(sort_dates, sort_dates.c.event_id == Event.id, isouter=not criteria)
+    if criteria:
+        query = query.filter(Event.event_dates.any(and_(*criteria)))
+
+    if latest_first:
+        return query.order_by(sort_dates.c.sort_date.desc().nullslast(), Event.id)
+    return query.order_by(sort_dates.c.sort_date.asc().nullslast(), Event.id)
+
+
+def dao_get_events(with_details=False):
+    return _get_events_by_date_query(with_details).all()
 
 
 def dao_get_event_by_id(event_id):
@@ -67,34 +108,23 @@ def dao_get_event_by_old_id(old_event_id):
     return Event.query.filter(Event.old_id == old_event_id).first()
 
 
-def dao_get_events_in_year(year):
-    return Event.query.filter(
-        and_(
-            EventDate.event_datetime >= "{}-01-01".format(year),
-            EventDate.event_datetime < "{}-01-01".format(year + 1)
-        )
-    ).join(Event.event_dates).order_by(EventDate.event_datetime).all()
+def dao_get_events_in_year(year, with_details=False, latest_first=False):
+    return _get_events_by_date_query(
+        with_details, start=datetime(year, 1, 1), end=datetime(year + 1, 1, 1), latest_first=latest_first
+    ).all()
 
 
-def dao_get_limited_events(num):
-    return Event.query.join(
-        Event.event_dates).order_by(
-            EventDate.event_datetime.desc(), EventDate.event_datetime.desc()).limit(num).all()
+def dao_get_limited_events(num, with_details=False):
+    return _get_events_by_date_query(with_details, by_last_date=True, latest_first=True).limit(num).all()
 
 
-def dao_get_future_events():
-    return Event.query.join(EventDate).filter(
-        EventDate.event_datetime >= datetime.today()
-    ).order_by(Event.id).all()
+def dao_get_future_events(with_details=False):
+    return _get_events_by_date_query(with_details, start=datetime.today()).all()
 
 
-def dao_get_past_year_events():
-    return Event.query.filter(
-        and_(
-            EventDate.event_datetime < datetime.today(),
-            EventDate.event_datetime > datetime.today() - timedelta(days=365)
-        )
-    ).join(Event.event_dates).order_by(EventDate.event_datetime).all()
+def dao_get_past_year_events(with_details=False):
+    today = datetime.today()
+    return _get_events_by_date_query(with_details, start=today - timedelta(days=365), end=today).all()
 
 
 def dao_get_existing_event_at_venue(event_dates, venue_id):
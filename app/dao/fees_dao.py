@@ -1,13 +1,16 @@
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import Fee
 
 
+@invalidates_responses('fees')
 @transactional
 def dao_create_fee(fee):
     db.session.add(fee)
 
 
+@invalidates_responses('fees')
 @transactional
 def dao_update_fee(fee_id, **kwargs):
     return Fee.query.filter_by(id=fee_id).update(
@@ -0,0 +1,40 @@
+from functools import wraps
+
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app
+
+from app.dao.collection_versions_dao import dao_increment_collection_versions
+from app.utils.response_cache import response_cache
+
+
+# the tables read by the endpoints using cached_response or etag_response,
+# writes to any other table have no responses to invalidate
+RESPONSE_TABLES = frozenset([
+    'articles', 'books', 'event_dates', 'event_types', 'events', 'fees', 'magazines', 'reject_reasons',
+    'speakers', 'venues'
+])
+
+
+def invalidate_responses(*tables):
+    """Invalidates the cached responses and ETags of the endpoints that read `tables`."""
+    tables = [table for table in tables if table in RESPONSE_TABLES]
+    if not tables:
+        return
+    if current_app.config['RESPONSE_CACHE']:
+        response_cache.invalidate(*tables)
+    if current_app.config['ETAGS']:
+        dao_increment_collection_versions(tables)
+
+
+def invalidates_responses(*tables):
+    """Invalidates the responses that read `tables` once the decorated DAO write has run."""
+    def decorator(func):
+        @wraps(func)
+        def write_and_invalidate(*args, **kwargs):
+            res = func(*args, **kwargs)
+            invalidate_responses(*tables)
+            return res
+        return write_and_invalidate
+    return decorator
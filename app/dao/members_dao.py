@@ -97,12 +97,37 @@ def dao_get_member_by_id(member_id):
         return Member.query.filter_by(old_id=member_id).one()
 
 
-def dao_get_members_not_sent_to(email_id):
-    subquery = db.session.query(EmailToMember.member_id).filter(EmailToMember.email_id == email_id)
+def _get_members_not_sent_to_query(email_id):
+    sent_to_member = db.session.query(EmailToMember.member_id).filter(
+        EmailToMember.email_id == email_id,
+        EmailToMember.member_id == Member.id
+    )
 
     return db.session.query(Member.id, Member.email).filter(
         and_(
-            Member.id.notin_(subquery),
+            ~sent_to_member.exists(),
             Member.active
         )
-    ).all()
+    )
+
+
+def dao_get_members_not_sent_to(email_id, limit=None, after_member_id=None):
+    """Gets the active members that the email has not been sent to, ordered by member id.
+
+    Pass the last member id of a page as `after_member_id` to get the next page.
+    """
+    query = _get_members_not_sent_to_query(email_id)
+    if after_member_id:
+        query = query.filter(Member.id > after_member_id)
+
+    return query.order_by(Member.id).limit(limit).all()
+
+
+def dao_get_members_not_sent_to_count(email_id):
+    return _get_members_not_sent_to_query(email_id).count()
+
+
+def dao_has_members_joined_since(joined_since):
+    return db.session.query(
+        Member.query.filter(Member.created_at > joined_since, Member.active).exists()
+    ).scalar()
@@ -1,22 +1,102 @@
 from datetime import datetime, timedelta
-from sqlalchemy import and_
+from sqlalchemy import and_, extract, func, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import selectinload
 
 from app import db
 from app.dao.decorators import transactional
-from app.models import EventDate, Order
+from app.dao.events_dao import EVENT_DETAILS_OPTIONS
+from app.models import (
+    Book, BookToOrder, Event, EventDate, Order, OrderReportMonth, PaypalIpn, Ticket,
+    PAYPAL_IPN_FAILED, PAYPAL_IPN_PROCESSING, PAYPAL_IPN_QUEUED
+)
+from na_common.delivery import statuses
 
+# loads everything Order.serialize uses in a fixed number of queries, however many orders there are
+ORDER_DETAILS_OPTIONS = [
+    selectinload(Order.books),
+    selectinload(Order.book_quantities),
+    selectinload(Order.errors),
+    selectinload(Order.tickets).selectinload(Ticket.event).options(*EVENT_DETAILS_OPTIONS),
+    selectinload(Order.tickets).selectinload(Ticket.event_date).selectinload(EventDate.speakers),
+]
+
+
+def _get_orders_query(with_details=False, invalid=None, with_linked=False):
+    query = Order.query
+    if with_details:
+        query = query.options(*ORDER_DETAILS_OPTIONS)
+
+    invalid_criteria = None
+    if invalid is not None:
+        invalid_criteria = Order.is_invalid if invalid else ~Order.is_invalid
+        query = query.filter(invalid_criteria)
+
+    if with_linked:
+        linked_transactions = Order.linked_transactions
+        if invalid_criteria is not None:
+            linked_transactions = linked_transactions.and_(invalid_criteria)
+        linked_options = selectinload(linked_transactions)
+        if with_details:
+            linked_options = linked_options.options(*ORDER_DETAILS_OPTIONS)
+        query = query.filter(Order.linked_txn_id.is_(None)).options(linked_options)
+
+    return query
+
+
+def dao_get_orders(year=None, with_details=False, invalid=None, with_linked=False):
+    """Gets the orders, optionally for a year.
+
+    `invalid` set to True or False only returns the orders with or without an invalid txn_id.
+    `with_linked` only returns orders which are not linked to another order, with their linked
+    transactions loaded on `Order.linked_transactions`.
+    """
+    query = _get_orders_query(with_details=with_details, invalid=invalid, with_linked=with_linked)
 
-def dao_get_orders(year=None):
     if not year:
-        return Order.query.order_by(Order.created_at).all()
+        return query.order_by(Order.created_at).all()
     else:
         start_year = f"{year}-01-01"
         end_year = f"{year + 1}-01-01"
-        return Order.query.filter(
+        return query.filter(
             Order.created_at.between(start_year, end_year)
         ).order_by(Order.created_at.desc()).all()
 
 
+def dao_get_orders_page(
+    limit, after=None, with_details=False, invalid=False, start_date=None, end_date=None, **filters
+):
+    """Gets a page of orders, newest first, with their linked transactions.
+
+    `after` is the (created_at, id) of the last order on the previous page. `filters` match order
+    columns such as delivery_status or is_donation, and the dates limit created_at to
+    start_date <= created_at < end_date.
+    """
+    query = _get_orders_query(with_details=with_details, invalid=invalid, with_linked=True).filter_by(**filters)
+
+    if start_date:
+        query = query.filter(Order.created_at >= start_date)
+    if end_date:
+        query = query.filter(Order.created_at < end_date)
+    if after:
+        query = query.filter(tuple_(Order.created_at, Order.id) < after)
+
+    return query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit).all()
+
+
+def dao_get_orders_for_replay(txn_ids=None, start_date=None, end_date=None):
+    """Gets the orders with the txn_ids or created between the dates, oldest first so that orders
+    are replayed before the delivery payments linked to them."""
+    query = Order.query
+    if txn_ids:
+        query = query.filter(Order.txn_id.in_(txn_ids))
+    if start_date:
+        query = query.filter(Order.created_at >= start_date)
+    if end_date:
+        query = query.filter(Order.created_at < end_date)
+    return query.order_by(Order.created_at, Order.id).all()
+
+
 def dao_get_order_with_txn_id(txn_id):
     return Order.query.filter_by(txn_id=txn_id).order_by(Order.created_at).first()
 
@@ -38,3 +118,221 @@ def dao_get_orders_without_email_status():
     ).all()
 
     return orders
+
+
+def dao_get_paypal_ipn(txn_id):
+    return PaypalIpn.query.filter_by(txn_id=txn_id).first()
+
+
+@transactional
+def dao_create_paypal_ipn(paypal_ipn):
+    db.session.add(paypal_ipn)
+
+
+@transactional
+def dao_claim_paypal_ipn(txn_id):
+    """Sets a queued, failed or stale processing IPN to processing, returns False if it is processed or
+    being processed."""
+    return PaypalIpn.query.filter(
+        PaypalIpn.txn_id == txn_id,
+        or_(
+            PaypalIpn.status.in_([PAYPAL_IPN_QUEUED, PAYPAL_IPN_FAILED]),
+            and_(PaypalIpn.status == PAYPAL_IPN_PROCESSING, PaypalIpn.updated_at < PaypalIpn.get_stale_before())
+        )
+    ).update(
+        {
+            'status': PAYPAL_IPN_PROCESSING,
+            'attempts': PaypalIpn.attempts + 1,
+            'updated_at': datetime.utcnow()
+        },
+        synchronize_session=False
+    ) == 1
+
+
+def dao_get_paypal_ipns_to_requeue(max_attempts):
+    """Gets the IPNs left queued or processing by a worker that died, and the failed IPNs with attempts left,
+    that have not been updated since before the stale time."""
+    return PaypalIpn.query.filter(
+        PaypalIpn.updated_at < PaypalIpn.get_stale_before(),
+        or_(
+            PaypalIpn.status.in_([PAYPAL_IPN_QUEUED, PAYPAL_IPN_PROCESSING]),
+            and_(PaypalIpn.status == PAYPAL_IPN_FAILED, PaypalIpn.attempts < max_attempts)
+        )
+    ).order_by(PaypalIpn.created_at).all()
+
+
+@transactional
+def dao_update_paypal_ipn(txn_id, **kwargs):
+    kwargs['updated_at'] = datetime.utcnow()
+    return PaypalIpn.query.filter_by(txn_id=txn_id).update(kwargs)
+
+
+def _get_amount(amount):
+    return f"{amount or 0:.2f}"
+
+
+def _get_report_filters(start_date, end_date):
+    # delivery payments are added to the payment_total of the order they are linked to
+    return [
+        Order.payment_status == 'Completed',
+        ~Order.is_invalid,
+        Order.linked_txn_id.is_(None),
+        Order.created_at >= start_date,
+        Order.created_at < end_date,
+    ]
+
+
+def dao_get_orders_revenue_report(start_date, end_date):
+    """Gets the revenue of the completed orders created from start_date to before end_date, grouped by
+    month, event, ticket type, delivery zone and donation or sale, with the quantity of each book sold."""
+    filters = _get_report_filters(start_date, end_date)
+
+    month = func.to_char(Order.created_at, 'YYYY-MM')
+    months = db.session.query(
+        month, func.count(Order.id), func.sum(Order.payment_total)
+    ).filter(*filters).group_by(month).order_by(month)
+
+    events = db.session.query(
+        Ticket.event_id, Event.title, func.count(Ticket.id), func.sum(Ticket.price)
+    ).join(Order, Ticket.order_id == Order.id).join(Event, Ticket.event_id == Event.id).filter(
+        *filters).group_by(Ticket.event_id, Event.title).order_by(Event.title)
+
+    ticket_types = db.session.query(
+        Ticket.ticket_type, func.count(Ticket.id), func.sum(Ticket.price)
+    ).join(Order, Ticket.order_id == Order.id).filter(*filters).group_by(Ticket.ticket_type).order_by(
+        Ticket.ticket_type)
+
+    # only the quantities, as book_to_order does not keep the price a book was sold at
+    books = db.session.query(
+        BookToOrder.book_id, Book.title, func.sum(BookToOrder.quantity)
+    ).join(Order, BookToOrder.order_id == Order.id).join(Book, BookToOrder.book_id == Book.id).filter(
+        *filters).group_by(BookToOrder.book_id, Book.title).order_by(Book.title)
+
+    delivery_zones = db.session.query(
+        Order.delivery_zone, func.count(Order.id), func.sum(Order.shipping_cost)
+    ).filter(*filters, Order.delivery_zone.isnot(None)).group_by(Order.delivery_zone).order_by(Order.delivery_zone)
+
+    is_donation = func.coalesce(Order.is_donation, False)
+    donations = db.session.query(
+        is_donation, func.count(Order.id), func.sum(Order.payment_total)
+    ).filter(*filters).group_by(is_donation).order_by(is_donation)
+
+    return {
+        'months': [
+            {'month': m, 'orders': count, 'revenue': _get_amount(total)} for m, count, total in months
+        ],
+        'events': [
+            {'event_id': str(event_id), 'title': title, 'tickets': count, 'revenue': _get_amount(total)}
+            for event_id, title, count, total in events
+        ],
+        'ticket_types': [
+            {'ticket_type': ticket_type, 'tickets': count, 'revenue': _get_amount(total)}
+            for ticket_type, count, total in ticket_types
+        ],
+        'books': [
+            {'book_id': str(book_id), 'title': title, 'quantity': quantity}
+            for book_id, title, quantity in books
+        ],
+        'delivery_zones': [
+            {'delivery_zone': delivery_zone, 'orders': count, 'shipping': _get_amount(total)}
+            for delivery_zone, count, total in delivery_zones
+        ],
+        'donations': [
+            {'type': 'donation' if donation else 'sale', 'orders': count, 'revenue': _get_amount(total)}
+            for donation, count, total in donations
+        ],
+    }
+
+
+def dao_get_orders_delivery_report(start_date, end_date):
+    """Gets the delivery balances still to be paid and the refunds still to be issued."""
+    filters = [~Order.is_invalid, Order.created_at >= start_date, Order.created_at < end_date]
+    is_outstanding = Order.delivery_status.in_(
+        [statuses.DELIVERY_EXTRA, statuses.DELIVERY_MISSING_ADDRESS, statuses.DELIVERY_NOT_PAID])
+    is_refund_due = and_(Order.delivery_status == statuses.DELIVERY_REFUND, Order.refund_issued.isnot(True))
+
+    def get_balances(*criteria):
+        count, total = db.session.query(
+            func.count(Order.id), func.sum(Order.delivery_balance)).filter(*filters, *criteria).one()
+        return {'orders': count, 'balance': _get_amount(total)}
+
+    return {
+        'outstanding_delivery': get_balances(is_outstanding),
+        'refunds_due': get_balances(is_refund_due),
+    }
+
+
+def dao_get_order_report_month_versions(start_date, end_date):
+    """Gets a version for each month of the orders created from start_date to before end_date, which
+    changes when an order in the month, or one of its tickets or books, is created, updated or deleted."""
+    month = func.to_char(Order.created_at, 'YYYY-MM')
+    queries = [
+        db.session.query(month, func.count(Order.id), func.sum(extract('epoch', Order.updated_at))),
+        db.session.query(
+            month, func.count(Ticket.id), func.sum(extract('epoch', Ticket.last_updated))
+        ).select_from(Ticket).join(Order, Ticket.order_id == Order.id),
+        db.session.query(
+            month, func.count(BookToOrder.book_id), func.sum(extract('epoch', BookToOrder.updated_at))
+        ).select_from(BookToOrder).join(Order, BookToOrder.order_id == Order.id),
+    ]
+
+    versions = {}
+    for i, query in enumerate(queries):
+        for _month, count, updated_at in query.filter(
+            Order.created_at >= start_date,
+            Order.created_at < end_date
+        ).group_by(month):
+            versions.setdefault(_month, ['0:None'] * len(queries))[i] = f"{count}:{updated_at}"
+    return {_month: '|'.join(version) for _month, version in versions.items()}
+
+
+def dao_get_report_titles(event_ids, book_ids):
+    """Gets the current titles of the events and books in a report, keyed on their ids."""
+    event_titles = db.session.query(Event.id, Event.title).filter(Event.id.in_(event_ids)) if event_ids else []
+    book_titles = db.session.query(Book.id, Book.title).filter(Book.id.in_(book_ids)) if book_ids else []
+    return (
+        {str(event_id): title for event_id, title in event_titles},
+        {str(book_id): title for book_id, title in book_titles}
+    )
+
+
+def dao_get_order_report_months(months):
+    return {m.month: m for m in OrderReportMonth.query.filter(OrderReportMonth.month.in_(months))}
+
+
+@transactional
+def dao_save_order_report_month(month, version, report):
+    """Saves the report of a month, replacing the report of an older version or a concurrent request."""
+    now = datetime.utcnow()
+    statement = insert(OrderReportMonth).values(month=month, version=version, report=report, created_at=now)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[OrderReportMonth.month],
+        set_={'version': version, 'report': report, 'created_at': now}
+    ))
+
+
+def dao_get_orders_export(batch_size, start_date=None, end_date=None):
+    """Gets a row of columns for each order, including its tickets and books, fetched from a server side
+    cursor batch_size rows at a time."""
+    tickets = db.session.query(
+        func.string_agg(func.concat(Event.title, ' - ', Ticket.ticket_type), '; ')
+    ).join(Event, Ticket.event_id == Event.id).filter(Ticket.order_id == Order.id).scalar_subquery()
+    books = db.session.query(
+        func.string_agg(func.concat(Book.title, ' x ', BookToOrder.quantity), '; ')
+    ).join(Book, BookToOrder.book_id == Book.id).filter(BookToOrder.order_id == Order.id).scalar_subquery()
+
+    query = db.session.query(
+        Order.created_at, Order.txn_id, Order.linked_txn_id, Order.txn_type, Order.payment_status,
+        Order.buyer_name, Order.email_address, Order.is_donation,
+        Order.payment_total, Order.shipping_cost,
+        Order.delivery_zone, Order.delivery_status, Order.delivery_balance, Order.refund_issued,
+        Order.address_street, Order.address_city, Order.address_postal_code, Order.address_state,
+        Order.address_country,
+        tickets.label('tickets'), books.label('books')
+    )
+    if start_date:
+        query = query.filter(Order.created_at >= start_date)
+    if end_date:
+        query = query.filter(Order.created_at < end_date)
+
+    return query.order_by(Order.created_at, Order.id).yield_per(batch_size)
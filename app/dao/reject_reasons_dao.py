@@ -1,13 +1,16 @@
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import RejectReason
 
 
+@invalidates_responses('reject_reasons')
 @transactional
 def dao_create_reject_reason(reject_reason):
     db.session.add(reject_reason)
 
 
+@invalidates_responses('reject_reasons')
 @transactional
 def dao_update_reject_reason(reject_reason_id, **kwargs):
     return RejectReason.query.filter_by(id=reject_reason_id).update(
@@ -1,13 +1,16 @@
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import Speaker
 
 
+@invalidates_responses('speakers')
 @transactional
 def dao_create_speaker(speaker):
     db.session.add(speaker)
 
 
+@invalidates_responses('speakers')
 @transactional
 def dao_update_speaker(speaker_id, **kwargs):
     return Speaker.query.filter_by(id=speaker_id).update(
@@ -1,7 +1,10 @@
 from uuid import UUID
 
+from sqlalchemy import or_
+
+from app import db
 from app.dao.decorators import transactional
-from app.models import Ticket
+from app.models import Event, EventDate, Order, Ticket, TICKET_STATUS_USED
 
 
 def dao_get_tickets_for_order(order_id):
@@ -31,3 +34,45 @@ def dao_get_ticket_id(ticket_id):
         return Ticket.query.filter_by(id=ticket_id).first()
     except ValueError:
         return Ticket.query.filter_by(old_id=ticket_id).first()
+
+
+def _get_ticket_filter(ticket_id):
+    try:
+        UUID(ticket_id, version=4)
+        return Ticket.id == ticket_id
+    except ValueError:
+        return Ticket.old_id == ticket_id
+
+
+def _get_check_in_query():
+    return db.session.query(
+        Ticket.id, Ticket.old_id, Ticket.status, Event.title, EventDate.event_datetime
+    ).join(Event, Ticket.event_id == Event.id).outerjoin(EventDate, Ticket.eventdate_id == EventDate.id)
+
+
+def dao_get_check_in_tickets(start, end):
+    return _get_check_in_query().filter(EventDate.event_datetime >= start, EventDate.event_datetime < end).all()
+
+
+def dao_get_check_in_ticket(ticket_id):
+    return _get_check_in_query().filter(_get_ticket_filter(ticket_id)).first()
+
+
+@transactional
+def dao_use_ticket(ticket_id):
+    """Marks the ticket as used, returns False if it was already used.
+
+    The status is checked in the UPDATE, so only one of several concurrent scans can use a ticket.
+    """
+    return Ticket.query.filter(
+        _get_ticket_filter(ticket_id), or_(Ticket.status.is_(None), Ticket.status != TICKET_STATUS_USED)
+    ).update({'status': TICKET_STATUS_USED}, synchronize_session=False) > 0
+
+
+def dao_get_tickets_export(eventdate_id, batch_size):
+    return db.session.query(
+        Ticket.ticket_number, Ticket.name, Ticket.ticket_type, Ticket.price, Ticket.status,
+        Order.txn_id, Order.buyer_name, Order.email_address, Ticket.created_at
+    ).outerjoin(Order, Ticket.order_id == Order.id).filter(
+        Ticket.eventdate_id == eventdate_id
+    ).order_by(Ticket.created_at, Ticket.id).yield_per(batch_size)
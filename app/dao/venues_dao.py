@@ -1,8 +1,10 @@
 from app import db
 from app.dao.decorators import transactional
+from app.dao.invalidation import invalidates_responses
 from app.models import Venue
 
 
+@invalidates_responses('venues')
 @transactional
 def dao_create_venue(venue):
     default = dao_get_default_venue()
@@ -14,6 +16,7 @@ def dao_create_venue(venue):
     db.session.add(venue)
 
 
+@invalidates_responses('venues')
 @transactional
 def dao_update_venue(venue_id, **kwargs):
     if 'default' in kwargs and kwargs['default'] is True:
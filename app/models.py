@@ -8,6 +8,9 @@ import re
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import PrimaryKeyConstraint, UniqueConstraint, and_, or_
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.event import listens_for
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.util import identity_key
 from sqlalchemy.ext.hybrid import hybrid_property
 
 from app import db
@@ -163,6 +166,61 @@ class EmailToMember(db.Model):
         }
 
 
+SEND_JOB_RUNNING = 'running'
+SEND_JOB_PAUSED = 'paused'
+SEND_JOB_COMPLETED = 'completed'
+
+
+class EmailSendJob(db.Model):
+    __tablename__ = 'email_send_jobs'
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    email_id = db.Column(UUID(as_uuid=True), db.ForeignKey('emails.id'), unique=True, nullable=False)
+    status = db.Column(db.String, default=SEND_JOB_RUNNING)
+    last_member_id = db.Column(UUID(as_uuid=True))
+    total_members = db.Column(db.Integer, default=0)
+    sent = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    provider_usage = db.Column(JSONB, default=dict)
+    paused_until = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+
+    def get_remaining(self):
+        return max((self.total_members or 0) - (self.sent or 0) - (self.failed or 0), 0)
+
+    def get_eta(self):
+        if self.status == SEND_JOB_COMPLETED:
+            return self.completed_at
+
+        processed = (self.sent or 0) + (self.failed or 0)
+        elapsed = (self.updated_at - self.started_at).total_seconds()
+        if not processed or elapsed <= 0:
+            return None
+
+        eta = self.updated_at + datetime.timedelta(seconds=self.get_remaining() * elapsed / processed)
+        if self.status == SEND_JOB_PAUSED and self.paused_until:
+            eta = max(eta, self.paused_until)
+        return eta
+
+    def serialize(self):
+        eta = self.get_eta()
+        return {
+            'email_id': str(self.email_id),
+            'status': self.status,
+            'last_member_id': str(self.last_member_id) if self.last_member_id else None,
+            'total_members': self.total_members,
+            'sent': self.sent,
+            'failed': self.failed,
+            'remaining': self.get_remaining(),
+            'provider_usage': self.provider_usage,
+            'paused_until': self.paused_until.strftime('%Y-%m-%d %H:%M:%S') if self.paused_until else None,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'eta': eta.strftime('%Y-%m-%d %H:%M:%S') if eta else None
+        }
+
+
 BEARER_AUTH = 'bearer'
 API_AUTH = 'api'
 
@@ -186,6 +244,7 @@ class EmailProvider(db.Model):
     smtp_user = db.Column(db.String)
     smtp_password = db.Column(db.String)
     available = db.Column(db.Boolean)
+    batch_size = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
     def serialize(self):
@@ -207,6 +266,7 @@ class EmailProvider(db.Model):
             'smtp_user': self.smtp_user,
             'smtp_password': self.smtp_password,
             'available': self.available,
+            'batch_size': self.batch_size,
             'created_at': str(self.created_at)
         }
 
@@ -482,6 +542,18 @@ class Event(db.Model):
             )
         return event_dates
 
+    _sorted_event_dates = None
+
+    @property
+    def sorted_event_dates(self):
+        """The event dates sorted by event_datetime, kept until event_dates changes."""
+        if self._sorted_event_dates is None:
+            self._sorted_event_dates = sorted(self.event_dates, key=lambda e: e.event_datetime)
+        return self._sorted_event_dates
+
+    def clear_sorted_event_dates(self):
+        self._sorted_event_dates = None
+
     def is_event_today(self, eventdate_id):
         for date in self.event_dates:
             if (
@@ -493,36 +565,25 @@ class Event(db.Model):
 
     def get_sorted_event_dates(self):
         if self.event_dates:
-            dates = [e.serialize() for e in self.event_dates]
-            dates.sort(key=lambda k: k['event_datetime'])
-            return dates
+            return [e.serialize() for e in self.sorted_event_dates]
 
     def get_first_event_date(self):
-        dates = self.get_sorted_event_dates()
-        if dates:
-            return dates[0]['event_datetime'].split(' ')[0]
+        if self.event_dates:
+            return self.sorted_event_dates[0].event_datetime.strftime('%Y-%m-%d')
 
     def get_last_event_date(self):
-        dates = self.get_sorted_event_dates()
-        if dates:
-            return dates[-1]['event_datetime'].split(' ')[0]
+        if self.event_dates:
+            return self.sorted_event_dates[-1].event_datetime.strftime('%Y-%m-%d')
 
     def serialize(self, with_dates=True):
-        def sorted_event_dates():
-            dates = [e.serialize() for e in self.event_dates]
-            dates.sort(key=lambda k: k['event_datetime'])
-            return dates
-
         def serlialized_reject_reasons():
             reject_reasons = [r.serialize() for r in self.reject_reasons]
             reject_reasons.sort(key=lambda k: k['resolved'])
             return reject_reasons
 
-        def has_expired(_sorted_event_dates):
-            return datetime.date.today().strftime(
-                '%Y-%m-%d %H:%M') > _sorted_event_dates[-1]['event_datetime']
-
-        _sorted_event_dates = sorted_event_dates()
+        def has_expired():
+            return datetime.datetime.combine(
+                datetime.date.today(), datetime.time()) > self.sorted_event_dates[-1].event_datetime
 
         _event_json = {
             'id': str(self.id),
@@ -541,13 +602,13 @@ class Event(db.Model):
             'venue': self.venue.serialize() if self.venue else None,
             'event_state': self.event_state,
             'reject_reasons': serlialized_reject_reasons(),
-            'has_expired': has_expired(_sorted_event_dates),
+            'has_expired': has_expired(),
             'show_banner_text': self.show_banner_text,
             'headline': self.headline,
         }
 
         if with_dates:
-            _event_json.update({'event_dates': sorted_event_dates()})
+            _event_json.update({'event_dates': [e.serialize() for e in self.sorted_event_dates]})
 
         if self.remote_access:
             _event_json.update(
@@ -573,6 +634,9 @@ event_date_to_speaker = db.Table(
 
 class EventDate(db.Model):
     __tablename__ = 'event_dates'
+    __table_args__ = (
+        db.Index('ix_event_dates_event_datetime_event_id', 'event_datetime', 'event_id'),
+    )
 
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     event_id = db.Column(UUID(as_uuid=True), db.ForeignKey('events.id'), nullable=True)
@@ -606,6 +670,25 @@ class EventDate(db.Model):
         }
 
 
+@listens_for(Event.event_dates, 'append')
+@listens_for(Event.event_dates, 'remove')
+@listens_for(Event.event_dates, 'bulk_replace')
+@listens_for(Event, 'expire')
+@listens_for(Event, 'refresh')
+def _clear_sorted_event_dates(target, *args):
+    target.clear_sorted_event_dates()
+
+
+@listens_for(EventDate.event_datetime, 'set')
+def _clear_event_sorted_event_dates(target, *args):
+    # only an event already loaded can have its event dates sorted, so look for it without a query
+    event = target.__dict__.get('event')
+    if event is None and target.event_id and object_session(target):
+        event = object_session(target).identity_map.get(identity_key(Event, target.event_id))
+    if event:
+        event.clear_sorted_event_dates()
+
+
 class EventStates(db.Model):
     __tablename__ = 'event_states'
 
@@ -801,6 +884,8 @@ DELIVERY_REFUND_EU_UK = 'eu-uk', 2.50
 DELIVERY_REFUND_ROW_UK = 'row-uk', 4
 DELIVERY_REFUND_ROW_EU = 'row-eu', 1.5
 
+INVALID_TXN_ID_PREFIXES = ('XX-', 'INVALID_')
+
 
 class Order(db.Model):
     __tablename__ = "orders"
@@ -835,8 +920,17 @@ class Order(db.Model):
     shipping_cost = db.Column(db.Numeric(4, 2), default=0)
     delivery_sent = db.Column(db.Boolean)
     refund_issued = db.Column(db.Boolean)
+    # set on every write, including bulk updates, so the cached report months see the change
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     books = db.relationship(
         "Book", secondary="book_to_order", order_by='Book.title', cascade="all,delete")
+    book_quantities = db.relationship("BookToOrder", viewonly=True)
+    linked_transactions = db.relationship(
+        "Order",
+        primaryjoin="remote(foreign(Order.linked_txn_id)) == Order.txn_id",
+        order_by='Order.created_at',
+        viewonly=True
+    )
     tickets = db.relationship(
         "Ticket", back_populates="order", cascade="all,delete,delete-orphan")
     errors = db.relationship(
@@ -847,6 +941,14 @@ class Order(db.Model):
     )
     notes = db.Column(db.String)
 
+    @hybrid_property
+    def is_invalid(self):
+        return self.txn_id.startswith(INVALID_TXN_ID_PREFIXES)
+
+    @is_invalid.expression
+    def is_invalid(cls):
+        return or_(*[cls.txn_id.startswith(prefix) for prefix in INVALID_TXN_ID_PREFIXES])
+
     def serialize(self):
         def get_serialized_list(array, delete_created_at=True):
             _list = []
@@ -859,10 +961,10 @@ class Order(db.Model):
 
         _json = self.short_serialize()
 
+        quantities = {str(b.book_id): b.quantity for b in self.book_quantities}
         books_json = get_serialized_list(self.books)
         for book in books_json:
-            book_to_order = BookToOrder.query.filter_by(book_id=book['id'], order_id=self.id).one()
-            book['quantity'] = book_to_order.quantity
+            book['quantity'] = quantities[book['id']]
 
         _json.update(
             books=books_json,
@@ -924,6 +1026,61 @@ class BookToOrder(db.Model):
     book_id = db.Column(UUID(as_uuid=True), db.ForeignKey('books.id'))
     order_id = db.Column(UUID(as_uuid=True), db.ForeignKey('orders.id'))
     quantity = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+
+class OrderReportMonth(db.Model):
+    __tablename__ = 'order_report_months'
+    month = db.Column(db.String(7), primary_key=True)
+    version = db.Column(db.String)
+    report = db.Column(JSONB)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+
+class CollectionVersion(db.Model):
+    __tablename__ = 'collection_versions'
+    name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+
+PAYPAL_IPN_QUEUED = 'queued'
+PAYPAL_IPN_PROCESSING = 'processing'
+PAYPAL_IPN_PROCESSED = 'processed'
+PAYPAL_IPN_FAILED = 'failed'
+
+
+class PaypalIpn(db.Model):
+    __tablename__ = 'paypal_ipns'
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    txn_id = db.Column(db.String, unique=True, nullable=False)
+    params = db.Column(JSONB)
+    status = db.Column(db.String, default=PAYPAL_IPN_QUEUED)
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.String)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    @staticmethod
+    def get_stale_before():
+        """An IPN left queued or processing since before this was left by a worker that died"""
+        return datetime.datetime.utcnow() - datetime.timedelta(seconds=current_app.config['PAYPAL_IPN_STALE_SECONDS'])
+
+    @property
+    def is_stale(self):
+        return self.status in [PAYPAL_IPN_QUEUED, PAYPAL_IPN_PROCESSING] and self.updated_at < self.get_stale_before()
+
+    def serialize(self):
+        return {
+            'txn_id': self.txn_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'processed_at': self.processed_at.strftime('%Y-%m-%d %H:%M:%S') if self.processed_at else None
+        }
 
 
 TICKET_FULL = 'Full'
@@ -963,7 +1120,7 @@ class Ticket(db.Model):
     eventdate_id = db.Column(UUID(as_uuid=True), db.ForeignKey('event_dates.id'))
     name = db.Column(db.String)
     price = db.Column(db.Numeric(5, 2))
-    last_updated = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    last_updated = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     status = db.Column(db.String, db.ForeignKey('ticket_statuses.status'), default=TICKET_STATUS_UNUSED)
     ticket_number = db.Column(db.Integer)
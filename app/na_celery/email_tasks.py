@@ -5,87 +5,218 @@ werkzeug.cached_property = werkzeug.utils.cached_property
 from flask import current_app
 import pytz
 
-from app import celery
-from app.comms.email import send_email, get_email_html, get_email_provider
+from app import celery, db
+from app.comms.email import (
+    send_batch_email, send_email, get_batch_size, get_email_html, get_email_provider, get_personalised_email_html,
+    UNSUBCODE_PLACEHOLDER
+)
+from app.comms.email_log import EmailLogWriter
+from app.comms.email_quota import EmailQuota
+from app.comms.email_sender import EmailSender
+from app.comms.smtp_pool import smtp_pool
 from app.comms.stats import send_ga_event
 from app.dao import dao_update_record
 from app.dao.emails_dao import (
-    dao_get_email_by_id, dao_add_member_sent_to_email, dao_get_approved_emails_for_sending, dao_has_child_email
+    dao_create_email_send_job,
+    dao_get_email_by_id,
+    dao_get_email_send_job,
+    dao_get_approved_emails_for_sending,
+    dao_has_child_email,
+    dao_update_email_send_job
+)
+from app.dao.members_dao import (
+    dao_get_members_not_sent_to,
+    dao_get_members_not_sent_to_count,
+    dao_get_first_member,
+    dao_has_members_joined_since
 )
-from app.dao.members_dao import dao_get_members_not_sent_to, dao_get_first_member
 from app.dao.orders_dao import dao_get_orders_without_email_status
 from app.dao.users_dao import dao_get_admin_users
 from app.errors import InvalidRequest
-from app.models import BASIC, EVENT, MAGAZINE, APPROVED, Order
+from app.models import (
+    BASIC, EVENT, MAGAZINE, APPROVED, SEND_JOB_COMPLETED, SEND_JOB_PAUSED, SEND_JOB_RUNNING, EmailSendJob, Order
+)
 from app.routes.orders.rest import _replay_paypal_ipn
 
+LIMIT_PAUSES = {
+    'Minute': timedelta(minutes=1),
+    'Hourly': timedelta(hours=1),
+    'Daily': timedelta(days=1),
+    'Monthly': timedelta(days=1),
+}
+
+
+def _start_email_send_job(email_id):
+    email_send_job = dao_get_email_send_job(email_id)
+    if not email_send_job:
+        email_send_job = EmailSendJob(
+            email_id=email_id,
+            status=SEND_JOB_RUNNING,
+            total_members=dao_get_members_not_sent_to_count(email_id),
+            provider_usage={}
+        )
+        dao_create_email_send_job(email_send_job)
+    elif email_send_job.status != SEND_JOB_RUNNING:
+        dao_update_email_send_job(
+            email_id,
+            status=SEND_JOB_RUNNING,
+            paused_until=None,
+            completed_at=None,
+            total_members=(email_send_job.sent + email_send_job.failed +
+                           dao_get_members_not_sent_to_count(email_id))
+        )
+    return email_send_job
+
+
+def _checkpoint_email_send_job(email_send_job, emails_to_members):
+    sent = len([e for e in emails_to_members if e['status_code'] in [200, 201, 202]])
+
+    provider_usage = dict(email_send_job.provider_usage or {})
+    for email_to_member in emails_to_members:
+        email_provider_id = str(email_to_member['email_provider_id'])
+        provider_usage[email_provider_id] = provider_usage.get(email_provider_id, 0) + 1
+
+    last_member_id = max([e['member_id'] for e in emails_to_members])
+    if email_send_job.last_member_id and email_send_job.last_member_id > last_member_id:
+        last_member_id = email_send_job.last_member_id
+
+    dao_update_email_send_job(
+        email_send_job.email_id,
+        sent=EmailSendJob.sent + sent,
+        failed=EmailSendJob.failed + len(emails_to_members) - sent,
+        provider_usage=provider_usage,
+        last_member_id=last_member_id
+    )
+
+
+def _can_resume_email_send_job(email_send_job):
+    if email_send_job.status == SEND_JOB_PAUSED:
+        return not email_send_job.paused_until or email_send_job.paused_until <= datetime.utcnow()
+    elif email_send_job.status == SEND_JOB_COMPLETED:
+        return dao_has_members_joined_since(email_send_job.completed_at)
+    return True
+
 
 def send_emails(email_id):
-    if current_app.config.get('EMAIL_TEST'):
-        member = dao_get_first_member()
-        members_not_sent_to = [(member.id, member.email)]
-    else:
-        members_not_sent_to = dao_get_members_not_sent_to(email_id)
+    email_quota = EmailQuota()
 
+    batch_size = 1
     if current_app.config.get('EMAIL_RESTRICT') or current_app.config.get('EMAIL_TEST'):
         limit = 1
     elif current_app.config.get('ENVIRONMENT') == 'live':
-        email_provider = get_email_provider(use_minute_limit=False)
+        email_provider = get_email_provider(use_minute_limit=False, email_quota=email_quota)
         limit = email_provider.limit
+        batch_size = get_batch_size(email_provider)
     else:
         limit = current_app.config.get('EMAIL_LIMIT')
 
+    email_send_job = None
+    from_first_member = True
+    if current_app.config.get('EMAIL_TEST'):
+        member = dao_get_first_member()
+        members_not_sent_to = [(member.id, member.email)]
+    else:
+        # only fetch the members that can be sent to in this run, carrying on from the send job checkpoint
+        email_send_job = _start_email_send_job(email_id)
+        members_not_sent_to = dao_get_members_not_sent_to(
+            email_id, limit=limit or None, after_member_id=email_send_job.last_member_id)
+        from_first_member = not email_send_job.last_member_id
+
+        if not members_not_sent_to and not from_first_member:
+            # start again from the first member to pick up members missed by an interrupted run
+            members_not_sent_to = dao_get_members_not_sent_to(email_id, limit=limit or None)
+            from_first_member = True
+    is_last_page = not limit or len(members_not_sent_to) < limit
+
     current_app.logger.info(
-        'Task send_emails received %s, sending %d emails',
-        str(email_id),
-        len(members_not_sent_to) if len(members_not_sent_to) < limit else limit
-    )
+        'Task send_emails received %s, sending %d emails', str(email_id), len(members_not_sent_to))
 
     email = dao_get_email_by_id(email_id)
 
+    # render the email once, each member's copy only differs by the unsubscribe code
+    subject = email.get_subject()
+    email_html = None
+    if email.email_type == EVENT:
+        email_html = get_email_html(
+            email.email_type,
+            event_id=email.event_id,
+            details=email.details,
+            extra_txt=email.extra_txt,
+            unsubcode=UNSUBCODE_PLACEHOLDER
+        )
+    elif email.email_type == MAGAZINE:
+        email_html = get_email_html(MAGAZINE, magazine_id=email.magazine_id, unsubcode=UNSUBCODE_PLACEHOLDER)
+    elif email.email_type == BASIC:
+        email_html = get_email_html(BASIC, message=email.extra_txt)
+
+    def email_sent(member_id, result):
+        email_status_code, email_provider_id = result
+        if not current_app.config.get('EMAIL_TEST'):
+            email_log.add(member_id, status_code=email_status_code, email_provider_id=email_provider_id)
+
+        send_ga_event(
+            f"Sent {email.email_type} email, {subject} - {str(email.id)}",
+            "email",
+            "send success" if email_status_code in [200, 201, 202] else "send failed",
+            f"{subject} - {email.id}")
+
+    def checkpoint(emails_to_members):
+        if email_send_job:
+            _checkpoint_email_send_job(email_send_job, emails_to_members)
+
+    stopped = False
     try:
-        for index, (member_id, email_to) in enumerate(members_not_sent_to):
-            if limit and index > limit - 1 or email.email_state != APPROVED:
-                current_app.logger.info("Email stopped - {}".format(
-                    "not approved" if email.email_state != APPROVED else f"limit reached: {limit}"))
-                break
-            subject = email.get_subject()
-            message = None
-            if email.email_type == EVENT:
-                message = get_email_html(
-                    email.email_type,
-                    event_id=email.event_id,
-                    details=email.details,
-                    extra_txt=email.extra_txt,
-                    member_id=member_id
-                )
-            elif email.email_type == MAGAZINE:
-                message = get_email_html(MAGAZINE, magazine_id=email.magazine_id, member_id=member_id)
-            elif email.email_type == BASIC:
-                message = get_email_html(BASIC, message=email.extra_txt)
-
-            email_status_code, email_provider_id = send_email(email_to, subject, message)
-            if not current_app.config.get('EMAIL_TEST'):
-                dao_add_member_sent_to_email(
-                    email_id, member_id, status_code=email_status_code,
-                    email_provider_id=email_provider_id
-                )
+        with EmailLogWriter(email_id, on_flush=checkpoint) as email_log, \
+                EmailSender(email_sent) as email_sender:
+            unchecked_sends = 0
+            for index in range(0, len(members_not_sent_to), batch_size):
+                # reload the email state every few sends, so an email can still be stopped while it is being sent
+                if unchecked_sends >= current_app.config['EMAIL_STATE_CHECK_SENDS']:
+                    db.session.refresh(email, ['email_state'])
+                    unchecked_sends = 0
+
+                if limit and index > limit - 1 or email.email_state != APPROVED:
+                    current_app.logger.info("Email stopped - {}".format(
+                        "not approved" if email.email_state != APPROVED else f"limit reached: {limit}"))
+                    stopped = True
+                    break
 
-            send_ga_event(
-                f"Sent {email.email_type} email, {subject} - {str(email.id)}",
-                "email",
-                "send success" if email_status_code in [200, 201, 202] else "send failed",
-                f"{subject} - {email.id}")
+                if batch_size > 1:
+                    batch = members_not_sent_to[index:min(index + batch_size, limit or len(members_not_sent_to))]
+                    email_sender.send_batch(send_batch_email, batch, subject, email_html, email_quota=email_quota)
+                    unchecked_sends += len(batch)
+                else:
+                    member_id, email_to = members_not_sent_to[index]
+                    message = get_personalised_email_html(email_html, member_id) if email_html else None
+
+                    email_sender.send(member_id, send_email, email_to, subject, message, email_quota=email_quota)
+                    unchecked_sends += 1
+
+        if email_send_job and is_last_page and not stopped:
+            if from_first_member:
+                dao_update_email_send_job(
+                    email_id, status=SEND_JOB_COMPLETED, completed_at=datetime.utcnow(), last_member_id=None)
+            else:
+                dao_update_email_send_job(email_id, last_member_id=None)
     except InvalidRequest as e:
         if e.status_code == 429:
             current_app.logger.error("Email limit reached: %r", e.message)
-            if "Minute" in e.message:
-                send_periodic_emails.apply_async(countdown=60)
+            limit_reached = next((name for name in LIMIT_PAUSES.keys() if name in e.message), 'Minute')
+            if email_send_job:
+                dao_update_email_send_job(
+                    email_id,
+                    status=SEND_JOB_PAUSED,
+                    paused_until=datetime.utcnow() + LIMIT_PAUSES[limit_reached]
+                )
+            if limit_reached == 'Minute':
+                resume_email_send_job.apply_async((str(email_id),), countdown=60)
         raise
+    finally:
+        current_app.logger.info('SMTP pool stats: %r', smtp_pool.get_stats())
+        smtp_pool.close_all()
 
 
-@celery.task(name='send_periodic_emails')
-def send_periodic_emails():
+def _is_out_of_hours(task_name):
     tz_London = pytz.timezone('Europe/London')
     current_time = datetime.strftime(datetime.now(tz_London), "%H:%M:%S")
 
@@ -95,8 +226,15 @@ def send_periodic_emails():
         if current_app.config['ENVIRONMENT'] != 'development' and \
                 (current_time < current_app.config['EMAIL_EARLIEST_TIME'] or
                     current_time > current_app.config['EMAIL_LATEST_TIME']):
-            current_app.logger.info('Task send_periodic_emails received: not between 8am and 10pm')
-            return
+            current_app.logger.info(f'Task {task_name} received: not between 8am and 10pm')
+            return True
+    return False
+
+
+@celery.task(name='send_periodic_emails')
+def send_periodic_emails():
+    if _is_out_of_hours('send_periodic_emails'):
+        return
 
     emails = dao_get_approved_emails_for_sending()
     current_app.logger.info('Task send_periodic_emails received: {}'.format(
@@ -104,9 +242,24 @@ def send_periodic_emails():
 
     for email in emails:
         if not dao_has_child_email(email.id):
+            email_send_job = dao_get_email_send_job(email.id)
+            if email_send_job and not _can_resume_email_send_job(email_send_job):
+                current_app.logger.info('Email send job %s %s', str(email.id), email_send_job.status)
+                continue
+
             send_emails(email.id)
 
 
+@celery.task(name='resume_email_send_job')
+def resume_email_send_job(email_id):
+    if _is_out_of_hours('resume_email_send_job'):
+        return
+
+    email = dao_get_email_by_id(email_id)
+    if email.email_state == APPROVED and not dao_has_child_email(email.id):
+        send_emails(email_id)
+
+
 @celery.task(name='send_missing_confirmation_emails')
 def send_missing_confirmation_emails():
     for order in dao_get_orders_without_email_status():
@@ -1,12 +1,18 @@
 import werkzeug
 werkzeug.cached_property = werkzeug.utils.cached_property
 
+from datetime import datetime, timedelta
 from flask import current_app
 from sqlalchemy.orm.exc import NoResultFound
 
 from app import celery
 from app.dao.events_dao import dao_get_event_by_id, dao_update_event
+from app.dao.orders_dao import (
+    dao_claim_paypal_ipn, dao_get_order_with_txn_id, dao_get_paypal_ipn, dao_get_paypal_ipns_to_requeue,
+    dao_update_paypal_ipn
+)
 from app.errors import PaypalException
+from app.models import PAYPAL_IPN_FAILED, PAYPAL_IPN_PROCESSED, PaypalIpn
 from app.payments.paypal import PayPal
 
 
@@ -41,3 +47,54 @@ def create_update_paypal_button_task(self, event_id):
     except PaypalException as e:
         dao_update_event(event_id, booking_code=f'error: {str(e)[:40]}')
         current_app.logger.error(f'Paypal error trying to create_update_paypal_button {e} {event_id}')
+
+
+# acked once processed, so the broker redelivers an IPN whose worker died
+@celery.task(bind=True, name='process_paypal_ipn', acks_late=True)
+def process_paypal_ipn(self, txn_id):
+    # imported here as the orders routes import this module to queue IPNs
+    from app.routes.orders.rest import paypal_ipn
+
+    current_app.logger.info('Task process_paypal_ipn received for %s', txn_id)
+
+    if not dao_claim_paypal_ipn(txn_id):
+        current_app.logger.info('Paypal IPN %s is already processed or being processed', txn_id)
+        return
+
+    ipn = dao_get_paypal_ipn(txn_id)
+    # an order left by a failed attempt is replaced, otherwise an existing order is a duplicate IPN
+    replace_order = ipn.attempts > 1 and dao_get_order_with_txn_id(txn_id) is not None
+
+    try:
+        with current_app.test_request_context('/orders/paypal/ipn', method='POST'):
+            response = paypal_ipn(ipn.params, verify=True, replace_order=replace_order)
+    except Exception as e:
+        current_app.logger.exception('Paypal IPN %s failed on attempt %d', txn_id, ipn.attempts)
+        dao_update_paypal_ipn(txn_id, status=PAYPAL_IPN_FAILED, error=str(e)[:255])
+        raise self.retry(
+            exc=e,
+            countdown=current_app.config['PAYPAL_IPN_RETRY_SECONDS'] * 2 ** self.request.retries,
+            max_retries=current_app.config['PAYPAL_IPN_MAX_RETRIES']
+        )
+
+    error = response[0] if isinstance(response, tuple) else None
+    dao_update_paypal_ipn(txn_id, status=PAYPAL_IPN_PROCESSED, processed_at=datetime.utcnow(), error=error)
+
+
+@celery.task(name='requeue_paypal_ipns')
+def requeue_paypal_ipns():
+    """Queues the IPNs again that were lost with a worker that died, or never sent to a worker, as neither
+    the broker nor Paypal will send them again."""
+    current_app.logger.info('Task requeue_paypal_ipns received')
+
+    stale_before = PaypalIpn.get_stale_before()
+    for ipn in dao_get_paypal_ipns_to_requeue(current_app.config['PAYPAL_IPN_MAX_RETRIES'] + 1):
+        if ipn.status == PAYPAL_IPN_FAILED:
+            retry_at = ipn.updated_at + timedelta(
+                seconds=current_app.config['PAYPAL_IPN_RETRY_SECONDS'] * 2 ** (ipn.attempts - 1))
+            if retry_at > stale_before:
+                # the failed attempt's retry is still to come
+                continue
+
+        current_app.logger.info('Requeuing Paypal IPN %s left %s', ipn.txn_id, ipn.status)
+        process_paypal_ipn.apply_async((ipn.txn_id,))
@@ -7,7 +7,9 @@ import os
 
 from app import celery
 from app import db
+from app.comms.stats import stats_queue
 from app.errors import register_errors
+from app.utils.response_cache import response_cache
 
 base_blueprint = Blueprint('base', __name__)
 register_errors(base_blueprint)
@@ -58,6 +60,8 @@ def get_info_without_db():
     resp = {
         'environment': current_app.config['ENVIRONMENT'],
         'commit': current_app.config['GITHUB_SHA'],
+        'stats': stats_queue.get_stats(),
+        'response_cache': response_cache.get_stats()
     }
 
     if current_app.config.get('EMAIL_RESTRICT'):  # pragma: no cover
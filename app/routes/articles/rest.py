@@ -41,6 +41,8 @@ from app.routes.articles.schemas import (
 
 from app.models import Article, APPROVED, READY, REJECTED
 from app.schema_validation import validate
+from app.utils.etags import etag_response
+from app.utils.response_cache import cached_response
 from app.utils.storage import Storage
 
 articles_blueprint = Blueprint('articles', __name__)
@@ -51,6 +53,7 @@ register_errors(article_blueprint)
 
 @articles_blueprint.route('/articles')
 @jwt_required()
+@etag_response('articles')
 def get_articles():
     articles = [a.serialize() if a else None for a in dao_get_articles()]
     return jsonify(articles)
@@ -74,12 +77,16 @@ def get_articles_by_tags(tags=None, summary=False):
 
 @articles_blueprint.route('/articles/summary/tags/<string:tags>')
 @jwt_required()
+@etag_response('articles')
+@cached_response('articles')
 def get_articles_summary_by_tags(tags):
     return get_articles_by_tags(tags, summary=True)
 
 
 @articles_blueprint.route('/articles/summary')
 @jwt_required()
+@etag_response('articles')
+@cached_response('articles')
 def get_articles_summary(ids=None):
     current_app.logger.info('Limit articles summary to 5')
 
@@ -25,6 +25,8 @@ from app.routes.books.schemas import post_import_books_schema, post_update_book_
 
 from app.models import Book
 from app.schema_validation import validate
+from app.utils.etags import etag_response
+from app.utils.response_cache import cached_response
 
 from app.utils.storage import Storage
 
@@ -37,6 +39,8 @@ register_errors(book_blueprint)
 
 @books_blueprint.route('/books')
 @jwt_required()
+@etag_response('books')
+@cached_response('books')
 def get_books():
     books = [a.serialize() if a else None for a in dao_get_books()]
     return jsonify(books)
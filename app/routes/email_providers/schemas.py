@@ -10,6 +10,7 @@ post_create_email_provider_schema = {
         "api_url": {"type": "string"},
         "data_map": {"type": "string"},
         "pos": {"type": "integer"},
+        "batch_size": {"type": "integer"},
     },
     "required": ["name", "daily_limit", "pos"]
 }
@@ -26,5 +27,6 @@ post_update_email_provider_schema = {
         "api_url": {"type": "string"},
         "data_map": {"type": "string"},
         "pos": {"type": "integer"},
+        "batch_size": {"type": "integer"},
     },
 }
@@ -27,6 +27,7 @@ from app.dao.emails_dao import (
     dao_get_email_by_id,
     dao_get_email_by_event_id,
     dao_get_email_by_magazine_id,
+    dao_get_email_send_job,
     dao_get_emails_for_year_starting_on,
     dao_update_email,
 )
@@ -159,6 +160,16 @@ def update_email(email_id):
     raise InvalidRequest('{} did not update email'.format(email_id), 400)
 
 
+@emails_blueprint.route('/email/<uuid:email_id>/progress', methods=['GET'])
+@jwt_required()
+def get_email_progress(email_id):
+    email_send_job = dao_get_email_send_job(email_id)
+    if not email_send_job:
+        raise InvalidRequest('Email {} has not started sending'.format(email_id), 404)
+
+    return jsonify(email_send_job.serialize())
+
+
 @emails_blueprint.route('/email/types', methods=['GET'])
 @jwt_required()
 def get_email_types():
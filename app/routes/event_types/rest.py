@@ -25,6 +25,7 @@ from app.routes.event_types.schemas import (
 )
 from app.models import EventType
 from app.schema_validation import validate
+from app.utils.etags import etag_response
 
 event_types_blueprint = Blueprint('event_types', __name__)
 event_type_blueprint = Blueprint('event_type', __name__)
@@ -34,6 +35,7 @@ register_errors(event_type_blueprint)
 
 @event_types_blueprint.route('/event_types')
 @jwt_required()
+@etag_response('event_types', 'fees')
 def get_event_types():
     current_app.logger.info('get_event_types')
     event_types = [e.serialize() if e else None for e in dao_get_event_types()]
@@ -7,7 +7,9 @@ from flask import (
     Blueprint,
     current_app,
     jsonify,
-    request
+    request,
+    Response,
+    stream_with_context
 )
 import os.path
 import re
@@ -36,7 +38,7 @@ from app.dao.event_dates_dao import dao_create_event_date, dao_get_event_date_by
 from app.dao.event_types_dao import dao_get_event_type_by_old_id, dao_get_event_type_by_id
 from app.dao.reject_reasons_dao import dao_create_reject_reason, dao_update_reject_reason
 from app.dao.speakers_dao import dao_get_speaker_by_name, dao_get_speaker_by_id
-from app.dao.tickets_dao import dao_get_tickets_for_event_date
+from app.dao.tickets_dao import dao_get_tickets_export, dao_get_tickets_for_event_date
 from app.dao.users_dao import dao_get_admin_users, dao_get_users
 from app.dao.venues_dao import dao_get_venue_by_old_id, dao_get_venue_by_id
 
@@ -53,14 +55,20 @@ from app.routes.events.schemas import (
 from app.schema_validation import validate
 
 from app.payments.paypal import PayPal
+from app.utils.etags import etag_response
+from app.utils.export import get_query_header, stream_csv
+from app.utils.response_cache import cached_response
 from app.utils.storage import Storage
 
 events_blueprint = Blueprint('events', __name__)
 register_errors(events_blueprint)
 
+# the tables Event.serialize reads from
+EVENT_TABLES = ('events', 'event_dates', 'event_types', 'venues', 'speakers', 'reject_reasons')
 
-def extract_startdate(json):
-    return json['event_dates'][0]['event_datetime'] if 'event_dates' in json else 0
+
+def _serialize_events(events):
+    return [e.serialize() if e else None for e in events]
 
 
 @events_blueprint.route('/paypal/<item_id>', methods=['POST'])
@@ -414,10 +422,10 @@ def update_event(event_id):
 
 @events_blueprint.route('/events')
 @jwt_required()
+@etag_response(*EVENT_TABLES)
 def get_events():
-    events = [e.serialize() if e else None for e in dao_get_events()]
+    events = _serialize_events(dao_get_events(with_details=True))
 
-    events.sort(key=extract_startdate)
     return jsonify(events)
 
 
@@ -430,39 +438,41 @@ def get_event_by_id(event_id):
 
 @events_blueprint.route('/events/year/<int:year>')
 @jwt_required()
+@etag_response(*EVENT_TABLES)
 def get_events_in_year(year):
-    events = [e.serialize() if e else None for e in dao_get_events_in_year(year)]
+    events = _serialize_events(dao_get_events_in_year(year, with_details=True, latest_first=True))
 
-    events.sort(key=extract_startdate, reverse=True)
     return jsonify(events)
 
 
 @events_blueprint.route('/events/limit/<int:limit>')
 @jwt_required()
+@etag_response(*EVENT_TABLES)
 def get_limited_events(limit):
     if limit > current_app.config['EVENTS_MAX']:
         raise InvalidRequest("{} is greater than events max".format(limit), 400)
 
-    events = [e.serialize() if e else None for e in dao_get_limited_events(limit)]
+    events = _serialize_events(dao_get_limited_events(limit, with_details=True))
 
     return jsonify(events)
 
 
 @events_blueprint.route('/events/future')
 @jwt_required()
+@etag_response(*EVENT_TABLES, timed=True)
+@cached_response(*EVENT_TABLES)
 def get_future_events():
-    events = [e.serialize() if e else None for e in dao_get_future_events()]
+    events = _serialize_events(dao_get_future_events(with_details=True))
 
-    events.sort(key=extract_startdate)
     return jsonify(events)
 
 
 @events_blueprint.route('/events/past_year')
 @jwt_required()
+@etag_response(*EVENT_TABLES, timed=True)
 def get_past_year_events():
-    events = [e.serialize() if e else None for e in dao_get_past_year_events()]
+    events = _serialize_events(dao_get_past_year_events(with_details=True))
 
-    events.sort(key=extract_startdate)
     return jsonify(events)
 
 
@@ -641,3 +651,15 @@ def get_tickets_and_reserved_places(eventdate_id):
         "tickets": [t.serialize() for t in tickets],
     }
     return jsonify(tickets_and_reserved_places)
+
+
+@events_blueprint.route('/event/tickets/export/<uuid:eventdate_id>', methods=['GET'])
+@jwt_required()
+def export_tickets(eventdate_id):
+    query = dao_get_tickets_export(eventdate_id, current_app.config['EXPORT_BATCH_SIZE'])
+
+    return Response(
+        stream_with_context(stream_csv(get_query_header(query), query)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=tickets-{eventdate_id}.csv'}
+    )
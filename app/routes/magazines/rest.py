@@ -27,6 +27,8 @@ from app.routes.magazines.schemas import (
     post_create_magazine_schema, post_import_magazine_schema, post_update_magazine_schema
 )
 from app.schema_validation import validate
+from app.utils.etags import etag_response
+from app.utils.response_cache import cached_response
 from app.utils.storage import Storage
 
 magazines_blueprint = Blueprint('magazines', __name__)
@@ -112,6 +114,8 @@ def update_magazine(id):
 
 @magazines_blueprint.route('/magazine/latest', methods=['GET'])
 @jwt_required()
+@etag_response('magazines')
+@cached_response('magazines')
 def get_latest_magazine():
     magazine = dao_get_latest_magazine()
 
@@ -120,6 +124,7 @@ def get_latest_magazine():
 
 @magazines_blueprint.route('/magazines', methods=['GET'])
 @jwt_required()
+@etag_response('magazines')
 def get_magazines():
     magazines = [m.serialize() if m else None for m in dao_get_magazines()]
 
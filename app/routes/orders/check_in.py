@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+from threading import Lock
+import time
+
+from app.dao.tickets_dao import dao_get_check_in_ticket, dao_get_check_in_tickets, dao_use_ticket
+from app.errors import InvalidRequest
+from app.models import TICKET_STATUS_USED
+
+CHECK_IN_OUTCOMES = ['checked_in', 'already_used', 'not_today', 'not_found']
+
+
+class CheckInRoster(object):
+    """Holds the tickets for today's event dates, keyed by ticket id and old id, so a scan is
+    checked without a query.
+
+    The roster is loaded on the first scan of each day. A ticket missing from it, such as one
+    bought after it was loaded, is looked up in the database and added if it is for today.
+    Each worker has its own roster, the database UPDATE decides whether a scan uses a ticket.
+    """
+
+    def __init__(self):
+        self.date = None
+        self.tickets = {}
+        self.lock = Lock()
+
+    def _add(self, ticket_id, old_id, status, title):
+        entry = {'id': str(ticket_id), 'title': title, 'used': status == TICKET_STATUS_USED}
+        self.tickets[str(ticket_id)] = entry
+        if old_id:
+            self.tickets[str(old_id)] = entry
+        return entry
+
+    def load(self):
+        today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+        tickets = dao_get_check_in_tickets(today, today + timedelta(days=1))
+
+        with self.lock:
+            self.date = today.date()
+            self.tickets = {}
+            for ticket_id, old_id, status, title, _ in tickets:
+                self._add(ticket_id, old_id, status, title)
+        return len(tickets)
+
+    def get(self, ticket_id):
+        if self.date != datetime.today().date():
+            self.load()
+        return self.tickets.get(ticket_id)
+
+    def add(self, ticket_id, old_id, status, title):
+        with self.lock:
+            return self._add(ticket_id, old_id, status, title)
+
+    def clear(self):
+        with self.lock:
+            self.date = None
+            self.tickets = {}
+
+
+class CheckInStats(object):
+    """Counts the scans by outcome and times them."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.counts = {outcome: 0 for outcome in CHECK_IN_OUTCOMES}
+        self.roster_hits = 0
+        self.total_seconds = 0
+        self.max_seconds = 0
+
+    def record(self, outcome, roster_hit, seconds):
+        with self.lock:
+            self.counts[outcome] += 1
+            self.roster_hits += roster_hit
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def get_stats(self):
+        with self.lock:
+            scans = sum(self.counts.values())
+            minutes = (time.monotonic() - self.started) / 60
+            return dict(
+                self.counts,
+                scans=scans,
+                roster_hits=self.roster_hits,
+                scans_per_minute=round(scans / minutes, 2) if minutes else 0,
+                average_ms=round(self.total_seconds * 1000 / scans, 2) if scans else 0,
+                max_ms=round(self.max_seconds * 1000, 2),
+            )
+
+
+check_in_roster = CheckInRoster()
+check_in_stats = CheckInStats()
+
+
+def _use_ticket(ticket_id):
+    return 'checked_in' if dao_use_ticket(ticket_id) else 'already_used'
+
+
+def check_in_ticket(ticket_id, use_roster=False):
+    """Uses the ticket if its event date is today, returns the outcome and the event title."""
+    start = time.monotonic()
+
+    entry = check_in_roster.get(ticket_id) if use_roster else None
+    if entry:
+        outcome = 'already_used' if entry['used'] else _use_ticket(entry['id'])
+        entry['used'] = True
+        title = entry['title']
+    else:
+        ticket = dao_get_check_in_ticket(ticket_id)
+        if not ticket:
+            check_in_stats.record('not_found', False, time.monotonic() - start)
+            raise InvalidRequest(f'Ticket not found: {ticket_id}', 404)
+
+        _id, old_id, status, title, event_datetime = ticket
+        if not event_datetime or event_datetime.date() != datetime.today().date():
+            outcome = 'not_today'
+        else:
+            outcome = _use_ticket(str(_id))
+            if use_roster:
+                check_in_roster.add(_id, old_id, TICKET_STATUS_USED, title)
+
+    check_in_stats.record(outcome, bool(entry), time.monotonic() - start)
+    return outcome, title
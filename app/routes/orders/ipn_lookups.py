@@ -0,0 +1,132 @@
+import uuid
+
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.dao.books_dao import dao_get_book_by_id, dao_get_book_by_old_id
+from app.dao.event_dates_dao import dao_get_event_date_by_id
+from app.dao.events_dao import dao_get_event_by_id
+from app.dao.orders_dao import dao_get_order_with_txn_id
+from app.models import Book, Event, Order
+
+UUID_LENGTH = 36
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+        return True
+    except ValueError:
+        return False
+
+
+def get_ipn_item_numbers(ipn):
+    counter = 1
+    while f'item_number{counter}' in ipn:
+        yield ipn[f'item_number{counter}']
+        counter += 1
+
+
+class IpnLookups(object):
+    """Caches the orders, events, event dates and books that IPNs refer to.
+
+    `prefetch` loads everything referred to by a batch of IPNs with one query per type, then the
+    `get_` methods are served from the cache, falling back to the DAO for anything not prefetched.
+
+    Used as a context manager the session does not expire the cached objects on commit, so they
+    are not reloaded after each order is saved.
+    """
+
+    def __init__(self):
+        self.orders = {}
+        self.events = {}
+        self.event_dates = {}
+        self.books = {}
+        self.old_books = {}
+
+    def __enter__(self):
+        self.session = db.session()
+        self.expire_on_commit = self.session.expire_on_commit
+        self.session.expire_on_commit = False
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.session.expire_on_commit = self.expire_on_commit
+
+    def prefetch(self, ipns):
+        txn_ids, event_ids, book_ids, old_book_ids = set(), set(), set(), set()
+
+        for ipn in ipns:
+            txn_ids.add(ipn['txn_id'])
+            if ipn.get('custom') and not ipn['custom'].startswith('Donation'):
+                txn_ids.add(ipn['custom'])
+
+            for item_number in get_ipn_item_numbers(ipn):
+                if item_number.startswith('delivery'):
+                    continue
+                elif item_number.startswith('book-'):
+                    book_id = item_number[len('book-'):]
+                    if len(book_id) < UUID_LENGTH:
+                        old_book_ids.add(book_id)
+                    elif _is_uuid(book_id):
+                        book_ids.add(book_id)
+                elif _is_uuid(item_number):
+                    event_ids.add(item_number)
+
+        txn_ids -= set(self.orders)
+        if txn_ids:
+            self.orders.update({txn_id: None for txn_id in txn_ids})
+            for order in Order.query.filter(Order.txn_id.in_(txn_ids)).order_by(Order.created_at.desc()):
+                self.orders[order.txn_id] = order
+
+        event_ids -= set(self.events)
+        if event_ids:
+            for event in Event.query.filter(Event.id.in_(event_ids)).options(selectinload(Event.event_dates)):
+                self._add_event(event)
+
+        book_ids -= set(self.books)
+        if book_ids:
+            self.books.update({book_id: None for book_id in book_ids})
+            for book in Book.query.filter(Book.id.in_(book_ids)):
+                self.books[str(book.id)] = book
+
+        old_book_ids -= set(self.old_books)
+        if old_book_ids:
+            self.old_books.update({old_id: None for old_id in old_book_ids})
+            for book in Book.query.filter(Book.old_id.in_([int(i) for i in old_book_ids if i.isdigit()])):
+                self.old_books[str(book.old_id)] = book
+
+    def _add_event(self, event):
+        self.events[str(event.id)] = event
+        for event_date in event.event_dates:
+            self.event_dates[str(event_date.id)] = event_date
+
+    def get_order(self, txn_id):
+        if txn_id not in self.orders:
+            self.orders[txn_id] = dao_get_order_with_txn_id(txn_id)
+        return self.orders[txn_id]
+
+    def forget_order(self, txn_id):
+        self.orders.pop(txn_id, None)
+
+    def get_event(self, event_id):
+        event_id = str(event_id)
+        if event_id not in self.events:
+            self._add_event(dao_get_event_by_id(event_id))
+        return self.events[event_id]
+
+    def get_event_date(self, event_date_id):
+        event_date_id = str(event_date_id)
+        if event_date_id not in self.event_dates:
+            self.event_dates[event_date_id] = dao_get_event_date_by_id(event_date_id)
+        return self.event_dates[event_date_id]
+
+    def get_book(self, book_id):
+        if len(book_id) < UUID_LENGTH:
+            if book_id not in self.old_books:
+                self.old_books[book_id] = dao_get_book_by_old_id(book_id)
+            return self.old_books[book_id]
+
+        if book_id not in self.books:
+            self.books[book_id] = dao_get_book_by_id(book_id)
+        return self.books[book_id]
@@ -0,0 +1,120 @@
+from datetime import datetime
+from decimal import Decimal
+
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app
+
+from app.dao.orders_dao import (
+    dao_get_order_report_month_versions,
+    dao_get_order_report_months,
+    dao_get_orders_delivery_report,
+    dao_get_orders_revenue_report,
+    dao_get_report_titles,
+    dao_save_order_report_month
+)
+
+REPORT_SECTION_KEYS = {
+    'months': 'month',
+    'events': 'event_id',
+    'ticket_types': 'ticket_type',
+    'books': 'book_id',
+    'delivery_zones': 'delivery_zone',
+    'donations': 'type',
+}
+REPORT_AMOUNTS = ['revenue', 'shipping']
+
+
+def _get_next_month(date):
+    return datetime(date.year + date.month // 12, date.month % 12 + 1, 1)
+
+
+def _merge_revenue_reports(reports):
+    merged = {}
+    for section, key in REPORT_SECTION_KEYS.items():
+        rows = {}
+        for report in reports:
+            for row in report[section]:
+                if row[key] not in rows:
+                    rows[row[key]] = dict(row)
+                    continue
+
+                merged_row = rows[row[key]]
+                for name, value in row.items():
+                    if name in REPORT_AMOUNTS:
+                        merged_row[name] = f"{Decimal(merged_row[name]) + Decimal(value):.2f}"
+                    elif isinstance(value, int) and not isinstance(value, bool):
+                        merged_row[name] += value
+        merged[section] = list(rows.values())
+    merged['months'] = sorted(merged['months'], key=lambda row: row['month'])
+    return merged
+
+
+def _set_report_titles(report):
+    event_titles, book_titles = dao_get_report_titles(
+        [row['event_id'] for row in report['events']], [row['book_id'] for row in report['books']])
+    for row in report['events']:
+        row['title'] = event_titles.get(row['event_id'], row['title'])
+    for row in report['books']:
+        row['title'] = book_titles.get(row['book_id'], row['title'])
+    return report
+
+
+def _get_cached_revenue_report(start_date, end_date):
+    """Gets the revenue report with every whole month before the current month read from, or saved to,
+    order_report_months.
+
+    Orders in a closed month can still change, such as a delivery payment added to an earlier order or
+    a replayed IPN, so a saved month is only used while the version of its orders is unchanged. The event
+    and book titles are read again, as they can be renamed.
+    """
+    current_month = datetime.today().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    first_month = start_date if start_date.day == 1 and start_date.time() == datetime.min.time() \
+        else _get_next_month(start_date)
+    months = []
+    month = first_month
+    while _get_next_month(month) <= min(end_date, current_month):
+        months.append(month)
+        month = _get_next_month(month)
+
+    if not months:
+        return dao_get_orders_revenue_report(start_date, end_date)
+
+    reports = []
+    if start_date < months[0]:
+        reports.append(dao_get_orders_revenue_report(start_date, months[0]))
+
+    versions = dao_get_order_report_month_versions(months[0], _get_next_month(months[-1]))
+    cached_months = dao_get_order_report_months([m.strftime('%Y-%m') for m in months])
+    for month in months:
+        key = month.strftime('%Y-%m')
+        version = versions.get(key)
+        cached_month = cached_months.get(key)
+        if cached_month and cached_month.version == version:
+            report = cached_month.report
+        else:
+            report = dao_get_orders_revenue_report(month, _get_next_month(month))
+            dao_save_order_report_month(key, version, report)
+        reports.append(report)
+
+    end_of_months = _get_next_month(months[-1])
+    if end_of_months < end_date:
+        reports.append(dao_get_orders_revenue_report(end_of_months, end_date))
+
+    return _set_report_titles(_merge_revenue_reports(reports))
+
+
+def get_orders_report(start_date, end_date):
+    if current_app.config['ORDERS_REPORT_CACHE']:
+        report = _get_cached_revenue_report(start_date, end_date)
+    else:
+        report = dao_get_orders_revenue_report(start_date, end_date)
+
+    report['total'] = {
+        'orders': sum(row['orders'] for row in report['months']),
+        'revenue': f"{sum(Decimal(row['revenue']) for row in report['months']):.2f}"
+    }
+    report.update(dao_get_orders_delivery_report(start_date, end_date))
+    return report
@@ -1,8 +1,6 @@
 import base64
 from decimal import Decimal
 import json
-import io
-import pyqrcode
 import sys
 from urllib.parse import unquote, urlencode
 import requests
@@ -15,31 +13,43 @@ from flask import (
     current_app,
     jsonify,
     request,
+    Response,
+    stream_with_context,
     url_for
 )
 import os.path
 import re
 from sqlalchemy.orm.exc import NoResultFound
 import time
+import uuid
 
 from flask_jwt_extended import jwt_required
+from app import db
 from app.comms.email import get_email_html, send_email, send_smtp_email
 from app.dao import dao_create_record, dao_update_record
-from app.dao.books_dao import dao_create_book_to_order, dao_get_book_by_old_id, dao_get_book_by_id
-from app.dao.events_dao import dao_get_event_by_id
-from app.dao.event_dates_dao import dao_get_event_date_on_date, dao_get_event_date_by_id
-from app.dao.orders_dao import dao_get_order_with_txn_id, dao_get_orders, dao_delete_order
-from app.dao.tickets_dao import dao_get_ticket_id, dao_update_ticket
+from app.dao.books_dao import dao_create_book_to_order
+from app.dao.event_dates_dao import dao_get_event_date_on_date
+from app.dao.orders_dao import (
+    dao_create_paypal_ipn, dao_get_order_with_txn_id, dao_get_orders, dao_get_orders_export,
+    dao_get_orders_for_replay, dao_get_orders_page, dao_get_paypal_ipn, dao_delete_order
+)
 from app.dao.users_dao import dao_get_admin_users
 from app.errors import register_errors, InvalidRequest
+from app.na_celery import paypal_tasks
+from app.utils.export import get_query_header, stream_csv
+from app.utils.qr_codes import get_qr_code_filename, upload_qr_codes
 
 from app.models import (
-    BookToOrder, Order, OrderError, Ticket,
-    BASIC, BOOK, TICKET_STATUS_USED,
+    BookToOrder, Order, OrderError, PaypalIpn, Ticket,
+    BASIC, BOOK, PAYPAL_IPN_FAILED, TICKET_STATUS_USED,
     DELIVERY_FEE_UK_EU, DELIVERY_FEE_UK_ROW, DELIVERY_FEE_EU_ROW,
     DELIVERY_REFUND_EU_UK, DELIVERY_REFUND_ROW_UK, DELIVERY_REFUND_ROW_EU
 )
-from app.routes.orders.schemas import post_update_order_address_schema, post_update_order_schema
+from app.routes.orders import check_in, report as orders_report
+from app.routes.orders.ipn_lookups import IpnLookups
+from app.routes.orders.schemas import (
+    post_replay_paypal_ipns_schema, post_update_order_address_schema, post_update_order_schema
+)
 from app.schema_validation import validate
 from app.utils.storage import Storage
 from app.utils.time import get_local_time
@@ -59,35 +69,126 @@ def get_order(txn_id):
         return jsonify({'message': f'Transaction ID: {txn_id} not found'}), 404
 
 
+ORDERS_PAGE_FILTERS = ['delivery_status', 'payment_status', 'email_status']
+
+
+def _serialize_orders(orders, short=False):
+    serialize = Order.short_serialize if short else Order.serialize
+
+    json_orders = []
+    for o in orders:
+        _json = serialize(o)
+        if o.linked_transactions:
+            _json['linked_transactions'] = [serialize(linked) for linked in o.linked_transactions]
+        json_orders.append(_json)
+    return json_orders
+
+
+def _encode_orders_cursor(order):
+    cursor = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def _decode_orders_cursor(cursor):
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), uuid.UUID(order_id)
+    except ValueError:
+        raise InvalidRequest(f"Invalid cursor: {cursor}", 400)
+
+
+def _get_bool_arg(name):
+    value = request.args.get(name, 'false').lower()
+    if value not in ['true', 'false']:
+        raise InvalidRequest(f"{name} must be true or false", 400)
+    return value == 'true'
+
+
+def _get_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise InvalidRequest(f"{name} must be a date in the format YYYY-MM-DD", 400)
+
+
 @orders_blueprint.route('/orders', methods=['GET'])
 @orders_blueprint.route('/orders/<string:_filter>', methods=['GET'])
 @orders_blueprint.route('/orders/<int:year>', methods=['GET'])
 @orders_blueprint.route('/orders/<int:year>/<string:_filter>', methods=['GET'])
 def get_orders(year=None, _filter=None):
-    orders = dao_get_orders(year)
-    if _filter == 'invalid':
-        json_orders = [o.serialize() for o in orders if o.txn_id.startswith("XX-") or o.txn_id.startswith("INVALID_")]
+    orders = dao_get_orders(year, with_details=True, invalid=_filter == 'invalid', with_linked=True)
+
+    return jsonify(_serialize_orders(orders))
+
+
+@orders_blueprint.route('/orders/page', methods=['GET'])
+@jwt_required()
+def get_orders_page():
+    max_limit = current_app.config['ORDERS_PAGE_MAX']
+    try:
+        limit = int(request.args.get('limit', current_app.config['ORDERS_PAGE_SIZE']))
+    except ValueError:
+        raise InvalidRequest("limit must be an integer", 400)
+    if not 0 < limit <= max_limit:
+        raise InvalidRequest(f"limit must be between 1 and {max_limit}", 400)
+
+    filters = {name: request.args[name] for name in ORDERS_PAGE_FILTERS if name in request.args}
+    if 'is_donation' in request.args:
+        filters['is_donation'] = _get_bool_arg('is_donation')
+
+    after = _decode_orders_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    short = _get_bool_arg('short')
+
+    # get an extra order to tell whether there is another page
+    orders = dao_get_orders_page(
+        limit + 1,
+        after=after,
+        with_details=not short,
+        invalid=_get_bool_arg('invalid'),
+        start_date=_get_date_arg('start_date'),
+        end_date=_get_date_arg('end_date'),
+        **filters
+    )
+    next_cursor = _encode_orders_cursor(orders[limit - 1]) if len(orders) > limit else None
+
+    return jsonify({
+        'orders': _serialize_orders(orders[:limit], short=short),
+        'next_cursor': next_cursor
+    })
+
+
+@orders_blueprint.route('/orders/report', methods=['GET'])
+@orders_blueprint.route('/orders/report/<int:year>', methods=['GET'])
+@jwt_required()
+def get_orders_report(year=None):
+    if year:
+        start_date, end_date = datetime(year, 1, 1), datetime(year + 1, 1, 1)
     else:
-        json_orders = (
-            [o.serialize() for o in orders if not o.txn_id.startswith("XX-") and not o.txn_id.startswith("INVALID_")])
-
-    linked_orders = {}
-    for o in json_orders:
-        if 'linked_txn_id' in o:
-            if o['linked_txn_id'] not in linked_orders:
-                linked_orders[o['linked_txn_id']] = [o]
-            else:
-                linked_orders[o['linked_txn_id']].append(o)
+        start_date = _get_date_arg('start_date') or datetime(datetime.today().year, 1, 1)
+        end_date = _get_date_arg('end_date') or datetime(datetime.today().year + 1, 1, 1)
 
-    for k in linked_orders:
-        for o in linked_orders[k]:
-            json_orders.remove(o)
+    report = orders_report.get_orders_report(start_date, end_date)
+    report.update(start_date=start_date.strftime('%Y-%m-%d'), end_date=end_date.strftime('%Y-%m-%d'))
+    return jsonify(report)
 
-    for o in json_orders:
-        if o['txn_id'] in linked_orders:
-            o['linked_transactions'] = linked_orders[o['txn_id']]
 
-    return jsonify(json_orders)
+@orders_blueprint.route('/orders/export', methods=['GET'])
+@jwt_required()
+def export_orders():
+    query = dao_get_orders_export(
+        current_app.config['EXPORT_BATCH_SIZE'],
+        start_date=_get_date_arg('start_date'),
+        end_date=_get_date_arg('end_date')
+    )
+
+    return Response(
+        stream_with_context(stream_csv(get_query_header(query), query)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=orders.csv'}
+    )
 
 
 @orders_blueprint.route('/order/<string:txn_id>', methods=['POST'])
@@ -142,6 +243,16 @@ def replay_confirmation_email(txn_id=None):
     return _replay_paypal_ipn(txn_id=txn_id, email_only=True)
 
 
+def get_ipn_data(params):
+    data = {}
+    for key in params.keys():
+        if isinstance(params[key], list):
+            data[key] = params[key][0]
+        else:
+            data[key] = params[key]
+    return data
+
+
 def _replay_paypal_ipn(txn_id=None, email_only=False):
     if txn_id:
         order = dao_get_order_with_txn_id(txn_id)
@@ -160,33 +271,131 @@ def _replay_paypal_ipn(txn_id=None, email_only=False):
     )
 
 
+def replay_paypal_ipns(orders, allow_emails=False, replace_order=False, email_only=False):
+    """Replays the IPNs stored on `orders` and returns the outcome for each order.
+
+    The orders, events, event dates and books the IPNs refer to are prefetched into a shared
+    `IpnLookups`. A failed replay is rolled back and reported without stopping the others.
+    """
+    def get_params(order):
+        try:
+            return json.loads(order.params) if order.params else None
+        except ValueError:
+            return None
+
+    replays = [(order.txn_id, get_params(order)) for order in orders]
+
+    outcomes = []
+    with IpnLookups() as lookups:
+        lookups.prefetch([get_ipn_data(params) for _, params in replays if params])
+
+        for txn_id, params in replays:
+            if not params:
+                outcomes.append({'txn_id': txn_id, 'status': 'error', 'message': 'No paypal parameters'})
+                continue
+
+            try:
+                response = paypal_ipn(
+                    params,
+                    allow_emails=email_only or allow_emails,
+                    replace_order=replace_order,
+                    email_only=email_only,
+                    lookups=lookups
+                )
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.exception('Replay of paypal IPN %s failed', txn_id)
+                outcome = {'status': 'error', 'message': str(e)}
+            else:
+                if isinstance(response, tuple):
+                    outcome = {'status': 'duplicate', 'message': json.loads(response[0])['error']}
+                elif email_only:
+                    outcome = dict(status='email_sent', **response.get_json())
+                else:
+                    outcome = {'status': 'replayed'}
+
+            outcomes.append(dict(txn_id=txn_id, **outcome))
+
+    return outcomes
+
+
+@orders_blueprint.route('/orders/paypal/replay_ipns', methods=['POST'])
+@jwt_required()
+def bulk_replay_paypal_ipns():
+    data = request.get_json(force=True)
+
+    validate(data, post_replay_paypal_ipns_schema)
+
+    orders = dao_get_orders_for_replay(
+        txn_ids=data.get('txn_ids'), start_date=data.get('start_date'), end_date=data.get('end_date'))
+
+    outcomes = replay_paypal_ipns(
+        orders,
+        allow_emails=data.get('allow_emails', False),
+        replace_order=data.get('replace_order', False),
+        email_only=data.get('email_only', False)
+    )
+
+    found_txn_ids = [outcome['txn_id'] for outcome in outcomes]
+    for txn_id in data.get('txn_ids', []):
+        if txn_id not in found_txn_ids:
+            outcomes.append({'txn_id': txn_id, 'status': 'not_found'})
+
+    return jsonify(outcomes)
+
+
 @orders_blueprint.route('/orders/paypal/ipn/queued', methods=['POST'])
 @jwt_required()
 def paypal_ipn_queued():
     return paypal_ipn(ipn_queued=True)
 
 
+@orders_blueprint.route('/orders/paypal/ipn/status/<string:txn_id>', methods=['GET'])
+@jwt_required()
+def get_paypal_ipn_status(txn_id):
+    ipn = dao_get_paypal_ipn(txn_id)
+    if not ipn:
+        raise InvalidRequest(f'Paypal IPN for {txn_id} not found', 404)
+
+    return jsonify(ipn.serialize())
+
+
+def _queue_paypal_ipn(params):
+    txn_id = params.get('txn_id', [None])[0]
+    if not txn_id:
+        raise InvalidRequest('No paypal txn_id', 400)
+
+    ipn = dao_get_paypal_ipn(txn_id)
+    # a stale IPN was left queued or processing by a worker that died, so is queued again
+    if ipn and ipn.status != PAYPAL_IPN_FAILED and not ipn.is_stale:
+        current_app.logger.info('Paypal IPN %s already queued', txn_id)
+        return '{"message": "IPN already queued"}'
+
+    if not ipn:
+        dao_create_paypal_ipn(PaypalIpn(txn_id=txn_id, params=params))
+    paypal_tasks.process_paypal_ipn.apply_async((txn_id,))
+
+    return '{"message": "IPN queued"}'
+
+
 @orders_blueprint.route('/orders/paypal/ipn', methods=['GET', 'POST'])
-def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=False, ipn_queued=False):
+def paypal_ipn(
+    params=None, allow_emails=True, replace_order=False, email_only=False, ipn_queued=False, verify=False,
+    lookups=None
+):
     message = ''
+    lookups = lookups or IpnLookups()
     bypass_verify = False
     if not params:
         params = request.form.to_dict(flat=False)
         if ipn_queued:
             bypass_verify = True
+        elif current_app.config['PAYPAL_IPN_ASYNC']:
+            return _queue_paypal_ipn(params)
     else:
-        bypass_verify = True
+        bypass_verify = not verify
     current_app.logger.info('IPN params: %r', params)
 
-    def get_data(params):
-        data = {}
-        for key in params.keys():
-            if isinstance(params[key], list):
-                data[key] = params[key][0]
-            else:
-                data[key] = params[key]
-        return data
-
     if bypass_verify or (current_app.config['TEST_VERIFY'] and current_app.config['ENVIRONMENT'] != 'live'):
         v_response = 'VERIFIED'
         current_app.logger.info('Test paypal verify')
@@ -210,9 +419,10 @@ def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=F
     if v_response == 'VERIFIED':
         status = product_message = delivery_message = error_message = email_status_code = email_provider_id = ''
         diff = 0.0
-        data = get_data(params)
+        data = get_ipn_data(params)
 
-        order_data, tickets, events, products, delivery_zones, errors = parse_ipn(data, replace_order, email_only)
+        order_data, tickets, events, products, delivery_zones, errors = parse_ipn(
+            data, replace_order, email_only, lookups=lookups)
         if 'payment already made' in (','.join(errors)):
             current_app.logger.info("Transaction payment already made %r", data['txn_id'])
             return '{"error": "Duplicate transaction %s"}' % data['txn_id'], 409
@@ -223,8 +433,9 @@ def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=F
 
         if not email_only:
             dao_create_record(order)
+            lookups.forget_order(order.txn_id)
         else:
-            order = dao_get_order_with_txn_id(data['txn_id'])
+            order = lookups.get_order(data['txn_id'])
 
         if order_data['payment_status'] != 'Completed':
             err_msg = f"Payment not Completed: {order_data['payment_status']}"
@@ -233,7 +444,7 @@ def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=F
             message = f"<p>Thank you for your order ({order.txn_id})</p>"
 
             if order_data['txn_type'] == 'web_accept' and order_data['linked_txn_id']:
-                linked_order = dao_get_order_with_txn_id(order_data['linked_txn_id'])
+                linked_order = lookups.get_order(order_data['linked_txn_id'])
 
                 diff = linked_order.delivery_balance - Decimal(order_data['payment_total'])
                 if diff == 0:
@@ -387,7 +598,15 @@ def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=F
                             ticket = Ticket(**_ticket)
                             dao_create_record(ticket)
 
-                    storage = Storage(current_app.config['STORAGE']) if not email_only else None
+                    if not email_only:
+                        ticket_links = {
+                            ticket.id: '{}{}'.format(
+                                current_app.config['API_BASE_URL'],
+                                url_for('.use_ticket', ticket_id=ticket.id)
+                            ) for ticket in order.tickets if ticket.eventdate_id
+                        }
+                        upload_qr_codes(Storage(current_app.config['STORAGE']), ticket_links)
+
                     for ticket in order.tickets:
                         if not ticket.eventdate_id:
                             error_msg = f'No event date for ticket: {ticket.id}'
@@ -395,25 +614,13 @@ def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=F
                             errors.append(error_msg)
                             continue
 
-                        event_title = dao_get_event_by_id(ticket.event_id).title
-                        link_to_post = '{}{}'.format(
-                            current_app.config['API_BASE_URL'],
-                            url_for('.use_ticket', ticket_id=ticket.id)
-                        )
-                        target_image_filename = '{}/{}'.format('qr_codes', str(ticket.id))
-
-                        if not email_only:
-                            img = pyqrcode.create(link_to_post)
-                            buffer = io.BytesIO()
-                            img.png(buffer, scale=2)
-
-                            img_b64 = base64.b64encode(buffer.getvalue())
-                            storage.upload_blob_from_base64string('qr.code', target_image_filename, img_b64)
+                        event_title = lookups.get_event(ticket.event_id).title
+                        target_image_filename = get_qr_code_filename(ticket.id)
 
                         message += '<div><span><img src="{}/{}"></span>'.format(
                             current_app.config['IMAGES_URL'], target_image_filename)
 
-                        event_date = dao_get_event_date_by_id(ticket.eventdate_id)
+                        event_date = lookups.get_event_date(ticket.eventdate_id)
                         minutes = ':%M' if event_date.event_datetime.minute > 0 else ''
                         message += "<div>{} on {}</div></div>".format(
                             event_title, event_date.event_datetime.strftime('%-d %b at %-I{}%p'.format(minutes)))
@@ -489,10 +696,10 @@ def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=F
         else:
             current_app.logger.info('UNKNOWN response %r', params['txn_id'])
 
-        data = get_data(params)
+        data = get_ipn_data(params)
         data['txn_id'] = f"XX-{v_response}_{int(datetime.utcnow().timestamp())}-{data['txn_id']}"
 
-        order_data, tickets, events, products, delivery_zones, errors = parse_ipn(data)
+        order_data, tickets, events, products, delivery_zones, errors = parse_ipn(data, lookups=lookups)
 
         order_data['params'] = json.dumps(params)
 
@@ -504,30 +711,34 @@ def paypal_ipn(params=None, allow_emails=True, replace_order=False, email_only=F
     return '{"message": "IPN processed"}'
 
 
+CHECK_IN_RESPONSES = {
+    'checked_in': 'Ticket updated to used',
+    'already_used': 'Ticket already used',
+    'not_today': 'Event is not today',
+}
+
+
 @orders_blueprint.route('/orders/ticket/<string:ticket_id>', methods=['GET'])
 def use_ticket(ticket_id):
-    ticket = dao_get_ticket_id(ticket_id)
+    outcome, title = check_in.check_in_ticket(ticket_id, use_roster=current_app.config['CHECK_IN_ROSTER'])
 
-    if not ticket.event.is_event_today(ticket.eventdate_id):
-        data = {
-            'update_response': 'Event is not today'
-        }
-    else:
-        if ticket.status == TICKET_STATUS_USED:
-            data = {
-                'update_response': 'Ticket already used'
-            }
-        else:
-            dao_update_ticket(ticket_id, status=TICKET_STATUS_USED)
+    return jsonify({
+        'update_response': CHECK_IN_RESPONSES[outcome],
+        'ticket_id': ticket_id,
+        'title': title
+    })
 
-            data = {
-                'update_response': 'Ticket updated to used'
-            }
 
-    data['ticket_id'] = ticket_id
-    data['title'] = ticket.event.title
+@orders_blueprint.route('/orders/check_in/roster', methods=['POST'])
+@jwt_required()
+def load_check_in_roster():
+    return jsonify({'tickets': check_in.check_in_roster.load()})
 
-    return jsonify(data)
+
+@orders_blueprint.route('/orders/check_in/stats', methods=['GET'])
+@jwt_required()
+def get_check_in_stats():
+    return jsonify(check_in.check_in_stats.get_stats())
 
 
 def get_order_mapping(ipn, is_giftaid):
@@ -566,7 +777,8 @@ def get_order_mapping(ipn, is_giftaid):
     return order_mapping
 
 
-def parse_ipn(ipn, replace_order=False, email_only=False):
+def parse_ipn(ipn, replace_order=False, email_only=False, lookups=None):
+    lookups = lookups or IpnLookups()
     order_data = {}
     receiver_email = receiver_id = None
     errors = []
@@ -629,11 +841,15 @@ def parse_ipn(ipn, replace_order=False, email_only=False):
         order_data['payment_status'] = 'No receiver email or id'
         return short_response
 
-    order_found = dao_get_order_with_txn_id(order_data['txn_id'])
+    # resolve the orders, events and books in the IPN up front so the items are parsed in memory
+    lookups.prefetch([ipn])
+
+    order_found = lookups.get_order(order_data['txn_id'])
     if order_found:
         if replace_order:
             current_app.logger.info(f'Replacing order txn_id: {order_data["txn_id"]}')
             dao_delete_order(order_data['txn_id'])
+            lookups.forget_order(order_data['txn_id'])
             # truncate txn_id to remove XX-INVALID-nnnnnnnnnn- for original txn id
             if order_data['txn_id'].startswith('XX-'):
                 order_data['txn_id'] = order_data['txn_id'][22:]
@@ -654,7 +870,7 @@ def parse_ipn(ipn, replace_order=False, email_only=False):
             'eventdate_id': event_date.id,
             'status': TICKET_STATUS_USED
         }
-        event = dao_get_event_by_id(event_date.event_id)
+        event = lookups.get_event(event_date.event_id)
         events.append(event)
 
         tickets.append(ticket)
@@ -676,11 +892,7 @@ def parse_ipn(ipn, replace_order=False, email_only=False):
                 if counter == 1 and 'shipping_cost' in order_data:
                     price = Decimal(price) - Decimal(order_data['shipping_cost'])
                 book_id = ipn['item_number%d' % counter][len("book-"):]
-                UUID_LENGTH = 36
-                if len(book_id) < UUID_LENGTH:
-                    book = dao_get_book_by_old_id(book_id)
-                else:
-                    book = dao_get_book_by_id(book_id)
+                book = lookups.get_book(book_id)
                 if book:
                     products.append(
                         {
@@ -699,7 +911,7 @@ def parse_ipn(ipn, replace_order=False, email_only=False):
                     continue
             else:
                 try:
-                    event = dao_get_event_by_id(ipn['item_number%d' % counter])
+                    event = lookups.get_event(ipn['item_number%d' % counter])
                     events.append(event)
                 except NoResultFound:
                     msg = f"Event not found for item_number: {ipn['item_number%d' % counter]}"
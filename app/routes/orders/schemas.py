@@ -22,3 +22,21 @@ post_update_order_schema = {
     },
     "required": ["delivery_sent", "notes"]
 }
+
+post_replay_paypal_ipns_schema = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "description": "POST schema for replaying paypal IPNs",
+    "type": "object",
+    "properties": {
+        "txn_ids": {"type": "array", "items": {"type": "string"}, "minItems": 1},
+        "start_date": {"type": "string", "pattern": "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"},
+        "end_date": {"type": "string", "pattern": "^[0-9]{4}-[0-9]{2}-[0-9]{2}$"},
+        "allow_emails": {"type": "boolean"},
+        "replace_order": {"type": "boolean"},
+        "email_only": {"type": "boolean"},
+    },
+    "anyOf": [
+        {"required": ["txn_ids"]},
+        {"required": ["start_date", "end_date"]}
+    ]
+}
@@ -15,6 +15,8 @@ from app.dao.speakers_dao import (
 from app.errors import register_errors
 from app.models import Speaker
 from app.schema_validation import validate
+from app.utils.etags import etag_response
+from app.utils.response_cache import cached_response
 from app.routes.speakers.schemas import (
     post_create_speaker_schema,
     post_create_speakers_schema,
@@ -31,6 +33,8 @@ register_errors(speaker_blueprint)
 
 @speakers_blueprint.route('/speakers')
 @jwt_required()
+@etag_response('speakers')
+@cached_response('speakers')
 def get_speakers():
     speakers = [s.serialize() if s else None for s in dao_get_speakers()]
     return jsonify(speakers)
@@ -27,6 +27,8 @@ from app.routes.venues.schemas import (
 )
 from app.models import Venue
 from app.schema_validation import validate
+from app.utils.etags import etag_response
+from app.utils.response_cache import cached_response
 
 venues_blueprint = Blueprint('venues', __name__)
 venue_blueprint = Blueprint('venue', __name__)
@@ -36,6 +38,8 @@ register_errors(venue_blueprint)
 
 @venues_blueprint.route('/venues')
 @jwt_required()
+@etag_response('venues')
+@cached_response('venues')
 def get_venues():
     venues = [e.serialize() if e else None for e in dao_get_venues()]
     return jsonify(venues)
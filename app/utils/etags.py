@@ -0,0 +1,51 @@
+from datetime import date
+from functools import wraps
+import hashlib
+import time
+from urllib.parse import urlencode
+
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app, make_response, request
+
+from app.dao.collection_versions_dao import dao_get_collection_versions
+
+
+def get_etag(tables, timed=False):
+    """Gets a token for the current versions of `tables`, which the DAO writers increment.
+
+    Today's date is part of the token too, as some lists depend on the date and it limits how long
+    a write made outside the DAO writers can go unnoticed. Lists that depend on the time of day,
+    such as the future events, are `timed` and also change every ETAGS_TIME_BUCKET seconds.
+    """
+    versions = dao_get_collection_versions(tables)
+    args = urlencode(sorted(request.args.items(multi=True)))
+    period = date.today()
+    if timed:
+        period = f"{period}:{int(time.time() // current_app.config['ETAGS_TIME_BUCKET'])}"
+    token = f"{request.path}?{args}|{period}|" + ','.join(f'{t}:{v}' for t, v in zip(tables, versions))
+    return hashlib.sha1(token.encode()).hexdigest()
+
+
+def etag_response(*tables, timed=False):
+    """Sets an ETag on the response of a view that reads `tables`, and returns 304 Not Modified
+    without calling the view when the request's If-None-Match has the current ETag."""
+    def decorator(func):
+        @wraps(func)
+        def get_etag_response(*args, **kwargs):
+            if not current_app.config['ETAGS']:
+                return func(*args, **kwargs)
+
+            etag = get_etag(tables, timed)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = make_response(func(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return get_etag_response
+    return decorator
@@ -0,0 +1,39 @@
+import csv
+from datetime import datetime
+import io
+
+from app.utils.time import get_local_time
+
+# spreadsheet software runs a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _get_csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return get_local_time(value).strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(header, rows):
+    """Yields the CSV lines for the header and rows one at a time, so only one row is held in memory."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def get_line(values):
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    yield get_line(header)
+    for row in rows:
+        yield get_line([_get_csv_value(value) for value in row])
+
+
+def get_query_header(query):
+    return [column['name'] for column in query.column_descriptions]
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+
+import pyqrcode
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app
+
+QR_CODES_FOLDER = 'qr_codes'
+
+
+def get_qr_code_filename(ticket_id):
+    return f'{QR_CODES_FOLDER}/{ticket_id}'
+
+
+def create_qr_code_png(link):
+    buffer = io.BytesIO()
+    pyqrcode.create(link).png(buffer, scale=2)
+    return buffer.getvalue()
+
+
+def upload_qr_codes(storage, ticket_links):
+    """Generates and uploads a QR code PNG for each ticket id in `ticket_links`, which maps to the link
+    the QR code points to.
+
+    The tickets are handled on a pool of QR_CODE_WORKERS threads. The codes are not checked for in
+    storage first, as every ticket has a new id, even when an IPN is replayed, and uploading a code
+    again only overwrites it with the same PNG.
+    """
+    app = current_app._get_current_object()
+
+    def upload_qr_code(ticket_id, link):
+        with app.app_context():
+            storage.upload_blob_from_bytes(get_qr_code_filename(ticket_id), create_qr_code_png(link))
+
+    workers = min(current_app.config['QR_CODE_WORKERS'], len(ticket_links))
+    if workers <= 1:
+        for ticket_id, link in ticket_links.items():
+            upload_qr_code(ticket_id, link)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(upload_qr_code, ticket_links.keys(), ticket_links.values()))
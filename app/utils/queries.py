@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db
+
+
+class QueryCounter(object):
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+@contextmanager
+def count_queries():
+    """Counts the SQL statements run on the database engine inside the block"""
+    query_counter = QueryCounter()
+    event.listen(db.engine, 'before_cursor_execute', query_counter)
+    try:
+        yield query_counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', query_counter)
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+import time
+from urllib.parse import urlencode
+
+import redis
+import werkzeug
+werkzeug.cached_property = werkzeug.utils.cached_property
+
+from flask import current_app, make_response, request
+
+REDIS_PREFIX = 'response_cache:'
+
+
+class ResponseCache(object):
+    """Caches the JSON bodies of read endpoints, keyed on the path, the arguments and the versions
+    of the tables the endpoint reads.
+
+    A DAO write bumps the version of its table, so the responses that read it are no longer found.
+    Entries are kept in an in-process LRU of RESPONSE_CACHE_SIZE entries, or in Redis when
+    RESPONSE_CACHE_REDIS_URL is set, in which case every worker shares the table versions too.
+    Without Redis a write only invalidates the entries of the worker that made it, the other
+    workers serve theirs until RESPONSE_CACHE_TTL has passed.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.redis = None
+        self.redis_url = None
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.versions = {}
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+            self.errors = 0
+
+    def _get_redis(self):
+        url = current_app.config['RESPONSE_CACHE_REDIS_URL']
+        if not url:
+            return
+        if self.redis_url != url:
+            self.redis = redis.Redis.from_url(url)
+            self.redis_url = url
+        return self.redis
+
+    def _redis_error(self, e):
+        current_app.logger.error(f"Response cache error: {e!r}")
+        with self.lock:
+            self.errors += 1
+
+    def get_versions(self, tables):
+        _redis = self._get_redis()
+        if _redis:
+            try:
+                return [int(v or 0) for v in _redis.mget([f'{REDIS_PREFIX}version:{t}' for t in tables])]
+            except redis.RedisError as e:
+                self._redis_error(e)
+                return
+
+        with self.lock:
+            return [self.versions.get(t, 0) for t in tables]
+
+    def invalidate(self, *tables):
+        _redis = self._get_redis()
+        if _redis:
+            try:
+                pipeline = _redis.pipeline()
+                for table in tables:
+                    pipeline.incr(f'{REDIS_PREFIX}version:{table}')
+                pipeline.execute()
+            except redis.RedisError as e:
+                self._redis_error(e)
+
+        with self.lock:
+            for table in tables:
+                self.versions[table] = self.versions.get(table, 0) + 1
+            self.invalidations += 1
+
+    def get(self, key):
+        body = None
+        _redis = self._get_redis()
+        if _redis:
+            try:
+                body = _redis.get(REDIS_PREFIX + key)
+            except redis.RedisError as e:
+                self._redis_error(e)
+        else:
+            with self.lock:
+                if key in self.entries:
+                    expires, body = self.entries[key]
+                    if expires < time.monotonic():
+                        del self.entries[key]
+                        body = None
+                    else:
+                        self.entries.move_to_end(key)
+
+        with self.lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return body
+
+    def set(self, key, body, ttl):
+        _redis = self._get_redis()
+        if _redis:
+            try:
+                _redis.setex(REDIS_PREFIX + key, ttl, body)
+            except redis.RedisError as e:
+                self._redis_error(e)
+            return
+
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > current_app.config['RESPONSE_CACHE_SIZE']:
+                self.entries.popitem(last=False)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+                'size': len(self.entries)
+            }
+
+
+response_cache = ResponseCache()
+
+
+def _get_key(tables, versions):
+    args = urlencode(sorted(request.args.items(multi=True)))
+    return f"{request.path}?{args}|" + ','.join(f'{t}:{v}' for t, v in zip(tables, versions))
+
+
+def cached_response(*tables, ttl=None):
+    """Caches the response of a view while none of `tables` are written to, for up to `ttl` seconds."""
+    def decorator(func):
+        @wraps(func)
+        def get_cached_response(*args, **kwargs):
+            if not current_app.config['RESPONSE_CACHE']:
+                return func(*args, **kwargs)
+
+            versions = response_cache.get_versions(tables)
+            if versions is None:
+                return func(*args, **kwargs)
+
+            key = _get_key(tables, versions)
+            body = response_cache.get(key)
+            if body is not None:
+                return current_app.response_class(body, mimetype='application/json')
+
+            response = make_response(func(*args, **kwargs))
+            if response.status_code == 200:
+                response_cache.set(key, response.get_data(), ttl or current_app.config['RESPONSE_CACHE_TTL'])
+            return response
+        return get_cached_response
+    return decorator
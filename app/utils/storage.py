@@ -106,6 +106,19 @@ class Storage(object):
             src_filename,
             destination_blob_name))
 
+    def upload_blob_from_bytes(self, destination_blob_name, binary, content_type='image/png'):
+        if self.no_google_config():
+            current_app.logger.info(
+                'No Google config, upload_blob_from_bytes: destination: %s, size: %s, content_type %s',
+                destination_blob_name, sizeof_fmt(len(binary)), content_type)
+            return
+
+        blob = self.bucket.blob(destination_blob_name)
+        blob.upload_from_string(binary, content_type=content_type)
+        blob.make_public()
+
+        current_app.logger.info('Uploaded {} to {}'.format(sizeof_fmt(len(binary)), destination_blob_name))
+
     def blob_exists(self, prefix, delimiter=None):
         if self.no_google_config():
             current_app.logger.info(
@@ -75,6 +75,26 @@ def send_stats():
     send_num_subscribers_and_social_stats(inc_subscribers=False)
 
 
+@manager.command
+def replay_paypal_ipns(txn_ids=None, start_date=None, end_date=None, allow_emails=False, replace_order=False):
+    """Replay the paypal IPNs for comma separated txn_ids or orders created from start_date to before end_date."""
+    from app.dao.orders_dao import dao_get_orders_for_replay
+    from app.routes.orders.rest import replay_paypal_ipns as _replay_paypal_ipns
+
+    if not txn_ids and not (start_date and end_date):
+        print("Set txn_ids or start_date and end_date")
+        return
+
+    orders = dao_get_orders_for_replay(
+        txn_ids=txn_ids.split(',') if txn_ids else None, start_date=start_date, end_date=end_date)
+
+    with application.test_request_context('/orders/paypal/replay_ipns', method='POST'):
+        outcomes = _replay_paypal_ipns(orders, allow_emails=allow_emails, replace_order=replace_order)
+
+    for outcome in outcomes:
+        print("{txn_id}: {status} {message}".format(message=outcome.get('message', ''), **outcome))
+
+
 @manager.command
 def create_test_zip():
     """Create zipfile for testing"""
@@ -2,11 +2,18 @@ from http.server import BaseHTTPRequestHandler, HTTPServer
 
 
 class Handler(BaseHTTPRequestHandler):
+    # keep connections alive so that pooled clients can be measured against the mock server
+    protocol_version = 'HTTP/1.1'
+
     def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        body = b'VERIFIED'
         self.send_response(200)
         self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(b'VERIFIED')
+        self.wfile.write(body)
 
 
 def main():
@@ -5,11 +5,15 @@ import requests_mock
 from urllib.parse import urlencode
 
 from tests.conftest import TEST_DATABASE_URI
-from app.comms.email import get_email_html, send_email, get_email_data
+from app.comms.email import (
+    get_batch_size, get_email_html, get_personalised_email_html, send_batch_email, send_email, get_email_data,
+    UNSUBCODE_PLACEHOLDER
+)
+from app.comms.encryption import decrypt, get_tokens
 from app.dao.email_providers_dao import dao_update_email_provider, dao_get_email_provider_by_id
 from tests.db import create_email_provider
 from app.errors import InvalidRequest
-from app.models import API_AUTH, BEARER_AUTH, MAGAZINE, EmailProvider, Email
+from app.models import API_AUTH, BASIC, BEARER_AUTH, MAGAZINE, EmailProvider, Email
 
 
 @pytest.fixture
@@ -267,6 +271,75 @@ class WhenSendingAnEmail:
         assert mock_logger.call_args == call("Emails disabled, unset EMAIL_DISABLED env var to re-enable")
 
 
+BATCH_DATA_MAP = {
+    "from": "from",
+    "to": "to",
+    "subject": "subject",
+    "message": "text",
+    "recipient_variables": "recipient-variables",
+    "recipient_unsubcode": "%recipient.unsubcode%"
+}
+
+
+class WhenSendingABatchEmail:
+
+    def it_gets_the_batch_size_if_provider_substitutes_recipient_variables(self, db_session):
+        email_provider = create_email_provider(batch_size=100, data_map=BATCH_DATA_MAP)
+        assert get_batch_size(email_provider) == 100
+
+    def it_gets_a_batch_size_of_1_if_provider_cannot_substitute_recipient_variables(
+        self, db_session, sample_email_provider
+    ):
+        dao_update_email_provider(sample_email_provider.id, batch_size=100)
+        assert get_batch_size(sample_email_provider) == 1
+
+    def it_sends_the_batch_in_one_request(self, mocker, db_session):
+        email_provider = create_email_provider(batch_size=10, data_map=BATCH_DATA_MAP)
+        members = [('member-1', 'test1@example.com'), ('member-2', 'test2@example.com')]
+
+        with requests_mock.mock() as r:
+            r.post(email_provider.api_url, text='OK')
+            results = send_batch_email(members, 'test subject', f'<a href="{UNSUBCODE_PLACEHOLDER}">unsubscribe</a>')
+
+            assert r.call_count == 1
+            data = json.loads(r.last_request.text)
+
+        assert data['to'] == 'test1@example.com,test2@example.com'
+        assert data['text'] == '<a href="%recipient.unsubcode%">unsubscribe</a>'
+        for member_id, email_to in members:
+            unsubcode = data['recipient-variables'][email_to]['unsubcode']
+            tokens = get_tokens(decrypt(unsubcode, 'unsub_test'))
+            assert tokens['memberid'] == member_id
+        assert results == [('member-1', (200, email_provider.id)), ('member-2', (200, email_provider.id))]
+
+    def it_sends_to_each_member_if_the_provider_cannot_send_batches(self, mocker, db_session, sample_email_provider):
+        mock_send_email = mocker.patch(
+            'app.comms.email.send_email', return_value=(200, sample_email_provider.id))
+        members = [('member-1', 'test1@example.com'), ('member-2', 'test2@example.com')]
+
+        results = send_batch_email(members, 'test subject', f'<a href="{UNSUBCODE_PLACEHOLDER}">unsubscribe</a>')
+
+        assert mock_send_email.call_count == 2
+        assert [args[0] for args, _ in mock_send_email.call_args_list] == ['test1@example.com', 'test2@example.com']
+        assert UNSUBCODE_PLACEHOLDER not in mock_send_email.call_args[0][2]
+        assert results == [
+            ('member-1', (200, sample_email_provider.id)), ('member-2', (200, sample_email_provider.id))]
+
+    def it_keeps_the_results_sent_before_the_provider_limit_is_reached(
+        self, mocker, db_session, sample_email_provider
+    ):
+        mocker.patch(
+            'app.comms.email.send_email',
+            side_effect=[(200, sample_email_provider.id), InvalidRequest('Minute limit reached', 429)]
+        )
+        members = [('member-1', 'test1@example.com'), ('member-2', 'test2@example.com')]
+
+        with pytest.raises(InvalidRequest) as e:
+            send_batch_email(members, 'test subject', f'<a href="{UNSUBCODE_PLACEHOLDER}">unsubscribe</a>')
+
+        assert e.value.sent_results == [('member-1', (200, sample_email_provider.id))]
+
+
 class WhenGettingEmailData:
 
     def it_gets_basic_email_data(self):
@@ -332,6 +405,17 @@ class WhenGettingEmailData:
             'subject': 'Test email'
         }
 
+    def it_gets_email_data_with_recipient_variables(self):
+        data = get_email_data(
+            BATCH_DATA_MAP, ["test@example.com", "test1@example.com"],
+            "Test email", "Some test message", "noone@example.com", "No one",
+            recipient_variables={"test@example.com": {"unsubcode": "1"}, "test1@example.com": {"unsubcode": "2"}}
+        )
+
+        assert data['to'] == 'test@example.com,test1@example.com'
+        assert data['recipient-variables'] == {
+            "test@example.com": {"unsubcode": "1"}, "test1@example.com": {"unsubcode": "2"}}
+
 
 class WhenGettingEmailHTML:
 
@@ -371,3 +455,16 @@ class WhenGettingEmailHTML:
         args, kwargs = mock_render_template.call_args
         assert args[0] == 'emails/magazine.html'
         assert kwargs['topics'] == topic_list
+
+    def it_renders_the_unsubcode_placeholder_and_personalises_it(self, app, db_session, sample_member):
+        email_html = get_email_html(BASIC, message='test message', unsubcode=UNSUBCODE_PLACEHOLDER)
+        assert UNSUBCODE_PLACEHOLDER in email_html
+
+        personalised_html = get_personalised_email_html(email_html, sample_member.id)
+
+        assert UNSUBCODE_PLACEHOLDER not in personalised_html
+        assert personalised_html == get_email_html(BASIC, message='test message', member_id=sample_member.id)
+
+        unsubcode = personalised_html.split('/member/unsubscribe/')[1].split('"')[0]
+        tokens = get_tokens(decrypt(unsubcode, app.config['EMAIL_UNSUB_SALT']))
+        assert tokens[app.config['EMAIL_TOKENS']['member_id']] == str(sample_member.id)
@@ -0,0 +1,49 @@
+from freezegun import freeze_time
+
+from app.comms.email_log import EmailLogWriter
+from app.models import EmailToMember
+
+from tests.db import create_member
+
+
+class WhenUsingEmailLogWriter:
+
+    def it_buffers_emails_sent_until_batch_size_reached(self, mocker, db_session, sample_email, sample_member):
+        mock_add_members_sent_to = mocker.patch('app.comms.email_log.dao_add_members_sent_to_email')
+        member = create_member(name='Test 1', email='test1@example.com')
+
+        email_log = EmailLogWriter(sample_email.id, batch_size=2)
+        email_log.add(sample_member.id)
+
+        assert not mock_add_members_sent_to.called
+
+        email_log.add(member.id, status_code=500)
+
+        assert mock_add_members_sent_to.call_count == 1
+        emails_to_members = mock_add_members_sent_to.call_args[0][0]
+        assert [e['member_id'] for e in emails_to_members] == [sample_member.id, member.id]
+        assert [e['status_code'] for e in emails_to_members] == [200, 500]
+        assert email_log.emails_to_members == []
+
+    def it_flushes_emails_sent_after_flush_seconds(self, mocker, db_session, sample_email, sample_member):
+        mock_add_members_sent_to = mocker.patch('app.comms.email_log.dao_add_members_sent_to_email')
+        mock_monotonic = mocker.patch('app.comms.email_log.time.monotonic', side_effect=[0, 11, 11])
+
+        email_log = EmailLogWriter(sample_email.id, batch_size=10, flush_seconds=10)
+        email_log.add(sample_member.id)
+
+        assert mock_add_members_sent_to.call_count == 1
+        assert mock_monotonic.call_count == 3
+
+    @freeze_time("2020-10-09T19:00:00")
+    def it_writes_remaining_emails_sent_on_exit(self, db_session, sample_email, sample_member, sample_email_provider):
+        with EmailLogWriter(sample_email.id, batch_size=10) as email_log:
+            email_log.add(sample_member.id, email_provider_id=sample_email_provider.id)
+
+            assert EmailToMember.query.count() == 0
+
+        emails_to_members = EmailToMember.query.all()
+        assert len(emails_to_members) == 1
+        assert emails_to_members[0].member_id == sample_member.id
+        assert emails_to_members[0].email_provider_id == sample_email_provider.id
+        assert str(emails_to_members[0].created_at) == '2020-10-09 19:00:00'
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+from freezegun import freeze_time
+import pytest
+from requests.exceptions import HTTPError
+import requests_mock
+
+from app.comms.email import send_email
+from app.comms.email_quota import EmailQuota
+
+from tests.db import create_email_to_member
+
+
+class WhenUsingEmailQuota:
+
+    @freeze_time("2020-10-09T19:00:00")
+    def it_seeds_the_counts_from_emails_sent(self, db_session, sample_email, sample_email_provider):
+        create_email_to_member(
+            email_id=sample_email.id, email_provider_id=sample_email_provider.id,
+            created_at=datetime.now() - timedelta(seconds=30)
+        )
+        create_email_to_member(
+            email_id=sample_email.id, email_provider_id=sample_email_provider.id,
+            created_at=datetime.now() - timedelta(minutes=30)
+        )
+
+        email_quota = EmailQuota()
+
+        assert email_quota.get_daily_count(sample_email_provider.id) == 2
+        assert email_quota.get_hourly_count(sample_email_provider.id) == 2
+        assert email_quota.get_minute_count(sample_email_provider.id) == 1
+
+    def it_only_loads_the_counts_once_per_provider(self, mocker, db_session, sample_email_provider):
+        mock_get_daily_count = mocker.patch(
+            'app.comms.email_quota.dao_get_todays_email_count_for_provider', return_value=5)
+
+        email_quota = EmailQuota()
+        email_quota.get_daily_count(sample_email_provider.id)
+        email_quota.add_email_sent(sample_email_provider.id)
+
+        assert email_quota.get_daily_count(sample_email_provider.id) == 6
+        assert email_quota.get_monthly_count(sample_email_provider.id) == 1
+        assert mock_get_daily_count.call_count == 1
+
+    def it_slides_the_minute_and_hour_windows(self, db_session, sample_email_provider):
+        email_quota = EmailQuota()
+
+        with freeze_time("2020-10-09T19:00:00") as frozen_time:
+            email_quota.add_email_sent(sample_email_provider.id)
+            email_quota.add_email_sent(sample_email_provider.id)
+
+            assert email_quota.get_minute_count(sample_email_provider.id) == 2
+
+            frozen_time.tick(delta=timedelta(minutes=2))
+            email_quota.add_email_sent(sample_email_provider.id)
+
+            assert email_quota.get_minute_count(sample_email_provider.id) == 1
+            assert email_quota.get_hourly_count(sample_email_provider.id) == 3
+
+            frozen_time.tick(delta=timedelta(minutes=59))
+
+            assert email_quota.get_hourly_count(sample_email_provider.id) == 1
+            assert email_quota.get_daily_count(sample_email_provider.id) == 3
+
+    def it_selects_the_provider_without_counting_emails_sent_in_the_db(
+        self, mocker, db_session, sample_email_provider
+    ):
+        mock_get_todays_count = mocker.patch('app.comms.email.dao_get_todays_email_count_for_provider')
+        email_quota = EmailQuota()
+
+        with requests_mock.mock() as r:
+            r.post(sample_email_provider.api_url, text='OK')
+            for _ in range(3):
+                send_email('someone@example.com', 'test subject', 'test message', email_quota=email_quota)
+
+        assert not mock_get_todays_count.called
+        assert email_quota.get_daily_count(sample_email_provider.id) == 3
+        assert email_quota.get_minute_count(sample_email_provider.id) == 3
+
+    def it_releases_the_emails_counted_if_the_send_fails(self, db_session, sample_email_provider):
+        email_quota = EmailQuota()
+
+        with requests_mock.mock() as r:
+            r.post(sample_email_provider.api_url, text='OK')
+            send_email('someone@example.com', 'test subject', 'test message', email_quota=email_quota)
+
+            r.post(sample_email_provider.api_url, status_code=400)
+            with pytest.raises(HTTPError):
+                send_email('someone@example.com', 'test subject', 'test message', email_quota=email_quota)
+
+        assert email_quota.get_monthly_count(sample_email_provider.id) == 1
+        assert email_quota.get_daily_count(sample_email_provider.id) == 1
+        assert email_quota.get_hourly_count(sample_email_provider.id) == 1
+        assert email_quota.get_minute_count(sample_email_provider.id) == 1
@@ -0,0 +1,73 @@
+from threading import Lock
+import time
+
+import pytest
+
+from app.comms.email_sender import EmailSender
+from app.errors import InvalidRequest
+
+
+class WhenUsingEmailSender:
+
+    def it_sends_emails_on_the_calling_thread_with_concurrency_of_one(self, app):
+        sent = []
+        with EmailSender(lambda member_id, result: sent.append((member_id, result)), concurrency=1) as email_sender:
+            assert not email_sender.executor
+            email_sender.send(1, lambda to: (200, to), 'test1@example.com')
+
+        assert sent == [(1, (200, 'test1@example.com'))]
+
+    def it_limits_the_emails_in_flight(self, app):
+        lock = Lock()
+        in_flight = {'current': 0, 'max': 0}
+
+        def send_email(to):
+            with lock:
+                in_flight['current'] += 1
+                in_flight['max'] = max(in_flight['max'], in_flight['current'])
+            time.sleep(0.01)
+            with lock:
+                in_flight['current'] -= 1
+            return 200, to
+
+        sent = []
+        with EmailSender(lambda member_id, result: sent.append(member_id), concurrency=3) as email_sender:
+            for i in range(10):
+                email_sender.send(i, send_email, f'test{i}@example.com')
+
+        assert sorted(sent) == list(range(10))
+        assert in_flight['max'] <= 3
+
+    def it_records_emails_in_flight_before_raising_an_error(self, app):
+        def send_email(to):
+            if to == 'limit@example.com':
+                raise InvalidRequest('Minute limit reached', 429)
+            time.sleep(0.01)
+            return 200, to
+
+        sent = []
+        with pytest.raises(InvalidRequest):
+            with EmailSender(lambda member_id, result: sent.append(member_id), concurrency=2) as email_sender:
+                email_sender.send(1, send_email, 'test1@example.com')
+                email_sender.send(2, send_email, 'limit@example.com')
+                email_sender.send(3, send_email, 'test3@example.com')
+                email_sender.send(4, send_email, 'test4@example.com')
+
+        assert 1 in sent
+        assert 2 not in sent
+
+    @pytest.mark.parametrize('concurrency', [1, 2])
+    def it_records_the_emails_sent_in_a_batch_before_it_failed(self, app, concurrency):
+        def send_batch_email(members):
+            e = InvalidRequest('Minute limit reached', 429)
+            e.sent_results = [(member_id, (200, to)) for member_id, to in members[:1]]
+            raise e
+
+        sent = []
+        with pytest.raises(InvalidRequest):
+            with EmailSender(
+                lambda member_id, result: sent.append(member_id), concurrency=concurrency
+            ) as email_sender:
+                email_sender.send_batch(send_batch_email, [(1, 'test1@example.com'), (2, 'test2@example.com')])
+
+        assert sent == [1]
@@ -0,0 +1,83 @@
+import pytest
+import requests_mock
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, ReadTimeoutError
+
+from app.comms.email import send_email
+from app.comms.email_sessions import EmailProviderSessions, email_provider_sessions
+from app.dao.email_providers_dao import dao_update_email_provider
+from app.models import API_AUTH, BEARER_AUTH
+
+
+class WhenUsingEmailProviderSessions:
+
+    def it_reuses_the_session_for_an_email_provider(self, db_session, sample_email_provider):
+        sessions = EmailProviderSessions()
+
+        session = sessions.get_session(sample_email_provider)
+
+        assert sessions.get_session(sample_email_provider) is session
+
+    def it_sets_the_auth_headers_on_the_session(self, db_session, sample_email_provider):
+        sample_email_provider.auth_type = BEARER_AUTH
+        session = EmailProviderSessions().get_session(sample_email_provider)
+
+        assert session.headers['Authorization'] == 'Bearer sample-api-key'
+        assert session.headers['Content-Type'] == 'application/json'
+
+    def it_retries_on_connection_and_server_errors(self, app, db_session, sample_email_provider):
+        session = EmailProviderSessions().get_session(sample_email_provider)
+
+        retries = session.get_adapter(sample_email_provider.api_url).max_retries
+        assert retries.connect == app.config['EMAIL_PROVIDER_RETRIES']
+        assert retries.status == app.config['EMAIL_PROVIDER_RETRIES']
+        assert 500 in retries.status_forcelist
+        assert 429 not in retries.status_forcelist
+        assert not retries.respect_retry_after_header
+        assert 'POST' in retries.allowed_methods
+
+        assert retries.increment(
+            method='POST', url=sample_email_provider.api_url, error=ConnectTimeoutError()
+        ).connect == app.config['EMAIL_PROVIDER_RETRIES'] - 1
+
+    def it_does_not_retry_a_read_timeout_on_a_post(self, db_session, sample_email_provider):
+        session = EmailProviderSessions().get_session(sample_email_provider)
+
+        retries = session.get_adapter(sample_email_provider.api_url).max_retries
+        with pytest.raises(MaxRetryError):
+            retries.increment(
+                method='POST',
+                url=sample_email_provider.api_url,
+                error=ReadTimeoutError(None, sample_email_provider.api_url, 'Read timed out')
+            )
+
+    def it_creates_a_new_session_when_the_api_key_changes(self, db_session, sample_email_provider):
+        sessions = EmailProviderSessions()
+        session = sessions.get_session(sample_email_provider)
+
+        sample_email_provider.api_key = 'new-api-key'
+        new_session = sessions.get_session(sample_email_provider)
+
+        assert new_session is not session
+        assert new_session.auth == ('api', 'new-api-key')
+
+    def it_drops_the_session_when_the_email_provider_is_updated(self, db_session, sample_email_provider):
+        session = email_provider_sessions.get_session(sample_email_provider)
+
+        dao_update_email_provider(sample_email_provider.id, api_url='http://new-api-url.com')
+
+        assert sample_email_provider.id not in email_provider_sessions.sessions
+        assert email_provider_sessions.get_session(sample_email_provider) is not session
+
+    def it_sends_emails_through_the_email_provider_session(self, mocker, db_session, sample_email_provider):
+        mock_session_post = mocker.spy(
+            email_provider_sessions.get_session(sample_email_provider), 'post')
+
+        with requests_mock.mock() as r:
+            r.post(sample_email_provider.api_url, text='OK')
+            send_email('someone@example.com', 'test subject', 'test message')
+            send_email('someone@example.com', 'test subject', 'test message')
+
+            assert r.call_count == 2
+            assert r.last_request.headers['api-key'] == sample_email_provider.api_key
+
+        assert mock_session_post.call_count == 2
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from email.mime.text import MIMEText
+import smtplib
+
+from freezegun import freeze_time
+import pytest
+
+from app.comms.smtp_pool import SMTPConnectionPool
+
+SMTP_INFO = {'SMTP_SERVER': 'smtp.example.com', 'SMTP_USER': 'user', 'SMTP_PASS': 'password'}
+
+
+@pytest.fixture
+def mock_smtp(mocker):
+    return mocker.patch('app.comms.smtp_pool.smtplib.SMTP')
+
+
+def get_message():
+    msg = MIMEText('test message', 'html')
+    msg['Subject'] = 'test subject'
+    return msg
+
+
+class WhenUsingSMTPConnectionPool:
+
+    def it_reuses_an_authenticated_connection(self, app, mock_smtp):
+        smtp_pool = SMTPConnectionPool()
+
+        for _ in range(3):
+            smtp_pool.send_message(get_message(), SMTP_INFO)
+
+        assert mock_smtp.call_count == 1
+        assert mock_smtp.return_value.login.call_count == 1
+        assert mock_smtp.return_value.send_message.call_count == 3
+        assert smtp_pool.get_stats() == {'hits': 2, 'misses': 1, 'reconnects': 0, 'idle_connections': 1}
+
+    def it_uses_a_connection_per_server_and_user(self, app, mock_smtp):
+        smtp_pool = SMTPConnectionPool()
+
+        smtp_pool.send_message(get_message(), SMTP_INFO)
+        smtp_pool.send_message(get_message(), dict(SMTP_INFO, SMTP_USER='another user'))
+
+        assert mock_smtp.call_count == 2
+        assert smtp_pool.get_stats()['misses'] == 2
+
+    def it_reconnects_when_server_disconnects(self, app, mock_smtp):
+        smtp_pool = SMTPConnectionPool()
+        smtp_pool.send_message(get_message(), SMTP_INFO)
+
+        mock_smtp.return_value.send_message.side_effect = [smtplib.SMTPServerDisconnected(), None]
+        smtp_pool.send_message(get_message(), SMTP_INFO)
+
+        assert mock_smtp.call_count == 2
+        assert mock_smtp.return_value.send_message.call_count == 3
+        assert smtp_pool.get_stats()['reconnects'] == 1
+
+    def it_closes_a_connection_after_max_messages(self, app, mocker, mock_smtp):
+        mocker.patch.dict('app.application.config', {'SMTP_MAX_MESSAGES_PER_CONNECTION': 2})
+        smtp_pool = SMTPConnectionPool()
+
+        for _ in range(3):
+            smtp_pool.send_message(get_message(), SMTP_INFO)
+
+        assert mock_smtp.call_count == 2
+        assert mock_smtp.return_value.quit.call_count == 1
+
+    def it_does_not_reuse_idle_connections(self, app, mock_smtp):
+        smtp_pool = SMTPConnectionPool()
+
+        with freeze_time('2020-10-09T19:00:00') as frozen_time:
+            smtp_pool.send_message(get_message(), SMTP_INFO)
+            frozen_time.tick(delta=timedelta(seconds=app.config['SMTP_MAX_IDLE_SECONDS'] + 1))
+            smtp_pool.send_message(get_message(), SMTP_INFO)
+
+        assert mock_smtp.call_count == 2
+        assert mock_smtp.return_value.quit.call_count == 1
+
+    def it_closes_all_connections(self, app, mock_smtp):
+        smtp_pool = SMTPConnectionPool()
+        smtp_pool.send_message(get_message(), SMTP_INFO)
+
+        smtp_pool.close_all()
+
+        assert mock_smtp.return_value.quit.called
+        assert smtp_pool.get_stats()['idle_connections'] == 0
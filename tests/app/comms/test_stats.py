@@ -1,4 +1,8 @@
-from app.comms.stats import send_ga_event
+from mock import Mock
+import pytest
+import requests
+
+from app.comms.stats import GA_BATCH_URL, StatsQueue, send_ga_event
 
 
 class WhenSendingStats:
@@ -36,3 +40,70 @@ class WhenSendingStats:
         send_ga_event("test", "test", "test", "test")
 
         assert not mock_post.called
+
+
+class WhenQueueingStats:
+
+    @pytest.fixture
+    def stats_queue(self, app, mocker):
+        mocker.patch.dict('app.application.config', {
+            'ENVIRONMENT': 'development',
+            'STATS_ASYNC': True
+        })
+        mocker.patch('app.comms.stats.Thread')
+        mocker.patch('app.comms.stats.atexit.register')
+        _stats_queue = StatsQueue()
+        mocker.patch('app.comms.stats.stats_queue', _stats_queue)
+        return _stats_queue
+
+    def it_queues_events_until_flushed(self, mocker, stats_queue):
+        mock_post = mocker.patch('app.comms.stats.requests.post', return_value=Mock(status_code=200))
+
+        send_ga_event("test", "test", "test", "test")
+
+        assert not mock_post.called
+        assert stats_queue.get_stats()['queued'] == 1
+
+        stats_queue.flush()
+
+        assert mock_post.call_args[0][0] == GA_BATCH_URL
+        assert mock_post.call_args[1]['data'] == "v=1&tid=1&cid=888&t=event&ec=test&ea=test&el=test&ev=1"
+        assert stats_queue.get_stats() == {'queued': 0, 'sent': 1, 'dropped': 0, 'failed': 0}
+
+    def it_sends_events_in_batches(self, mocker, stats_queue):
+        mock_post = mocker.patch('app.comms.stats.requests.post', return_value=Mock(status_code=200))
+
+        for i in range(25):
+            send_ga_event("test", "test", "test", f"test {i}")
+        stats_queue.flush()
+
+        assert mock_post.call_count == 2
+        assert len(mock_post.call_args_list[0][1]['data'].split('\n')) == 20
+        assert len(mock_post.call_args_list[1][1]['data'].split('\n')) == 5
+        assert stats_queue.get_stats()['sent'] == 25
+
+    def it_drops_events_when_the_queue_is_full(self, mocker, stats_queue):
+        mocker.patch.dict('app.application.config', {'STATS_QUEUE_SIZE': 1})
+        mock_post = mocker.patch('app.comms.stats.requests.post', return_value=Mock(status_code=200))
+
+        send_ga_event("test", "test", "test", "test 1")
+        send_ga_event("test", "test", "test", "test 2")
+        stats_queue.flush()
+
+        assert mock_post.call_count == 1
+        assert stats_queue.get_stats() == {'queued': 0, 'sent': 1, 'dropped': 1, 'failed': 0}
+
+    @pytest.mark.parametrize('response', [
+        Mock(status_code=503),
+        requests.exceptions.ConnectionError('GA unavailable')
+    ])
+    def it_counts_failed_events(self, mocker, stats_queue, response):
+        if isinstance(response, Exception):
+            mocker.patch('app.comms.stats.requests.post', side_effect=response)
+        else:
+            mocker.patch('app.comms.stats.requests.post', return_value=response)
+
+        send_ga_event("test", "test", "test", "test")
+        stats_queue.flush()
+
+        assert stats_queue.get_stats()['failed'] == 1
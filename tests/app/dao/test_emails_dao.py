@@ -5,6 +5,7 @@ from sqlalchemy.exc import IntegrityError
 
 from app.dao.emails_dao import (
     dao_add_member_sent_to_email,
+    dao_add_members_sent_to_email,
     dao_get_emails_for_year_starting_on,
     dao_get_emails_sent_count,
     dao_get_todays_email_count_for_provider,
@@ -128,6 +129,51 @@ class WhenUsingEmailsDAO(object):
 
         assert email_from_db.members_sent_to == [sample_member]
 
+    def it_adds_members_sent_to_email_in_bulk(self, db, db_session, sample_email, sample_member):
+        email_provider = create_email_provider()
+        member = create_member(name='New member', email='new_member@example.com')
+
+        dao_add_members_sent_to_email([
+            {
+                'email_id': sample_email.id, 'member_id': sample_member.id, 'status_code': 200,
+                'email_provider_id': email_provider.id, 'created_at': '2019-08-01 12:00:00'
+            },
+            {
+                'email_id': sample_email.id, 'member_id': member.id, 'status_code': 500,
+                'email_provider_id': email_provider.id, 'created_at': '2019-08-01 12:00:01'
+            },
+        ])
+
+        email_from_db = Email.query.filter(Email.id == sample_email.id).first()
+        assert sorted(m.email for m in email_from_db.members_sent_to) == sorted([sample_member.email, member.email])
+
+        email_to_member = EmailToMember.query.filter_by(email_id=sample_email.id, member_id=member.id).one()
+        assert email_to_member.status_code == 500
+        assert email_to_member.email_provider_id == email_provider.id
+        assert str(email_to_member.created_at) == '2019-08-01 12:00:01'
+
+    def it_skips_members_already_logged_in_a_bulk_add(self, db, db_session, sample_email, sample_member):
+        email_provider = create_email_provider()
+        member = create_member(name='New member', email='new_member@example.com')
+        dao_add_member_sent_to_email(sample_email.id, sample_member.id, status_code=200)
+
+        dao_add_members_sent_to_email([
+            {
+                'email_id': sample_email.id, 'member_id': sample_member.id, 'status_code': 500,
+                'email_provider_id': email_provider.id, 'created_at': '2019-08-01 12:00:00'
+            },
+            {
+                'email_id': sample_email.id, 'member_id': member.id, 'status_code': 200,
+                'email_provider_id': email_provider.id, 'created_at': '2019-08-01 12:00:01'
+            },
+        ])
+
+        assert EmailToMember.query.filter_by(email_id=sample_email.id).count() == 2
+        assert EmailToMember.query.filter_by(
+            email_id=sample_email.id, member_id=sample_member.id).one().status_code == 200
+        assert EmailToMember.query.filter_by(
+            email_id=sample_email.id, member_id=member.id).one().status_code == 200
+
     @freeze_time("2019-06-10T10:00:00")
     def it_gets_emails_from_starting_date_from_last_year(self, db, db_session, sample_email):
         emails = [create_email(details='more details', created_at='2019-01-01'), sample_email]
@@ -192,6 +192,30 @@ class WhenUsingEventsDAO(object):
         assert events_from_db[0] == event_2
         assert events_from_db[1] == sample_event_with_dates
 
+    @freeze_time("2018-01-10T19:00:00")
+    def it_gets_each_event_once_ordered_by_its_first_date(self, db_session, sample_event_with_dates, sample_event_type):
+        course = create_event(
+            title='course',
+            event_type_id=sample_event_type.id,
+            event_dates=[
+                create_event_date(event_datetime='2018-01-03T19:00:00'),
+                create_event_date(event_datetime='2018-01-17T19:00:00'),
+                create_event_date(event_datetime='2018-01-24T19:00:00'),
+            ]
+        )
+        event = create_event(
+            title='future event',
+            event_type_id=sample_event_type.id,
+            event_dates=[create_event_date(event_datetime='2018-01-20T19:00:00')]
+        )
+
+        assert dao_get_events_in_year(2018) == [sample_event_with_dates, course, event]
+        assert dao_get_events_in_year(2018, latest_first=True) == [event, course, sample_event_with_dates]
+        assert dao_get_future_events() == [course, event]
+        assert dao_get_past_year_events() == [sample_event_with_dates, course]
+        assert dao_get_limited_events(2) == [course, event]
+        assert dao_get_events() == [sample_event_with_dates, course, event]
+
     def it_gets_existing_event_at_venue(self, db_session, sample_event_with_dates, sample_event, sample_event_type):
         create_event(
             title='another event',
@@ -81,6 +81,19 @@ class WhenUsingMembersDAO(object):
         assert str(member_id) == str(member.id)
         assert email == member.email
 
+    def it_gets_pages_of_members_not_sent_to_in_member_id_order(self, db_session, sample_member, sample_email):
+        members = sorted([
+            sample_member,
+            create_member(email='test1@example.com'),
+            create_member(email='test2@example.com')
+        ], key=lambda m: m.id)
+
+        first_page = dao_get_members_not_sent_to(sample_email.id, limit=2)
+        assert [member_id for member_id, _ in first_page] == [m.id for m in members[:2]]
+
+        next_page = dao_get_members_not_sent_to(sample_email.id, limit=2, after_member_id=first_page[-1][0])
+        assert [member_id for member_id, _ in next_page] == [members[2].id]
+
     def it_gets_member_by_email(self, db_session):
         member = create_member(email='Test@example.com')
         member_found = dao_get_member_by_email('test@example.com')
@@ -1,9 +1,18 @@
+from datetime import datetime
+
 import pytest
+from na_common.delivery import statuses
 
-from app.dao.orders_dao import dao_get_orders
+from app.dao import dao_update_record
+from app.dao.books_dao import dao_update_book_to_order_quantity
+from app.dao.orders_dao import (
+    dao_delete_order, dao_get_order_report_month_versions, dao_get_order_report_months, dao_get_orders,
+    dao_get_orders_delivery_report, dao_get_orders_page, dao_get_orders_revenue_report, dao_save_order_report_month
+)
 from app.models import Order
+from app.utils.queries import count_queries
 
-from tests.db import create_order
+from tests.db import create_book, create_order, create_ticket
 
 
 class WhenUsingOrdersDao:
@@ -31,3 +40,155 @@ class WhenUsingOrdersDao:
         orders = dao_get_orders()
 
         assert len(orders) == 4
+
+    def it_gets_valid_or_invalid_orders(self, db_session, sample_order):
+        invalid_order = create_order(old_id=2, txn_id='INVALID_1637667646-112233')
+        duplicate_order = create_order(old_id=3, txn_id='XX-1-112233')
+
+        assert dao_get_orders(invalid=False) == [sample_order]
+        assert set(dao_get_orders(invalid=True)) == set([invalid_order, duplicate_order])
+
+    def it_gets_orders_with_their_linked_transactions(self, db_session, sample_order):
+        linked_order = create_order(
+            old_id=2, txn_id='2233445566', created_at='2021-06-01 12:00', linked_txn_id=sample_order.txn_id)
+        linked_order2 = create_order(
+            old_id=3, txn_id='3344556677', created_at='2021-06-02 12:00', linked_txn_id=sample_order.txn_id)
+        create_order(old_id=4, txn_id='XX-1-3344556677', linked_txn_id=sample_order.txn_id)
+
+        orders = dao_get_orders(invalid=False, with_linked=True)
+
+        assert orders == [sample_order]
+        assert orders[0].linked_transactions == [linked_order, linked_order2]
+
+    def it_gets_a_page_of_orders_after_an_order(self, db_session):
+        orders = [
+            create_order(old_id=i, txn_id=f'112233{i}', created_at='2021-06-01 12:00') for i in range(4)
+        ]
+        orders = sorted(orders, key=lambda o: o.id, reverse=True)
+
+        page = dao_get_orders_page(2, after=(orders[1].created_at, orders[1].id))
+
+        assert page == orders[2:]
+
+    def it_gets_a_page_of_orders_matching_filters(self, db_session):
+        create_order(old_id=1, txn_id='1122331', created_at='2021-06-01 12:00', payment_status='completed')
+        order = create_order(old_id=2, txn_id='1122332', created_at='2021-06-02 12:00', payment_status='refunded')
+        create_order(old_id=3, txn_id='1122333', created_at='2021-06-03 12:00', payment_status='refunded')
+
+        page = dao_get_orders_page(10, payment_status='refunded', end_date='2021-06-03')
+
+        assert page == [order]
+
+    def it_gets_orders_with_details_in_a_fixed_number_of_queries(
+        self, db_session, sample_order, sample_event_with_dates
+    ):
+        event_id = sample_event_with_dates.id
+        eventdate_id = sample_event_with_dates.get_sorted_event_dates()[0]['id']
+
+        def get_orders_query_count():
+            db_session.session.expunge_all()
+            with count_queries() as query_counter:
+                json_orders = [o.serialize() for o in dao_get_orders(with_details=True)]
+            return len(json_orders), query_counter.count
+
+        orders_count, query_count = get_orders_query_count()
+        assert orders_count == 1
+
+        for i in range(3):
+            book = create_book(old_id=i + 2, title=f'Book {i}', buy_code=f'buy_code_{i}')
+            tickets = [create_ticket(event_id=event_id, eventdate_id=eventdate_id) for _ in range(2)]
+            create_order(old_id=i + 2, txn_id=f'order_{i}', books=[book], tickets=tickets)
+
+        assert get_orders_query_count() == (4, query_count)
+        assert query_count <= 11
+
+    def it_gets_the_orders_revenue_report(self, db_session, sample_event_with_dates, sample_book):
+        event_id = sample_event_with_dates.id
+        eventdate_id = sample_event_with_dates.get_sorted_event_dates()[0]['id']
+        tickets = [
+            create_ticket(event_id=event_id, eventdate_id=eventdate_id, ticket_type='Full', price=10),
+            create_ticket(event_id=event_id, eventdate_id=eventdate_id, ticket_type='Concession', price=5),
+        ]
+        create_order(
+            created_at='2021-01-10 12:00', txn_id='order_1', payment_status='Completed', payment_total=17,
+            tickets=tickets, books=[sample_book], delivery_zone='UK', shipping_cost=2
+        )
+        create_order(
+            created_at='2021-02-10 12:00', txn_id='order_2', payment_status='Completed', payment_total=20,
+            delivery_zone=None, is_donation=True
+        )
+
+        # excluded from the report
+        create_order(created_at='2021-02-10 12:00', txn_id='order_3', payment_status='Pending')
+        create_order(created_at='2021-02-10 12:00', txn_id='XX-order_4', payment_status='Completed')
+        create_order(
+            created_at='2021-02-11 12:00', txn_id='order_5', payment_status='Completed', linked_txn_id='order_1')
+        create_order(created_at='2022-01-10 12:00', txn_id='order_6', payment_status='Completed')
+
+        report = dao_get_orders_revenue_report(datetime(2021, 1, 1), datetime(2022, 1, 1))
+
+        assert report['months'] == [
+            {'month': '2021-01', 'orders': 1, 'revenue': '17.00'},
+            {'month': '2021-02', 'orders': 1, 'revenue': '20.00'},
+        ]
+        assert report['events'] == [
+            {'event_id': str(event_id), 'title': sample_event_with_dates.title, 'tickets': 2, 'revenue': '15.00'}
+        ]
+        assert report['ticket_types'] == [
+            {'ticket_type': 'Concession', 'tickets': 1, 'revenue': '5.00'},
+            {'ticket_type': 'Full', 'tickets': 1, 'revenue': '10.00'},
+        ]
+        assert report['books'] == [
+            {'book_id': str(sample_book.id), 'title': sample_book.title, 'quantity': 1}
+        ]
+        assert report['delivery_zones'] == [{'delivery_zone': 'UK', 'orders': 1, 'shipping': '2.00'}]
+        assert report['donations'] == [
+            {'type': 'sale', 'orders': 1, 'revenue': '17.00'},
+            {'type': 'donation', 'orders': 1, 'revenue': '20.00'},
+        ]
+
+    def it_gets_the_orders_delivery_report(self, db_session):
+        create_order(txn_id='order_1', delivery_status=statuses.DELIVERY_EXTRA, delivery_balance=3)
+        create_order(txn_id='order_2', delivery_status=statuses.DELIVERY_NOT_PAID, delivery_balance=2)
+        create_order(txn_id='order_3', delivery_status=statuses.DELIVERY_REFUND, delivery_balance=1.5)
+        create_order(
+            txn_id='order_4', delivery_status=statuses.DELIVERY_REFUND, delivery_balance=1.5, refund_issued=True)
+        create_order(txn_id='order_5', delivery_status=statuses.DELIVERY_PAID, delivery_balance=0)
+
+        report = dao_get_orders_delivery_report(datetime(2000, 1, 1), datetime(2100, 1, 1))
+
+        assert report == {
+            'outstanding_delivery': {'orders': 2, 'balance': '5.00'},
+            'refunds_due': {'orders': 1, 'balance': '1.50'},
+        }
+
+    def it_changes_the_report_month_version_when_an_order_is_written(self, db_session):
+        order = create_order(created_at='2021-01-10 12:00', txn_id='order_1')
+        create_order(created_at='2021-02-10 12:00', txn_id='order_2')
+
+        versions = dao_get_order_report_month_versions(datetime(2021, 1, 1), datetime(2021, 3, 1))
+        assert list(versions) == ['2021-01', '2021-02']
+
+        dao_update_record(Order, order.id, payment_total=20)
+        updated_versions = dao_get_order_report_month_versions(datetime(2021, 1, 1), datetime(2021, 3, 1))
+        assert updated_versions['2021-01'] != versions['2021-01']
+        assert updated_versions['2021-02'] == versions['2021-02']
+
+        dao_delete_order('order_2')
+        assert list(dao_get_order_report_month_versions(datetime(2021, 1, 1), datetime(2021, 3, 1))) == ['2021-01']
+
+    def it_changes_the_report_month_version_when_a_book_quantity_changes(self, db_session, sample_book):
+        order = create_order(created_at='2021-01-10 12:00', txn_id='order_1', books=[sample_book])
+        versions = dao_get_order_report_month_versions(datetime(2021, 1, 1), datetime(2021, 2, 1))
+
+        dao_update_book_to_order_quantity(sample_book.id, order.id, 2)
+
+        assert dao_get_order_report_month_versions(datetime(2021, 1, 1), datetime(2021, 2, 1)) != versions
+
+    def it_replaces_a_saved_report_month(self, db_session):
+        dao_save_order_report_month('2021-01', '1:1', {'months': []})
+        dao_save_order_report_month('2021-01', '2:2', {'months': [{'month': '2021-01'}]})
+
+        report_month = dao_get_order_report_months(['2021-01'])['2021-01']
+        assert report_month.version == '2:2'
+        assert report_month.report == {'months': [{'month': '2021-01'}]}
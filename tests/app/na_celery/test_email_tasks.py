@@ -10,10 +10,16 @@ from mock import call
 import pytest
 from urllib.parse import parse_qs
 
+from app.comms.email import get_email_html
 from app.na_celery.email_tasks import send_emails, send_periodic_emails, send_missing_confirmation_emails
 from app.comms.encryption import decrypt, get_tokens
 from app.errors import InvalidRequest
-from app.models import APPROVED, DRAFT, TICKET_STATUS_UNUSED, Email, Magazine, EmailToMember, MAGAZINE
+from app.dao.emails_dao import dao_create_email_send_job, dao_get_email_send_job
+from app.dao.members_dao import dao_get_members_not_sent_to
+from app.models import (
+    APPROVED, DRAFT, REJECTED, SEND_JOB_COMPLETED, SEND_JOB_PAUSED, SEND_JOB_RUNNING, TICKET_STATUS_UNUSED,
+    Email, EmailSendJob, EmailToMember, Magazine, MAGAZINE
+)
 from tests.app.routes.orders.test_rest import sample_ipns
 
 from tests.db import (
@@ -44,6 +50,50 @@ class WhenProcessingSendEmailsTask:
             'total_active_members': 1
         }
 
+    def it_renders_the_email_once_and_personalises_it_for_each_member(
+        self, mocker, db_session, sample_email, sample_member, sample_email_provider
+    ):
+        mocker.patch.dict('app.application.config', {
+            'ENVIRONMENT': 'test',
+            'EMAIL_RESTRICT': None
+        })
+        member_1 = create_member(name='Test 1', email='test1@example.com')
+
+        mock_get_email_html = mocker.patch('app.na_celery.email_tasks.get_email_html', wraps=get_email_html)
+        mock_send_email = mocker.patch(
+            'app.na_celery.email_tasks.send_email', return_value=(200, sample_email_provider.id))
+        send_emails(sample_email.id)
+
+        assert mock_get_email_html.call_count == 1
+        assert mock_send_email.call_count == 2
+
+        member_ids = {sample_member.email: str(sample_member.id), member_1.email: str(member_1.id)}
+        for args, _ in mock_send_email.call_args_list:
+            page = BeautifulSoup(args[2], 'html.parser')
+            unsubcode = page.select_one('#unsublink')['href'].split('/')[-1]
+            tokens = get_tokens(decrypt(unsubcode, current_app.config['EMAIL_UNSUB_SALT']))
+            assert tokens[current_app.config['EMAIL_TOKENS']['member_id']] == member_ids[args[0]]
+
+    def it_sends_emails_concurrently_and_logs_each_member(
+        self, mocker, db_session, sample_email, sample_member, sample_email_provider
+    ):
+        mocker.patch.dict('app.application.config', {
+            'ENVIRONMENT': 'test',
+            'EMAIL_RESTRICT': None,
+            'EMAIL_SEND_CONCURRENCY': 2
+        })
+        create_member(name='Test 1', email='test1@example.com')
+        create_member(name='Test 2', email='test2@example.com')
+
+        mock_send_email = mocker.patch(
+            'app.na_celery.email_tasks.send_email', return_value=(200, sample_email_provider.id))
+        mock_send_ga_event = mocker.patch('app.na_celery.email_tasks.send_ga_event')
+        send_emails(sample_email.id)
+
+        assert mock_send_email.call_count == 3
+        assert mock_send_ga_event.call_count == 3
+        assert sample_email.serialize()['emails_sent_counts']['success'] == 3
+
     @freeze_time("2020-10-09T19:00:00")
     def it_only_sends_to_3_emails_if_not_live_environment(
         self, mocker, db_session, sample_email, sample_member, sample_email_provider
@@ -55,16 +105,18 @@ class WhenProcessingSendEmailsTask:
 
         member_1 = create_member(name='Test 1', email='test1@example.com')
         member_2 = create_member(name='Test 2', email='test2@example.com')
-        create_member(name='Test 3', email='test3@example.com')
+        member_3 = create_member(name='Test 3', email='test3@example.com')
 
         mock_send_email = mocker.patch(
             'app.na_celery.email_tasks.send_email', return_value=(200, sample_email_provider.id))
         send_emails(sample_email.id)
 
+        # members are sent to in member id order
+        members = sorted([sample_member, member_1, member_2, member_3], key=lambda m: m.id)
         assert mock_send_email.call_count == 3
-        assert mock_send_email.call_args_list[0][0][0] == sample_member.email
-        assert mock_send_email.call_args_list[1][0][0] == member_1.email
-        assert mock_send_email.call_args_list[2][0][0] == member_2.email
+        assert mock_send_email.call_args_list[0][0][0] == members[0].email
+        assert mock_send_email.call_args_list[1][0][0] == members[1].email
+        assert mock_send_email.call_args_list[2][0][0] == members[2].email
         assert sample_email.serialize()['emails_sent_counts'] == {
             'success': 3,
             'failed': 0,
@@ -84,7 +136,7 @@ class WhenProcessingSendEmailsTask:
             'EMAIL_RESTRICT': 1
         })
 
-        create_member(name='Test 1', email='test1@example.com')
+        member_1 = create_member(name='Test 1', email='test1@example.com')
 
         mock_send_email = mocker.patch(
             'app.na_celery.email_tasks.send_email', return_value=(200, sample_email_provider.id)
@@ -92,7 +144,7 @@ class WhenProcessingSendEmailsTask:
         send_emails(sample_email.id)
 
         assert mock_send_email.call_count == 1
-        assert mock_send_email.call_args_list[0][0][0] == sample_member.email
+        assert mock_send_email.call_args_list[0][0][0] == min([sample_member, member_1], key=lambda m: m.id).email
 
     def it_only_sends_to_first_member_if_email_test_and_doesnt_record_it(
         self, mocker, db, db_session, sample_email, sample_member, sample_email_provider
@@ -101,7 +153,7 @@ class WhenProcessingSendEmailsTask:
             'ENVIRONMENT': 'test',
             'EMAIL_TEST': 1
         })
-        mock_record_member_email = mocker.patch('app.na_celery.email_tasks.dao_add_member_sent_to_email')
+        mock_record_member_email = mocker.patch('app.comms.email_log.dao_add_members_sent_to_email')
 
         create_member(name='Test 1', email='test1@example.com')
 
@@ -130,6 +182,32 @@ class WhenProcessingSendEmailsTask:
         assert not mock_send_email.called
         assert mock_logger.called
 
+    def it_stops_sending_when_the_email_is_rejected_while_sending(
+        self, mocker, db, db_session, sample_email, sample_member, sample_email_provider
+    ):
+        mocker.patch.dict('app.application.config', {
+            'ENVIRONMENT': 'test',
+            'EMAIL_RESTRICT': None,
+            'EMAIL_LIMIT': 10,
+            'EMAIL_SEND_CONCURRENCY': 1,
+            'EMAIL_STATE_CHECK_SENDS': 2,
+            'EMAIL_LOG_BATCH_SIZE': 50
+        })
+        for i in range(5):
+            create_member(name=f'Test {i}', email=f'test{i}@example.com')
+
+        def send_email(*args, **kwargs):
+            if mock_send_email.call_count == 1:
+                # rejected outside the task's session, as it would be by an admin
+                db.engine.execute(
+                    Email.__table__.update().where(Email.id == sample_email.id).values(email_state=REJECTED))
+            return 200, sample_email_provider.id
+
+        mock_send_email = mocker.patch('app.na_celery.email_tasks.send_email', side_effect=send_email)
+        send_emails(sample_email.id)
+
+        assert mock_send_email.call_count == 2
+
     def it_only_sends_to_unsent_members_and_shows_failed_stat(
         self, mocker, db, db_session, sample_email, sample_member, sample_email_provider
     ):
@@ -308,26 +386,65 @@ class WhenProcessingSendEmailsTask:
             minute_limit=minute
         )
 
-        member_0 = create_member(name='Sue Green', email='sue@example.com')
-        member_1 = create_member(name='Test 1', email='test1@example.com')
-        create_member(name='Test 2', email='test2@example.com')
-        # member created after email expired not counted
-        create_member(name='Test 3', email='test3@example.com', created_at='2019-08-09T19:00:00')
+        members = sorted([
+            create_member(name='Sue Green', email='sue@example.com'),
+            create_member(name='Test 1', email='test1@example.com'),
+            create_member(name='Test 2', email='test2@example.com'),
+            # member created after email expired not counted
+            create_member(name='Test 3', email='test3@example.com', created_at='2019-08-09T19:00:00')
+        ], key=lambda m: m.id)
 
         mock_send_email = mocker.patch(
             'app.na_celery.email_tasks.send_email', return_value=(200, email_provider.id))
         send_emails(sample_email.id)
 
         assert mock_send_email.call_count == expected_limit
-        assert mock_send_email.call_args_list[0][0][0] == member_0.email
+        assert mock_send_email.call_args_list[0][0][0] == members[0].email
         if expected_limit > 1:
-            assert mock_send_email.call_args_list[1][0][0] == member_1.email
+            assert mock_send_email.call_args_list[1][0][0] == members[1].email
         assert sample_email.serialize()['emails_sent_counts'] == {
             'success': expected_limit,
             'failed': 0,
             'total_active_members': 3
         }
 
+    def it_sends_batches_of_emails_if_the_provider_supports_batches(self, mocker, db_session, sample_email):
+        mocker.patch.dict('app.application.config', {
+            'ENVIRONMENT': 'live',
+            'EMAIL_RESTRICT': None
+        })
+        email_provider = create_email_provider(
+            batch_size=2,
+            data_map={
+                "from": "from",
+                "to": "to",
+                "subject": "subject",
+                "message": "text",
+                "recipient_variables": "recipient-variables",
+                "recipient_unsubcode": "%recipient.unsubcode%"
+            }
+        )
+        members = sorted([
+            create_member(name='Sue Green', email='sue@example.com'),
+            create_member(name='Test 1', email='test1@example.com'),
+            create_member(name='Test 2', email='test2@example.com')
+        ], key=lambda m: m.id)
+
+        mock_send_batch_email = mocker.patch(
+            'app.na_celery.email_tasks.send_batch_email',
+            side_effect=lambda batch, *args, **kwargs: [
+                (member_id, (200, email_provider.id)) for member_id, _ in batch
+            ]
+        )
+        mock_send_email = mocker.patch('app.na_celery.email_tasks.send_email')
+        send_emails(sample_email.id)
+
+        assert not mock_send_email.called
+        assert [len(args[0]) for args, _ in mock_send_batch_email.call_args_list] == [2, 1]
+        assert [m[1] for args, _ in mock_send_batch_email.call_args_list for m in args[0]] == [
+            m.email for m in members]
+        assert sample_email.serialize()['emails_sent_counts']['success'] == 3
+
     def it_sends_a_magazine_email(
         self, mocker, db_session, sample_magazine_email, sample_member, sample_email_provider
     ):
@@ -378,15 +495,93 @@ class WhenProcessingSendEmailsTask:
             side_effect=InvalidRequest('Minute limit reached', 429)
         )
         mock_logger_error = mocker.patch('app.na_celery.email_tasks.current_app.logger.error')
-        mock_send_periodic_task = mocker.patch('app.na_celery.email_tasks.send_periodic_emails.apply_async')
-        with pytest.raises(expected_exception=InvalidRequest):
-            send_emails(sample_email.id)
+        mock_resume_task = mocker.patch('app.na_celery.email_tasks.resume_email_send_job.apply_async')
+        with freeze_time("2020-10-09T19:00:00"):
+            with pytest.raises(expected_exception=InvalidRequest):
+                send_emails(sample_email.id)
         assert mock_logger_error.called
         args = mock_logger_error.call_args[0]
         assert args[0] == 'Email limit reached: %r'
         assert args[1] == 'Minute limit reached'
-        assert mock_send_periodic_task.called
-        assert mock_send_periodic_task.call_args == call(countdown=60)
+        assert mock_resume_task.called
+        assert mock_resume_task.call_args == call((str(sample_email.id),), countdown=60)
+
+        email_send_job = dao_get_email_send_job(sample_email.id)
+        assert email_send_job.status == SEND_JOB_PAUSED
+        assert email_send_job.paused_until == datetime(2020, 10, 9, 19, 1)
+
+    def it_records_the_send_job_progress_and_completes_it(
+        self, mocker, db_session, sample_email, sample_member, sample_email_provider
+    ):
+        create_member(name='Test 1', email='test1@example.com')
+        mocker.patch('app.na_celery.email_tasks.send_email', return_value=(200, sample_email_provider.id))
+
+        send_emails(sample_email.id)
+
+        email_send_job = dao_get_email_send_job(sample_email.id)
+        assert email_send_job.status == SEND_JOB_COMPLETED
+        assert email_send_job.total_members == 2
+        assert email_send_job.sent == 2
+        assert email_send_job.failed == 0
+        assert email_send_job.get_remaining() == 0
+        assert email_send_job.provider_usage == {str(sample_email_provider.id): 2}
+        assert not email_send_job.last_member_id
+
+    def it_resumes_the_send_job_from_the_last_member_sent_to(
+        self, mocker, db_session, sample_email, sample_member, sample_email_provider
+    ):
+        mocker.patch.dict('app.application.config', {
+            'EMAIL_LIMIT': 2
+        })
+        members = sorted([
+            sample_member,
+            create_member(name='Test 1', email='test1@example.com'),
+            create_member(name='Test 2', email='test2@example.com')
+        ], key=lambda m: m.id)
+        mock_send_email = mocker.patch(
+            'app.na_celery.email_tasks.send_email', return_value=(200, sample_email_provider.id))
+
+        send_emails(sample_email.id)
+
+        email_send_job = dao_get_email_send_job(sample_email.id)
+        assert email_send_job.status == SEND_JOB_RUNNING
+        assert email_send_job.last_member_id == members[1].id
+        assert email_send_job.get_remaining() == 1
+
+        mock_get_members_not_sent_to = mocker.patch(
+            'app.na_celery.email_tasks.dao_get_members_not_sent_to', wraps=dao_get_members_not_sent_to)
+        send_emails(sample_email.id)
+
+        assert mock_get_members_not_sent_to.call_args[1]['after_member_id'] == members[1].id
+        assert mock_send_email.call_args[0][0] == members[2].email
+        # the next run starts again from the first member to check none were missed
+        assert not dao_get_email_send_job(sample_email.id).last_member_id
+
+        send_emails(sample_email.id)
+
+        assert mock_send_email.call_count == 3
+        assert dao_get_email_send_job(sample_email.id).status == SEND_JOB_COMPLETED
+
+    @freeze_time("2019-06-03T10:00:00")
+    def it_doesnt_resume_paused_or_completed_send_jobs_periodically(self, mocker, db_session):
+        mock_send_emails = mocker.patch('app.na_celery.email_tasks.send_emails')
+        approved_email, paused_email, completed_email = [
+            create_email(
+                send_starts_at='2019-06-02',
+                created_at='2019-06-01',
+                send_after='2019-06-03 9:00',
+                email_state=APPROVED
+            ) for _ in range(3)
+        ]
+        dao_create_email_send_job(EmailSendJob(
+            email_id=paused_email.id, status=SEND_JOB_PAUSED, paused_until=datetime(2019, 6, 3, 11, 0)))
+        dao_create_email_send_job(EmailSendJob(
+            email_id=completed_email.id, status=SEND_JOB_COMPLETED, completed_at=datetime(2019, 6, 3, 9, 0)))
+
+        send_periodic_emails()
+
+        assert mock_send_emails.call_count == 1
+        assert mock_send_emails.call_args_list[0][0][0] == approved_email.id
 
     def it_reraises_if_not_429_status_code_response(self, mocker, db_session, sample_email, sample_member):
         mocker.patch(
@@ -1,8 +1,17 @@
+from datetime import datetime, timedelta
+from flask import current_app
 from mock import call
 import pytest
+import requests_mock
+from urllib.parse import parse_qs
 
+from app.dao.orders_dao import dao_create_paypal_ipn, dao_get_orders, dao_get_paypal_ipn
 from app.errors import PaypalException
-from app.na_celery.paypal_tasks import create_update_paypal_button_task
+from app.models import (
+    PaypalIpn, PAYPAL_IPN_FAILED, PAYPAL_IPN_PROCESSED, PAYPAL_IPN_PROCESSING, PAYPAL_IPN_QUEUED
+)
+from app.na_celery.paypal_tasks import create_update_paypal_button_task, process_paypal_ipn, requeue_paypal_ipns
+from tests.app.routes.orders.test_rest import sample_ipns
 
 
 @pytest.fixture
@@ -55,3 +64,128 @@ class WhenProcessingCreateUpdatePaypalButtonTask:
             booking_code=None
         )
         assert sample_event_with_dates.booking_code == 'test booking code'
+
+
+@pytest.fixture
+def sample_paypal_ipn(db_session, sample_event_with_dates):
+    params = parse_qs(sample_ipns[0].format(id=sample_event_with_dates.id, txn_id='112233', txn_type='cart'))
+    paypal_ipn = PaypalIpn(txn_id='112233', params=params)
+    dao_create_paypal_ipn(paypal_ipn)
+    return paypal_ipn
+
+
+class WhenProcessingPaypalIpnTask:
+
+    def it_processes_a_queued_ipn(self, mocker, sample_paypal_ipn, mock_storage):
+        mock_send_email = mocker.patch('app.routes.orders.rest.send_email', return_value=(200, None))
+
+        with requests_mock.mock() as r:
+            r.post(current_app.config['PAYPAL_VERIFY_URL'], text='VERIFIED')
+            process_paypal_ipn('112233')
+
+        orders = dao_get_orders()
+        assert len(orders) == 1
+        assert orders[0].txn_id == '112233'
+        assert len(orders[0].tickets) == 1
+        assert mock_send_email.called
+
+        ipn = dao_get_paypal_ipn('112233')
+        assert ipn.status == PAYPAL_IPN_PROCESSED
+        assert ipn.attempts == 1
+        assert ipn.processed_at
+
+    def it_does_not_process_an_ipn_twice(self, mocker, sample_paypal_ipn):
+        mock_paypal_ipn = mocker.patch('app.routes.orders.rest.paypal_ipn', return_value='{}')
+
+        process_paypal_ipn('112233')
+        process_paypal_ipn('112233')
+
+        assert mock_paypal_ipn.call_count == 1
+        assert mock_paypal_ipn.call_args == call(sample_paypal_ipn.params, verify=True, replace_order=False)
+
+    def it_does_not_process_an_ipn_being_processed(self, mocker, db_session):
+        dao_create_paypal_ipn(PaypalIpn(txn_id='112233', params={}, status=PAYPAL_IPN_PROCESSING))
+        mock_paypal_ipn = mocker.patch('app.routes.orders.rest.paypal_ipn')
+
+        process_paypal_ipn('112233')
+
+        assert not mock_paypal_ipn.called
+
+    def it_processes_an_ipn_left_processing_by_a_worker_that_died(self, mocker, db_session):
+        dao_create_paypal_ipn(PaypalIpn(
+            txn_id='112233', params={}, status=PAYPAL_IPN_PROCESSING, attempts=1,
+            updated_at=datetime.utcnow() - timedelta(seconds=601)
+        ))
+        mock_paypal_ipn = mocker.patch('app.routes.orders.rest.paypal_ipn', return_value='{}')
+
+        process_paypal_ipn('112233')
+
+        assert mock_paypal_ipn.called
+        ipn = dao_get_paypal_ipn('112233')
+        assert ipn.status == PAYPAL_IPN_PROCESSED
+        assert ipn.attempts == 2
+
+    def it_acks_the_task_once_processed(self):
+        assert process_paypal_ipn.acks_late
+
+    def it_records_a_duplicate_ipn_as_processed(self, mocker, sample_paypal_ipn):
+        mocker.patch(
+            'app.routes.orders.rest.paypal_ipn',
+            return_value=('{"error": "Duplicate transaction 112233"}', 409)
+        )
+
+        process_paypal_ipn('112233')
+
+        ipn = dao_get_paypal_ipn('112233')
+        assert ipn.status == PAYPAL_IPN_PROCESSED
+        assert ipn.error == '{"error": "Duplicate transaction 112233"}'
+
+    def it_marks_the_ipn_failed_and_retries(self, mocker, sample_paypal_ipn):
+        mocker.patch('app.routes.orders.rest.paypal_ipn', side_effect=Exception('Storage error'))
+        mock_retry = mocker.patch.object(process_paypal_ipn, 'retry', return_value=Exception('Retry'))
+
+        with pytest.raises(Exception, match='Retry'):
+            process_paypal_ipn('112233')
+
+        ipn = dao_get_paypal_ipn('112233')
+        assert ipn.status == PAYPAL_IPN_FAILED
+        assert ipn.attempts == 1
+        assert ipn.error == 'Storage error'
+        assert mock_retry.call_args[1]['countdown'] == 60
+
+    def it_replaces_an_order_left_by_a_failed_attempt(self, mocker, sample_paypal_ipn, sample_order):
+        mocker.patch('app.na_celery.paypal_tasks.dao_get_order_with_txn_id', return_value=sample_order)
+        mock_paypal_ipn = mocker.patch('app.routes.orders.rest.paypal_ipn', side_effect=[Exception('Error'), '{}'])
+        mocker.patch.object(process_paypal_ipn, 'retry', return_value=Exception('Retry'))
+
+        with pytest.raises(Exception, match='Retry'):
+            process_paypal_ipn('112233')
+        process_paypal_ipn('112233')
+
+        assert mock_paypal_ipn.call_args_list[0][1]['replace_order'] is False
+        assert mock_paypal_ipn.call_args_list[1][1]['replace_order'] is True
+        assert dao_get_paypal_ipn('112233').status == PAYPAL_IPN_PROCESSED
+
+
+class WhenRequeuingPaypalIpns:
+
+    def it_requeues_ipns_left_by_a_worker_that_died(self, mocker, db_session):
+        stale = datetime.utcnow() - timedelta(seconds=601)
+        for txn_id, status, attempts, updated_at in [
+            ('stale_processing', PAYPAL_IPN_PROCESSING, 1, stale),
+            ('stale_queued', PAYPAL_IPN_QUEUED, 0, stale),
+            ('processing', PAYPAL_IPN_PROCESSING, 1, datetime.utcnow()),
+            ('processed', PAYPAL_IPN_PROCESSED, 1, stale),
+            ('failed_lost_retry', PAYPAL_IPN_FAILED, 1, datetime.utcnow() - timedelta(seconds=661)),
+            ('failed_retry_due', PAYPAL_IPN_FAILED, 3, datetime.utcnow() - timedelta(seconds=661)),
+            ('failed_no_attempts_left', PAYPAL_IPN_FAILED, 6, datetime.utcnow() - timedelta(days=1)),
+        ]:
+            dao_create_paypal_ipn(
+                PaypalIpn(txn_id=txn_id, params={}, status=status, attempts=attempts, updated_at=updated_at))
+        mock_apply_async = mocker.patch('app.na_celery.paypal_tasks.process_paypal_ipn.apply_async')
+
+        requeue_paypal_ipns()
+
+        assert sorted(c[0][0][0] for c in mock_apply_async.call_args_list) == [
+            'failed_lost_retry', 'stale_processing', 'stale_queued'
+        ]
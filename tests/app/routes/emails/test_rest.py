@@ -13,9 +13,10 @@ from bs4 import BeautifulSoup
 from flask import json, url_for
 
 from app.models import (
-    ANON_REMINDER, ANNOUNCEMENT, BASIC, EVENT, MAGAZINE, MANAGED_EMAIL_TYPES, APPROVED, READY, REJECTED, Email
+    ANON_REMINDER, ANNOUNCEMENT, BASIC, EVENT, MAGAZINE, MANAGED_EMAIL_TYPES, APPROVED, READY, REJECTED,
+    SEND_JOB_RUNNING, Email, EmailSendJob
 )
-from app.dao.emails_dao import dao_add_member_sent_to_email
+from app.dao.emails_dao import dao_add_member_sent_to_email, dao_create_email_send_job
 from tests.conftest import create_authorization_header, request, TEST_ADMIN_USER
 from tests.db import create_email, create_event, create_event_date, create_magazine, create_member
 
@@ -178,6 +179,43 @@ class WhenGettingApprovedEmails:
         assert json_latest_emails[0] == approved_email.serialize()
 
 
+class WhenGettingEmailProgress:
+    @freeze_time("2019-07-11T10:00:00")
+    def it_returns_the_email_send_job_progress(self, client, db_session, sample_email, sample_email_provider):
+        dao_create_email_send_job(EmailSendJob(
+            email_id=sample_email.id,
+            status=SEND_JOB_RUNNING,
+            total_members=40,
+            sent=9,
+            failed=1,
+            provider_usage={str(sample_email_provider.id): 10},
+            started_at=datetime(2019, 7, 11, 9, 0),
+            updated_at=datetime(2019, 7, 11, 10, 0),
+        ))
+
+        response = client.get(
+            url_for('emails.get_email_progress', email_id=sample_email.id),
+            headers=[('Content-Type', 'application/json'), create_authorization_header()]
+        )
+
+        assert response.status_code == 200
+        assert response.json['status'] == SEND_JOB_RUNNING
+        assert response.json['sent'] == 9
+        assert response.json['failed'] == 1
+        assert response.json['remaining'] == 30
+        assert response.json['provider_usage'] == {str(sample_email_provider.id): 10}
+        # 10 emails sent in an hour leaves 3 hours to send the remaining 30
+        assert response.json['eta'] == '2019-07-11 13:00:00'
+
+    def it_returns_404_if_email_has_not_started_sending(self, client, db_session, sample_email):
+        response = client.get(
+            url_for('emails.get_email_progress', email_id=sample_email.id),
+            headers=[('Content-Type', 'application/json'), create_authorization_header()]
+        )
+
+        assert response.status_code == 404
+
+
 class WhenPostingImportingEmails:
     def it_creates_emails_for_imported_emails(
         self, client, db_session, sample_old_emails, sample_event_with_dates
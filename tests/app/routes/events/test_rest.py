@@ -14,9 +14,14 @@ from sqlalchemy.orm.exc import NoResultFound
 
 from app.errors import PaypalException
 from app.models import Event, EventDate, RejectReason, ReservedPlace, APPROVED, DRAFT, READY, REJECTED
+from app.utils.queries import count_queries
+from app.utils.time import get_local_time
 
 from tests.conftest import create_authorization_header, sample_event_with_dates, TEST_ADMIN_USER
-from tests.db import create_event, create_event_date, create_event_type, create_speaker, DATA_MAP
+from tests.db import (
+    create_event, create_event_date, create_event_type, create_reject_reason, create_speaker, create_user,
+    create_venue, DATA_MAP
+)
 
 base64img = (
     'iVBORw0KGgoAAAANSUhEUgAAADgAAAAsCAYAAAAwwXuTAAAACXBIWXMAAAsTAAALEwEAmpwYAAAEMElEQVRoge2ZTUxcVRTH'
@@ -343,6 +348,58 @@ class WhenGettingEvents:
         assert data[0]['event_dates'][0]['event_datetime'] == str(event_date_earliest.event_datetime)[0:-3]
 
 
+class WhenBenchmarkingEventsQueries:
+
+    @pytest.fixture
+    def add_events(self, db_session, sample_event_type):
+        created_by = create_user(email='test_reject@example.com')
+        events = []
+
+        def add_events(num):
+            for _ in range(num):
+                i = len(events) + 1
+                speaker = create_speaker(name=f'Speaker {i}')
+                venue = create_venue(old_id=str(i), name=f'Venue {i}')
+                event = create_event(
+                    title=f'Event {i}',
+                    event_type_id=sample_event_type.id,
+                    venue_id=venue.id,
+                    event_dates=[
+                        create_event_date(event_datetime='2018-01-05 19:00', speakers=[speaker]),
+                        create_event_date(event_datetime='2018-01-25 19:00', speakers=[speaker]),
+                    ]
+                )
+                create_reject_reason(event.id, created_by=created_by)
+                events.append(event)
+
+        return add_events
+
+    @freeze_time("2018-01-10T19:00:00")
+    @pytest.mark.parametrize('endpoint,kwargs', [
+        ('events.get_events', {}),
+        ('events.get_events_in_year', {'year': 2018}),
+        ('events.get_limited_events', {'limit': 30}),
+        ('events.get_future_events', {}),
+        ('events.get_past_year_events', {}),
+    ])
+    def it_serializes_events_in_a_fixed_number_of_queries(self, client, db_session, add_events, endpoint, kwargs):
+        def get_query_count():
+            headers = [('Content-Type', 'application/json'), create_authorization_header()]
+            db_session.session.expunge_all()
+            with count_queries() as query_counter:
+                response = client.get(url_for(endpoint, **kwargs), headers=headers)
+            assert response.status_code == 200
+            return query_counter.count
+
+        add_events(1)
+        query_count = get_query_count()
+
+        add_events(4)
+
+        assert get_query_count() == query_count
+        assert query_count <= 8
+
+
 class WhenPostingExtractSpeakers:
 
     def it_extracts_unique_speakers_from_events_json(self, client, db_session, sample_data):
@@ -972,7 +1029,7 @@ class WhenPostingUpdatingAnEvent:
             'app.comms.email.current_app.config',
             self.mock_config
         )
-        self.mock_send_email = mocker.patch('app.comms.email.requests.post')
+        self.mock_send_email = mocker.patch('app.comms.email_sessions.requests.Session.post')
 
     @pytest.fixture
     def mock_storage(self, mocker):
@@ -1945,6 +2002,22 @@ class WhenGettingTicketsAndReservePlaces:
         assert len(response.json['tickets']) == 1
         assert response.json['tickets'][0]['event']['title'] == sample_order.tickets[0].event.title
 
+    def it_streams_the_tickets_for_an_event_date_as_csv(self, client, db_session, sample_order):
+        ticket = sample_order.tickets[0]
+
+        response = client.get(
+            url_for('events.export_tickets', eventdate_id=ticket.eventdate_id),
+            headers=[create_authorization_header()]
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert response.get_data(as_text=True).splitlines() == [
+            'ticket_number,name,ticket_type,price,status,txn_id,buyer_name,email_address,created_at',
+            ",,,,Unused,111222333,Test buyer,test@example.com,"
+            f"{get_local_time(ticket.created_at).strftime('%Y-%m-%d %H:%M')}",
+        ]
+
 
 class WhenTestingPaypal:
 
@@ -0,0 +1,83 @@
+from freezegun import freeze_time
+import pytest
+
+from app.dao.tickets_dao import dao_use_ticket
+from app.errors import InvalidRequest
+from app.models import Ticket, TICKET_STATUS_USED
+from app.routes.orders.check_in import check_in_roster, check_in_stats, check_in_ticket
+from app.utils.queries import count_queries
+
+from tests.db import create_ticket
+
+
+@pytest.fixture(autouse=True)
+def clear_check_in():
+    check_in_roster.clear()
+    check_in_stats.reset()
+
+
+@pytest.fixture
+def sample_ticket(db_session, sample_event_with_dates):
+    return create_ticket(
+        event_id=sample_event_with_dates.id,
+        old_id=1,
+        eventdate_id=sample_event_with_dates.get_sorted_event_dates()[0]['id']
+    )
+
+
+class WhenCheckingInTickets:
+
+    @freeze_time("2018-01-01T19:00:00")
+    def it_checks_in_a_ticket_from_the_roster(self, sample_ticket, sample_event_with_dates):
+        ticket_id = str(sample_ticket.id)
+        assert check_in_roster.load() == 1
+
+        with count_queries() as query_counter:
+            assert check_in_ticket(ticket_id, use_roster=True) == ('checked_in', sample_event_with_dates.title)
+            assert check_in_ticket('1', use_roster=True) == ('already_used', sample_event_with_dates.title)
+        assert query_counter.count == 1
+
+        assert Ticket.query.get(ticket_id).status == TICKET_STATUS_USED
+        stats = check_in_stats.get_stats()
+        assert stats['scans'] == 2
+        assert stats['roster_hits'] == 2
+        assert stats['checked_in'] == 1
+        assert stats['already_used'] == 1
+
+    @freeze_time("2018-01-01T19:00:00")
+    def it_checks_in_a_ticket_added_after_the_roster_loaded(self, db_session, sample_event_with_dates):
+        check_in_roster.load()
+        ticket = create_ticket(
+            event_id=sample_event_with_dates.id,
+            eventdate_id=sample_event_with_dates.get_sorted_event_dates()[0]['id']
+        )
+
+        assert check_in_ticket(str(ticket.id), use_roster=True)[0] == 'checked_in'
+        assert check_in_roster.get(str(ticket.id))['used']
+
+    @freeze_time("2018-01-01T19:00:00")
+    def it_does_not_use_a_ticket_used_by_another_worker(self, sample_ticket):
+        check_in_roster.load()
+        dao_use_ticket(str(sample_ticket.id))
+
+        assert check_in_ticket(str(sample_ticket.id), use_roster=True)[0] == 'already_used'
+
+    @freeze_time("2018-01-02T19:00:00")
+    def it_does_not_check_in_a_ticket_not_for_today(self, sample_ticket):
+        assert check_in_ticket(str(sample_ticket.id), use_roster=True)[0] == 'not_today'
+        assert check_in_stats.get_stats()['not_today'] == 1
+
+    def it_raises_404_for_an_unknown_ticket(self, db_session, sample_uuid):
+        with pytest.raises(InvalidRequest) as e:
+            check_in_ticket(sample_uuid)
+
+        assert e.value.status_code == 404
+        assert check_in_stats.get_stats()['not_found'] == 1
+
+
+class WhenUsingTickets:
+
+    def it_uses_a_ticket_once(self, sample_ticket):
+        assert dao_use_ticket(str(sample_ticket.id))
+        assert not dao_use_ticket(str(sample_ticket.id))
+        assert not dao_use_ticket('1')
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy.orm.exc import NoResultFound
+
+from app.routes.orders.ipn_lookups import IpnLookups
+from app.utils.queries import count_queries
+
+from tests.db import create_order
+
+
+@pytest.fixture
+def ipns(sample_event_with_dates, sample_book):
+    return [
+        {
+            'txn_id': '112233',
+            'item_number1': str(sample_event_with_dates.id),
+            'item_number2': f'book-{sample_book.id}',
+            'item_number3': 'delivery',
+        },
+        {
+            'txn_id': '112244',
+            'custom': '112233',
+            'item_number1': f'book-{sample_book.old_id}',
+        },
+    ]
+
+
+class WhenUsingIpnLookups:
+
+    def it_prefetches_everything_the_ipns_refer_to(self, db_session, ipns, sample_event_with_dates, sample_book):
+        order_id = create_order(txn_id='112233').id
+        event_id = sample_event_with_dates.id
+        event_date_id = sample_event_with_dates.event_dates[0].id
+        book_id, book_old_id = sample_book.id, sample_book.old_id
+        db_session.session.expunge_all()
+
+        lookups = IpnLookups()
+        with count_queries() as query_counter:
+            lookups.prefetch(ipns)
+        assert query_counter.count == 5
+
+        with count_queries() as query_counter:
+            assert lookups.get_order('112233').id == order_id
+            assert lookups.get_order('112244') is None
+            assert lookups.get_event(event_id).id == event_id
+            assert lookups.get_event_date(event_date_id).id == event_date_id
+            assert lookups.get_book(str(book_id)).id == book_id
+            assert lookups.get_book(str(book_old_id)).id == book_id
+        assert query_counter.count == 0
+
+    def it_looks_up_anything_not_prefetched(self, db_session, sample_event_with_dates, sample_book):
+        lookups = IpnLookups()
+
+        assert lookups.get_event(sample_event_with_dates.id) == sample_event_with_dates
+        assert lookups.get_book(str(sample_book.id)) == sample_book
+        assert lookups.get_order('112233') is None
+
+    def it_raises_no_result_found_for_a_missing_event(self, db_session, sample_uuid):
+        with pytest.raises(NoResultFound):
+            IpnLookups().get_event(sample_uuid)
+
+    def it_forgets_an_order(self, db_session):
+        lookups = IpnLookups()
+        lookups.prefetch([{'txn_id': '112233'}])
+        order = create_order(txn_id='112233')
+
+        lookups.forget_order('112233')
+
+        assert lookups.get_order('112233') == order
+
+    def it_keeps_cached_objects_loaded_after_commit(self, db_session, sample_event_with_dates):
+        with IpnLookups() as lookups:
+            event = lookups.get_event(sample_event_with_dates.id)
+            create_order()
+
+            with count_queries() as query_counter:
+                assert event.title == sample_event_with_dates.title
+            assert query_counter.count == 0
+
+        assert db_session.session().expire_on_commit
@@ -1,6 +1,7 @@
 import werkzeug
 werkzeug.cached_property = werkzeug.utils.cached_property
 
+from datetime import datetime, timedelta
 from flask import current_app, url_for
 from freezegun import freeze_time
 import json
@@ -9,10 +10,19 @@ import requests_mock
 from mock import call
 from urllib.parse import parse_qs
 
+from app.dao import dao_update_record
+from app.dao.books_dao import dao_update_book, dao_update_book_to_order_quantity
 from app.dao.events_dao import dao_get_event_by_id
-from app.dao.orders_dao import dao_get_orders
+from app.dao.orders_dao import (
+    dao_create_paypal_ipn, dao_get_orders, dao_get_orders_revenue_report, dao_get_paypal_ipn
+)
 from app.dao.tickets_dao import dao_get_tickets_for_order
-from app.models import Order, OrderError, Ticket, TICKET_STATUS_USED, TICKET_STATUS_UNUSED
+from app.models import (
+    Order, OrderError, OrderReportMonth, PaypalIpn, Ticket,
+    PAYPAL_IPN_FAILED, PAYPAL_IPN_QUEUED, TICKET_STATUS_USED, TICKET_STATUS_UNUSED
+)
+from app.routes.orders.rest import get_ipn_data, parse_ipn
+from app.utils.queries import count_queries
 from na_common.delivery import statuses as delivery_statuses
 from tests.conftest import create_authorization_header
 from tests.db import create_ticket, create_order
@@ -442,6 +452,67 @@ class WhenHandlingPaypalIPN:
                 assert 'http://test/images/qr_codes/{}'.format(
                     str(tickets[n].id)) in mock_send_email.call_args_list[i][0][2]
 
+    def it_queues_the_ipn_when_async(self, mocker, client, db_session, sample_event_with_dates):
+        mocker.patch.dict('app.application.config', {'PAYPAL_IPN_ASYNC': True})
+        mock_process_paypal_ipn = mocker.patch(
+            'app.routes.orders.rest.paypal_tasks.process_paypal_ipn.apply_async')
+
+        _sample_ipn = sample_ipns[0].format(id=sample_event_with_dates.id, txn_id='112233', txn_type='cart')
+
+        for _ in range(2):
+            response = client.post(
+                url_for('orders.paypal_ipn'),
+                data=_sample_ipn,
+                content_type="application/x-www-form-urlencoded"
+            )
+
+        assert response.status_code == 200
+        assert json.loads(response.get_data(as_text=True)) == {'message': 'IPN already queued'}
+        assert mock_process_paypal_ipn.call_args_list == [call(('112233',))]
+        assert dao_get_orders() == []
+
+        ipn = dao_get_paypal_ipn('112233')
+        assert ipn.status == PAYPAL_IPN_QUEUED
+        assert ipn.params['txn_id'] == ['112233']
+
+    def it_requeues_a_failed_ipn_when_async(self, mocker, client, db_session, sample_event_with_dates):
+        mocker.patch.dict('app.application.config', {'PAYPAL_IPN_ASYNC': True})
+        mock_process_paypal_ipn = mocker.patch(
+            'app.routes.orders.rest.paypal_tasks.process_paypal_ipn.apply_async')
+
+        _sample_ipn = sample_ipns[0].format(id=sample_event_with_dates.id, txn_id='112233', txn_type='cart')
+        dao_create_paypal_ipn(PaypalIpn(txn_id='112233', params=parse_qs(_sample_ipn), status=PAYPAL_IPN_FAILED))
+
+        response = client.post(
+            url_for('orders.paypal_ipn'),
+            data=_sample_ipn,
+            content_type="application/x-www-form-urlencoded"
+        )
+
+        assert json.loads(response.get_data(as_text=True)) == {'message': 'IPN queued'}
+        assert mock_process_paypal_ipn.call_args_list == [call(('112233',))]
+
+    def it_requeues_an_ipn_left_queued_by_a_worker_that_died(
+        self, mocker, client, db_session, sample_event_with_dates
+    ):
+        mocker.patch.dict('app.application.config', {'PAYPAL_IPN_ASYNC': True})
+        mock_process_paypal_ipn = mocker.patch(
+            'app.routes.orders.rest.paypal_tasks.process_paypal_ipn.apply_async')
+
+        _sample_ipn = sample_ipns[0].format(id=sample_event_with_dates.id, txn_id='112233', txn_type='cart')
+        dao_create_paypal_ipn(PaypalIpn(
+            txn_id='112233', params=parse_qs(_sample_ipn), updated_at=datetime.utcnow() - timedelta(seconds=601)
+        ))
+
+        response = client.post(
+            url_for('orders.paypal_ipn'),
+            data=_sample_ipn,
+            content_type="application/x-www-form-urlencoded"
+        )
+
+        assert json.loads(response.get_data(as_text=True)) == {'message': 'IPN queued'}
+        assert mock_process_paypal_ipn.call_args_list == [call(('112233',))]
+
     def it_creates_an_order_with_email_confirmation(
         self, mocker, client, db_session, sample_event_with_dates, sample_email_provider
     ):
@@ -1761,6 +1832,166 @@ class WhenHandlingPaypalIPN:
         assert len(tickets) == 1
 
 
+class WhenParsingIpn:
+    def it_resolves_the_items_with_one_query_per_type(self, app, db_session, sample_event_with_dates):
+        ipn = get_ipn_data(parse_qs(
+            sample_ipns[1].format(id=sample_event_with_dates.id, txn_id='112233', txn_type='cart'),
+            keep_blank_values=True
+        ))
+        db_session.session.expunge_all()
+
+        with count_queries() as query_counter:
+            order_data, tickets, events, products, delivery_zones, errors = parse_ipn(ipn)
+
+        # orders, events and event dates
+        assert query_counter.count == 3
+        assert len(tickets) == 2
+        assert errors == []
+
+    def it_resolves_books_and_events_in_one_cart(self, app, db_session, sample_event_with_dates, sample_book):
+        ipn = get_ipn_data(parse_qs(
+            sample_book_order_ipn.format(
+                book_id=f'book-{sample_book.id}',
+                payer_email="payer@example.com",
+                delivery_id=app.config['DELIVERY_ID'],
+                delivery_zone='UK',
+                country_code='GB'
+            ),
+            keep_blank_values=True
+        ))
+        ipn.update(
+            item_number3=str(sample_event_with_dates.id), quantity3='1', mc_gross_3='5.00', option_selection1_3='Full'
+        )
+        db_session.session.expunge_all()
+
+        with count_queries() as query_counter:
+            order_data, tickets, events, products, delivery_zones, errors = parse_ipn(ipn)
+
+        # orders, events, event dates and books
+        assert query_counter.count == 4
+        assert len(products) == 1
+        assert len(tickets) == 1
+        assert delivery_zones == ['UK']
+
+
+class WhenReplayingPaypalIpns:
+    @pytest.fixture
+    def replay_orders(self, db_session, sample_event_with_dates):
+        orders = []
+        for i, txn_id in enumerate(['112233', '112244']):
+            _sample_ipn = sample_ipns[i].format(id=sample_event_with_dates.id, txn_id=txn_id, txn_type='cart')
+            orders.append(
+                create_order(
+                    old_id=i, txn_id=txn_id, created_at=f'2022-11-2{i} 10:00',
+                    params=json.dumps(parse_qs(_sample_ipn))
+                )
+            )
+        return orders
+
+    def it_replays_ipns_for_txn_ids(self, mocker, client, replay_orders):
+        mocker.patch('app.routes.orders.rest.Storage')
+        mock_send_email = mocker.patch('app.routes.orders.rest.send_email', return_value=(200, None))
+        create_order(old_id=3, txn_id='112255', params='not json')
+
+        response = client.post(
+            url_for('orders.bulk_replay_paypal_ipns'),
+            data=json.dumps({'txn_ids': ['112233', '112244', '112255', '112266'], 'replace_order': True}),
+            headers=[('Content-Type', 'application/json'), create_authorization_header()]
+        )
+
+        assert response.json == [
+            {'txn_id': '112233', 'status': 'replayed'},
+            {'txn_id': '112244', 'status': 'replayed'},
+            {'txn_id': '112255', 'status': 'error', 'message': 'No paypal parameters'},
+            {'txn_id': '112266', 'status': 'not_found'},
+        ]
+        assert not mock_send_email.called
+
+        orders = sorted(dao_get_orders(), key=lambda o: o.txn_id)
+        assert [o.txn_id for o in orders] == ['112233', '112244', '112255']
+        assert [len(o.tickets) for o in orders] == [1, 2, 0]
+
+    def it_replays_ipns_for_a_date_range(self, mocker, client, replay_orders):
+        response = client.post(
+            url_for('orders.bulk_replay_paypal_ipns'),
+            data=json.dumps({'start_date': '2022-11-21', 'end_date': '2022-11-22'}),
+            headers=[('Content-Type', 'application/json'), create_authorization_header()]
+        )
+
+        assert response.json == [
+            {'txn_id': '112244', 'status': 'duplicate', 'message': 'Duplicate transaction 112244'}
+        ]
+
+    def it_replays_confirmation_emails(self, mocker, client, replay_orders, sample_email_provider):
+        mocker.patch('app.routes.orders.rest.Storage')
+        mock_send_email = mocker.patch(
+            'app.routes.orders.rest.send_email', return_value=('200', sample_email_provider.id))
+
+        response = client.post(
+            url_for('orders.bulk_replay_paypal_ipns'),
+            data=json.dumps({'txn_ids': ['112233'], 'email_only': True}),
+            headers=[('Content-Type', 'application/json'), create_authorization_header()]
+        )
+
+        assert response.json[0]['txn_id'] == '112233'
+        assert response.json[0]['status'] == 'email_sent'
+        assert response.json[0]['email_status'] == '200'
+        assert mock_send_email.call_count == 1
+
+    def it_reports_an_error_and_replays_the_other_orders(self, mocker, client, replay_orders):
+        mocker.patch('app.routes.orders.rest.Storage')
+        mocker.patch('app.routes.orders.rest.send_email', side_effect=[Exception('Email error'), (200, None)])
+
+        response = client.post(
+            url_for('orders.bulk_replay_paypal_ipns'),
+            data=json.dumps({'txn_ids': ['112233', '112244'], 'replace_order': True, 'allow_emails': True}),
+            headers=[('Content-Type', 'application/json'), create_authorization_header()]
+        )
+
+        assert response.json == [
+            {'txn_id': '112233', 'status': 'error', 'message': 'Email error'},
+            {'txn_id': '112244', 'status': 'replayed'},
+        ]
+
+    def it_raises_an_error_without_txn_ids_or_dates(self, client, db_session):
+        response = client.post(
+            url_for('orders.bulk_replay_paypal_ipns'),
+            data=json.dumps({'start_date': '2022-11-21'}),
+            headers=[('Content-Type', 'application/json'), create_authorization_header()]
+        )
+
+        assert response.status_code == 400
+
+
+class WhenGettingPaypalIpnStatus:
+    @freeze_time("2022-11-24T09:00:00")
+    def it_returns_the_ipn_status(self, client, db_session):
+        dao_create_paypal_ipn(PaypalIpn(txn_id='112233', params={}, attempts=1, status=PAYPAL_IPN_FAILED, error='Err'))
+
+        response = client.get(
+            url_for('orders.get_paypal_ipn_status', txn_id='112233'),
+            headers=[create_authorization_header()]
+        )
+
+        assert response.json == {
+            'txn_id': '112233',
+            'status': PAYPAL_IPN_FAILED,
+            'attempts': 1,
+            'error': 'Err',
+            'created_at': '2022-11-24 09:00:00',
+            'updated_at': '2022-11-24 09:00:00',
+            'processed_at': None
+        }
+
+    def it_returns_404_if_no_ipn(self, client, db_session):
+        response = client.get(
+            url_for('orders.get_paypal_ipn_status', txn_id='112233'),
+            headers=[create_authorization_header()]
+        )
+
+        assert response.status_code == 404
+
+
 class WhenProcessingTicket:
 
     @pytest.fixture(scope='function')
@@ -1831,6 +2062,43 @@ class WhenProcessingTicket:
             'update_response': 'Ticket already used'
         }
 
+    @freeze_time("2018-01-01T19:00:00")
+    def it_updates_ticket_to_used_from_the_check_in_roster(self, mocker, client, sample_ticket):
+        mocker.patch.dict('app.application.config', {'CHECK_IN_ROSTER': True})
+        mocker.patch('app.routes.orders.check_in.check_in_roster.date', None)
+
+        response = client.post(
+            url_for('orders.load_check_in_roster'),
+            headers=[create_authorization_header()]
+        )
+        assert response.json == {'tickets': 1}
+
+        responses = [
+            client.get(url_for('orders.use_ticket', ticket_id=sample_ticket.id)).json['update_response']
+            for _ in range(2)
+        ]
+
+        assert responses == ['Ticket updated to used', 'Ticket already used']
+        assert sample_ticket.status == TICKET_STATUS_USED
+
+    def it_returns_404_for_an_unknown_ticket(self, client, db_session, sample_uuid):
+        response = client.get(url_for('orders.use_ticket', ticket_id=sample_uuid))
+
+        assert response.status_code == 404
+
+    def it_gets_the_check_in_stats(self, mocker, client, sample_ticket):
+        mocker.patch('app.routes.orders.check_in.check_in_stats.counts', {
+            'checked_in': 3, 'already_used': 1, 'not_today': 0, 'not_found': 0
+        })
+
+        response = client.get(
+            url_for('orders.get_check_in_stats'),
+            headers=[create_authorization_header()]
+        )
+
+        assert response.json['scans'] == 4
+        assert response.json['checked_in'] == 3
+
 
 class WhenGettingOrders:
     def it_will_return_latest_orders(self, client, db_session, sample_order):
@@ -1901,6 +2169,203 @@ class WhenGettingOrders:
         assert response.json[0]['txn_id'] == sample_order.txn_id
 
 
+class WhenGettingAPageOfOrders:
+    @pytest.fixture
+    def orders(self, db_session):
+        return [
+            create_order(
+                old_id=i,
+                txn_id=f'112233{i}',
+                created_at=f'2021-06-0{i} 12:00',
+                delivery_status='completed' if i % 2 else 'extra',
+                is_donation=i == 4
+            ) for i in range(1, 6)
+        ]
+
+    def get_orders_page(self, client, **kwargs):
+        return client.get(url_for('orders.get_orders_page', **kwargs), headers=[create_authorization_header()])
+
+    def it_pages_through_the_orders_newest_first(self, client, orders):
+        response = self.get_orders_page(client, limit=2)
+
+        assert [o['txn_id'] for o in response.json['orders']] == ['1122335', '1122334']
+        assert response.json['orders'][0]['books'] == []
+
+        response = self.get_orders_page(client, limit=2, cursor=response.json['next_cursor'])
+
+        assert [o['txn_id'] for o in response.json['orders']] == ['1122333', '1122332']
+
+        response = self.get_orders_page(client, limit=2, cursor=response.json['next_cursor'])
+
+        assert [o['txn_id'] for o in response.json['orders']] == ['1122331']
+        assert response.json['next_cursor'] is None
+
+    def it_filters_the_orders(self, client, orders):
+        response = self.get_orders_page(
+            client,
+            delivery_status='completed',
+            start_date='2021-06-02',
+            end_date='2021-06-05'
+        )
+
+        assert [o['txn_id'] for o in response.json['orders']] == ['1122333']
+
+        response = self.get_orders_page(client, is_donation='true')
+
+        assert [o['txn_id'] for o in response.json['orders']] == ['1122334']
+
+    def it_returns_short_orders_with_linked_transactions(self, client, orders):
+        create_order(old_id=6, txn_id='2233445566', created_at='2021-06-06 12:00', linked_txn_id=orders[0].txn_id)
+        create_order(old_id=7, txn_id='XX-INVALID_1637667646-112233', created_at='2021-06-07 12:00')
+
+        response = self.get_orders_page(client, short='true')
+
+        assert [o['txn_id'] for o in response.json['orders']] == ['1122335', '1122334', '1122333', '1122332', '1122331']
+        assert 'books' not in response.json['orders'][0]
+        assert [o['txn_id'] for o in response.json['orders'][-1]['linked_transactions']] == ['2233445566']
+
+    @pytest.mark.parametrize('args', [
+        {'limit': 0},
+        {'limit': 201},
+        {'limit': 'a'},
+        {'cursor': 'invalid'},
+        {'start_date': '01/06/2021'},
+        {'is_donation': 'yes'},
+    ])
+    def it_raises_an_error_for_invalid_args(self, client, db_session, args):
+        response = self.get_orders_page(client, **args)
+
+        assert response.status_code == 400
+
+    def it_requires_authorization(self, client, orders):
+        response = client.get(url_for('orders.get_orders_page'))
+
+        assert response.status_code == 401
+
+
+class WhenGettingOrdersReport:
+
+    @pytest.fixture
+    def report_orders(self, db_session):
+        create_order(created_at='2021-01-10 12:00', txn_id='order_1', payment_status='Completed', payment_total=10)
+        create_order(created_at='2021-02-10 12:00', txn_id='order_2', payment_status='Completed', payment_total=20)
+        create_order(created_at='2021-03-10 12:00', txn_id='order_3', payment_status='Completed', payment_total=5)
+        create_order(
+            created_at='2021-03-11 12:00', txn_id='order_4', payment_status='Completed',
+            delivery_status=delivery_statuses.DELIVERY_EXTRA, delivery_balance=3
+        )
+
+    def it_gets_the_orders_report_for_a_year(self, client, db_session, report_orders):
+        response = client.get(
+            url_for('orders.get_orders_report', year=2021),
+            headers=[create_authorization_header()]
+        )
+
+        assert response.status_code == 200
+        assert response.json['start_date'] == '2021-01-01'
+        assert response.json['end_date'] == '2022-01-01'
+        assert [m['month'] for m in response.json['months']] == ['2021-01', '2021-02', '2021-03']
+        assert response.json['total'] == {'orders': 4, 'revenue': '45.00'}
+        assert response.json['outstanding_delivery'] == {'orders': 1, 'balance': '3.00'}
+
+    def it_gets_the_orders_report_between_dates(self, client, db_session, report_orders):
+        response = client.get(
+            url_for('orders.get_orders_report', start_date='2021-02-01', end_date='2021-03-11'),
+            headers=[create_authorization_header()]
+        )
+
+        assert response.status_code == 200
+        assert response.json['months'] == [
+            {'month': '2021-02', 'orders': 1, 'revenue': '20.00'},
+            {'month': '2021-03', 'orders': 1, 'revenue': '5.00'},
+        ]
+        assert response.json['total'] == {'orders': 2, 'revenue': '25.00'}
+
+    @freeze_time("2021-03-15T12:00:00")
+    def it_caches_the_report_for_closed_months(self, client, mocker, db_session, report_orders):
+        mocker.patch.dict('app.application.config', {'ORDERS_REPORT_CACHE': True})
+
+        def get_report():
+            return client.get(
+                url_for('orders.get_orders_report', year=2021),
+                headers=[create_authorization_header()]
+            ).json
+
+        report = get_report()
+
+        assert sorted(m.month for m in OrderReportMonth.query.all()) == ['2021-01', '2021-02']
+        assert report['total'] == {'orders': 4, 'revenue': '45.00'}
+
+        # closed months are read from the cache, the current month is still computed
+        mock_revenue_report = mocker.patch(
+            'app.routes.orders.report.dao_get_orders_revenue_report', wraps=dao_get_orders_revenue_report)
+        assert get_report() == report
+        assert [c[0][0] for c in mock_revenue_report.call_args_list] == [datetime(2021, 3, 1)]
+
+        # a closed month is computed again once its orders change
+        mock_revenue_report.reset_mock()
+        create_order(created_at='2021-01-20 12:00', txn_id='order_5', payment_status='Completed', payment_total=7)
+        create_order(created_at='2021-03-12 12:00', txn_id='order_6', payment_status='Completed', payment_total=8)
+        order_2 = Order.query.filter_by(txn_id='order_2').one()
+        dao_update_record(Order, order_2.id, payment_total=25)
+
+        assert get_report()['total'] == {'orders': 6, 'revenue': '65.00'}
+        assert [c[0][0] for c in mock_revenue_report.call_args_list] == [
+            datetime(2021, 1, 1), datetime(2021, 2, 1), datetime(2021, 3, 1)
+        ]
+
+    @freeze_time("2021-03-15T12:00:00")
+    def it_recomputes_a_cached_month_when_a_book_quantity_changes(self, client, mocker, db_session, sample_book):
+        mocker.patch.dict('app.application.config', {'ORDERS_REPORT_CACHE': True})
+        order = create_order(
+            created_at='2021-01-10 12:00', txn_id='order_1', payment_status='Completed', books=[sample_book])
+
+        def get_report():
+            return client.get(
+                url_for('orders.get_orders_report', year=2021),
+                headers=[create_authorization_header()]
+            ).json
+
+        assert get_report()['books'][0]['quantity'] == 1
+
+        with freeze_time("2021-03-15T12:01:00"):
+            dao_update_book_to_order_quantity(sample_book.id, order.id, 3)
+            dao_update_book(sample_book.id, title='The Spirits of Nature, 2nd edition')
+
+            report = get_report()
+
+        assert report['books'] == [
+            {'book_id': str(sample_book.id), 'title': 'The Spirits of Nature, 2nd edition', 'quantity': 3}
+        ]
+
+
+class WhenExportingOrders:
+
+    def it_streams_the_orders_as_csv(self, client, db_session, sample_order):
+        create_order(created_at='2021-06-01 12:00', txn_id='112233', buyer_name='Mrs Green', payment_total=12.5)
+        create_order(created_at='2020-06-01 12:00', txn_id='112244')
+
+        response = client.get(
+            url_for('orders.export_orders', start_date='2021-01-01', end_date='2022-01-01'),
+            headers=[create_authorization_header()]
+        )
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        lines = response.get_data(as_text=True).splitlines()
+        assert lines[0].startswith('created_at,txn_id,linked_txn_id,')
+        assert lines[0].endswith(',tickets,books')
+        assert len(lines) == 2
+        assert '112233' in lines[1]
+        assert 'Mrs Green,test@example.com,,12.50' in lines[1]
+
+    def it_exports_the_tickets_and_books_of_an_order(self, client, db_session, sample_order):
+        response = client.get(url_for('orders.export_orders'), headers=[create_authorization_header()])
+
+        lines = response.get_data(as_text=True).splitlines()
+        assert lines[1].endswith(f',{sample_order.tickets[0].event.title} - ,Alchemist x 1')
+
+
 class WhenGettingAnOrder:
     def it_will_the_order_using_txn_id(self, client, db_session, sample_order):
         create_order()  # another order
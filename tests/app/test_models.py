@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from freezegun import freeze_time
 
 from app.dao import dao_create_record
@@ -8,6 +10,7 @@ from tests.db import (
     create_book,
     create_event,
     create_email,
+    create_event_date,
     create_fee,
     create_member,
     create_order,
@@ -23,6 +26,32 @@ class WhenUsingEventModel(object):
 
         assert str(event) == '<Event: id {}>'.format(event.id)
 
+    def it_keeps_the_sorted_event_dates_until_they_change(self, db_session, sample_event_with_dates):
+        event = sample_event_with_dates
+        assert event.get_first_event_date() == '2018-01-01'
+        assert event.get_last_event_date() == '2018-01-02'
+        assert event.sorted_event_dates is event.sorted_event_dates
+
+        event.event_dates.append(create_event_date(event_datetime='2017-12-25 19:00'))
+        assert event.get_first_event_date() == '2017-12-25'
+
+        event.event_dates[0].event_datetime = datetime(2018, 2, 1, 19, 0)
+        assert event.get_last_event_date() == '2018-02-01'
+
+        event.event_dates = [create_event_date(event_datetime='2019-01-01 19:00')]
+        assert [e['event_datetime'] for e in event.get_sorted_event_dates()] == ['2019-01-01 19:00']
+
+    @freeze_time("2018-01-02T10:00:00")
+    def it_shows_event_has_not_expired_on_its_last_date(self, db_session, sample_event_with_dates):
+        json_event = sample_event_with_dates.serialize()
+
+        assert not json_event['has_expired']
+        assert [e['event_datetime'] for e in json_event['event_dates']] == ['2018-01-01 19:00', '2018-01-02 19:00']
+
+    @freeze_time("2018-01-03T10:00:00")
+    def it_shows_event_has_expired_after_its_last_date(self, db_session, sample_event_with_dates):
+        assert sample_event_with_dates.serialize()['has_expired']
+
 
 class WhenUsingFeeModel(object):
 
@@ -43,5 +43,7 @@ class WhenAccessingSiteInfo(object):
         assert response.status_code == 200
         assert response.json == {
             'environment': 'test',
-            'commit': app.config['GITHUB_SHA']
+            'commit': app.config['GITHUB_SHA'],
+            'stats': {'queued': 0, 'sent': 0, 'dropped': 0, 'failed': 0},
+            'response_cache': {'hits': 0, 'misses': 0, 'invalidations': 0, 'errors': 0, 'size': 0}
         }
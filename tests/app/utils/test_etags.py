@@ -0,0 +1,103 @@
+from flask import url_for
+from freezegun import freeze_time
+import pytest
+
+from app.dao import dao_update_record
+from app.dao.collection_versions_dao import dao_get_collection_versions, dao_increment_collection_versions
+from app.dao.speakers_dao import dao_update_speaker
+from app.models import Member, Speaker
+
+from tests.conftest import create_authorization_header
+
+
+@pytest.fixture(autouse=True)
+def etags_enabled(mocker):
+    mocker.patch.dict('app.application.config', {'ETAGS': True})
+
+
+def get_speakers(client, etag=None):
+    headers = [create_authorization_header()]
+    if etag:
+        headers.append(('If-None-Match', f'"{etag}"'))
+    return client.get(url_for('speakers.get_speakers'), headers=headers)
+
+
+class WhenUsingEtags:
+
+    def it_returns_not_modified_without_calling_the_view(self, mocker, client, db_session, sample_speaker):
+        etag = get_speakers(client).get_etag()[0]
+        mock_get_speakers = mocker.patch('app.routes.speakers.rest.dao_get_speakers')
+
+        response = get_speakers(client, etag)
+
+        assert response.status_code == 304
+        assert response.get_etag()[0] == etag
+        assert not response.get_data()
+        assert not mock_get_speakers.called
+
+    def it_returns_the_response_once_the_table_is_written_to(self, client, db_session, sample_speaker):
+        etag = get_speakers(client).get_etag()[0]
+
+        dao_update_speaker(sample_speaker.id, name='Mrs Blue')
+        response = get_speakers(client, etag)
+
+        assert response.status_code == 200
+        assert response.json[0]['name'] == 'Mrs Blue'
+        assert response.get_etag()[0] != etag
+
+    def it_changes_the_etag_each_day(self, client, db_session, sample_speaker):
+        with freeze_time('2021-01-01T10:00:00'):
+            etag = get_speakers(client).get_etag()[0]
+
+        with freeze_time('2021-01-02T10:00:00'):
+            assert get_speakers(client, etag).status_code == 200
+
+    def it_changes_the_etag_of_timed_lists_during_the_day(self, client, db_session, sample_event_with_dates):
+        with freeze_time('2021-01-01T10:00:00'):
+            etag = client.get(
+                url_for('events.get_future_events'), headers=[create_authorization_header()]
+            ).get_etag()[0]
+
+        with freeze_time('2021-01-01T10:04:00'):
+            response = client.get(
+                url_for('events.get_future_events'),
+                headers=[create_authorization_header(), ('If-None-Match', f'"{etag}"')]
+            )
+            assert response.status_code == 304
+
+        with freeze_time('2021-01-01T10:05:00'):
+            response = client.get(
+                url_for('events.get_future_events'),
+                headers=[create_authorization_header(), ('If-None-Match', f'"{etag}"')]
+            )
+            assert response.status_code == 200
+
+    def it_does_not_set_an_etag_when_disabled(self, mocker, client, db_session, sample_speaker):
+        mocker.patch.dict('app.application.config', {'ETAGS': False})
+
+        assert get_speakers(client).get_etag() == (None, None)
+
+
+class WhenUsingCollectionVersionsDao:
+
+    def it_increments_collection_versions(self, db_session):
+        assert dao_get_collection_versions(['speakers', 'venues']) == [0, 0]
+
+        dao_increment_collection_versions(['speakers'])
+        dao_increment_collection_versions(['speakers', 'venues'])
+
+        assert dao_get_collection_versions(['speakers', 'venues']) == [2, 1]
+
+    def it_only_versions_the_tables_read_by_responses(self, mocker, db_session, sample_speaker, sample_member):
+        mocker.patch.dict('app.application.config', {'RESPONSE_CACHE': True})
+        mock_invalidate = mocker.patch('app.dao.invalidation.response_cache.invalidate')
+
+        dao_update_record(Member, sample_member.id, name='Sue Blue')
+
+        assert dao_get_collection_versions(['members']) == [0]
+        assert not mock_invalidate.called
+
+        dao_update_record(Speaker, sample_speaker.id, name='Mrs Blue')
+
+        assert dao_get_collection_versions(['speakers']) == [1]
+        mock_invalidate.assert_called_once_with('speakers')
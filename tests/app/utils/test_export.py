@@ -0,0 +1,35 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from app.utils.export import stream_csv
+
+
+class WhenStreamingCsv:
+
+    def it_yields_a_line_per_row(self):
+        rows = iter([
+            ('112233', Decimal('10.50'), datetime(2021, 6, 1, 12, 0), None),
+            ('112244', Decimal('5.00'), None, 'Test, "quoted"'),
+        ])
+
+        lines = list(stream_csv(['txn_id', 'total', 'created_at', 'notes'], rows))
+
+        assert lines == [
+            'txn_id,total,created_at,notes\r\n',
+            '112233,10.50,2021-06-01 13:00,\r\n',
+            '112244,5.00,,"Test, ""quoted"""\r\n',
+        ]
+
+    @pytest.mark.parametrize('value,expected', [
+        ('=HYPERLINK("http://test")', '"\'=HYPERLINK(""http://test"")"'),
+        ('+441234', "'+441234"),
+        ('-1+1', "'-1+1"),
+        ('@SUM(A1)', "'@SUM(A1)"),
+        ('Mr Test', 'Mr Test'),
+    ])
+    def it_escapes_values_that_would_run_as_formulas(self, value, expected):
+        lines = list(stream_csv(['name'], iter([(value,)])))
+
+        assert lines[1] == expected + '\r\n'
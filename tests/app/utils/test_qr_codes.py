@@ -0,0 +1,25 @@
+from mock import Mock
+import pytest
+
+from app.utils.qr_codes import create_qr_code_png, upload_qr_codes
+
+
+class WhenUploadingQrCodes:
+
+    def it_creates_a_png(self):
+        assert create_qr_code_png('http://test/orders/ticket/1').startswith(b'\x89PNG')
+
+    @pytest.mark.parametrize('workers', [1, 4])
+    def it_uploads_a_qr_code_png_for_each_ticket(self, app, mocker, workers):
+        mocker.patch.dict('app.application.config', {'QR_CODE_WORKERS': workers})
+        mock_storage = Mock()
+        ticket_links = {f'ticket_{i}': f'http://test/orders/ticket/ticket_{i}' for i in range(3)}
+
+        upload_qr_codes(mock_storage, ticket_links)
+
+        assert sorted(c[0][0] for c in mock_storage.upload_blob_from_bytes.call_args_list) == [
+            'qr_codes/ticket_0', 'qr_codes/ticket_1', 'qr_codes/ticket_2'
+        ]
+        for c in mock_storage.upload_blob_from_bytes.call_args_list:
+            assert c[0][1] == create_qr_code_png(ticket_links[c[0][0].split('/')[1]])
+        assert not mock_storage.blob_exists.called
@@ -0,0 +1,14 @@
+from app.models import Order
+from app.utils.queries import count_queries
+
+
+class WhenCountingQueries:
+
+    def it_counts_the_queries_run_in_the_block(self, db_session):
+        with count_queries() as query_counter:
+            Order.query.all()
+            Order.query.count()
+
+        Order.query.all()
+
+        assert query_counter.count == 2
@@ -0,0 +1,74 @@
+from flask import url_for
+from freezegun import freeze_time
+import pytest
+
+from app.dao import dao_update_record
+from app.dao.speakers_dao import dao_create_speaker, dao_update_speaker
+from app.models import Speaker
+from app.utils.queries import count_queries
+from app.utils.response_cache import response_cache
+
+from tests.conftest import create_authorization_header
+
+
+@pytest.fixture(autouse=True)
+def response_cache_enabled(mocker):
+    mocker.patch.dict('app.application.config', {'RESPONSE_CACHE': True})
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+def get_speakers(client):
+    return client.get(url_for('speakers.get_speakers'), headers=[create_authorization_header()])
+
+
+class WhenCachingResponses:
+
+    def it_serves_a_cached_response_until_the_table_is_written_to(self, client, db_session, sample_speaker):
+        assert len(get_speakers(client).json) == 1
+
+        with count_queries() as query_counter:
+            response = get_speakers(client)
+        assert response.json[0]['name'] == sample_speaker.name
+        assert query_counter.count <= 1  # the token blacklist check
+
+        dao_update_speaker(sample_speaker.id, name='Mrs Blue')
+
+        assert get_speakers(client).json[0]['name'] == 'Mrs Blue'
+        assert response_cache.get_stats() == {
+            'hits': 1, 'misses': 2, 'invalidations': 1, 'errors': 0, 'size': 2
+        }
+
+    def it_invalidates_responses_on_a_generic_record_update(self, client, db_session, sample_speaker):
+        get_speakers(client)
+
+        dao_update_record(Speaker, sample_speaker.id, name='Mrs Green')
+
+        assert get_speakers(client).json[0]['name'] == 'Mrs Green'
+
+    def it_expires_cached_responses(self, client, db_session, sample_speaker):
+        with freeze_time('2021-01-01T10:00:00') as frozen_time:
+            get_speakers(client)
+            frozen_time.tick(61)
+
+            assert get_speakers(client).status_code == 200
+        assert response_cache.get_stats()['hits'] == 0
+
+    def it_keeps_the_most_recent_responses(self, mocker, client, db_session, sample_speaker):
+        mocker.patch.dict('app.application.config', {'RESPONSE_CACHE_SIZE': 1})
+        get_speakers(client)
+
+        dao_create_speaker(Speaker(name='Mr Red'))
+        get_speakers(client)
+
+        assert response_cache.get_stats()['size'] == 1
+
+    def it_does_not_cache_when_disabled(self, mocker, client, db_session, sample_speaker):
+        mocker.patch.dict('app.application.config', {'RESPONSE_CACHE': False})
+
+        get_speakers(client)
+        get_speakers(client)
+
+        assert response_cache.get_stats()['hits'] == 0
+        assert response_cache.get_stats()['misses'] == 0
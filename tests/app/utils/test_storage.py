@@ -256,6 +256,23 @@ class WhenUsingStorage:
         assert store.bucket.blob.source_string == base64.b64decode(self.base64img)
         assert not mock_generate_web_image.called
 
+    def it_uploads_blob_from_bytes(self, app, mocker):
+        mocker.patch.dict('os.environ', {
+            'GOOGLE_APPLICATION_CREDENTIALS': 'path/to/creds'
+        })
+
+        mocker.patch("google.cloud.storage.Client", MockStorageClient)
+        mocker.patch("google.auth.compute_engine.Credentials")
+        mock_generate_web_image = mocker.patch("app.utils.storage.Storage.generate_web_image")
+
+        store = Storage('test-store')
+        store.upload_blob_from_bytes('qr_codes/ticket_id', b'png data')
+
+        assert store.bucket.destination_filename == 'qr_codes/ticket_id'
+        assert store.bucket.blob.source_string == b'png data'
+        assert store.bucket.blob.public
+        assert not mock_generate_web_image.called
+
     def it_logs_args_if_development_and_no_google_config_when_upload_from_base64string(self, app, mocker):
         mocker.patch.dict('app.utils.storage.current_app.config', {
             'ENVIRONMENT': 'development',
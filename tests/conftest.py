@@ -339,6 +339,7 @@ def base64img_encoded():
 def mock_storage(mocker):
     mocker.patch('app.utils.storage.Storage.__init__', return_value=None)
     mocker.patch('app.utils.storage.Storage.upload_blob_from_base64string')
+    mocker.patch('app.utils.storage.Storage.upload_blob_from_bytes')
     mocker.patch('app.utils.storage.Storage.blob_exists', return_value=True)
     mock_storage_rename = mocker.patch("app.utils.storage.Storage.rename_image")
 
@@ -351,6 +352,7 @@ def mock_storage(mocker):
 def mock_storage_no_blob(mocker):
     mocker.patch('app.utils.storage.Storage.__init__', return_value=None)
     mocker.patch('app.utils.storage.Storage.upload_blob_from_base64string')
+    mocker.patch('app.utils.storage.Storage.upload_blob_from_bytes')
     mocker.patch('app.utils.storage.Storage.blob_exists', return_value=False)
 
 
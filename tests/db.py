@@ -463,7 +463,10 @@ def create_order(
     tickets=[],
     errors=[],
     linked_txn_id=None,
-    email_status=None
+    email_status=None,
+    is_donation=None,
+    shipping_cost=None,
+    refund_issued=None
 ):
     data = {
         'old_id': old_id,
@@ -493,6 +496,12 @@ def create_order(
     }
     if linked_txn_id:
         data.update(linked_txn_id=linked_txn_id)
+    if is_donation is not None:
+        data.update(is_donation=is_donation)
+    if shipping_cost is not None:
+        data.update(shipping_cost=shipping_cost)
+    if refund_issued is not None:
+        data.update(refund_issued=refund_issued)
 
     order = Order(**data)
     dao_create_record(order)
@@ -540,7 +549,7 @@ def create_email_provider(
     api_key='apikey', api_url='http://alt-api-url.com', pos=1,
     headers=True, auth_type=API_AUTH, as_json=False, data_map=DATA_MAP,
     smtp_server=None, smtp_user=None, smtp_password=None,
-    available=False
+    available=False, batch_size=None
 ):
     data = {
         'name': name,
@@ -558,7 +567,8 @@ def create_email_provider(
         'smtp_server': smtp_server,
         'smtp_user': smtp_user,
         'smtp_password': smtp_password,
-        'available': available
+        'available': available,
+        'batch_size': batch_size
     }
 
     email_provider = EmailProvider(**data)